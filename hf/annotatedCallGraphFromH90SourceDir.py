@@ -31,11 +31,13 @@ from xml.dom.minidom import Document
 from optparse import OptionParser
 from tools.filesystem import dirEntries
 from tools.commons import printProgressIndicator, progressIndicatorReset, setupDeferredLogging
+from tools.metadata import parseString, mergeCallGraphFragment
+from tools.cache import getContentHash, loadCachedObject, storeCachedObject
+from tools.profiling import PreprocessorProfile
 from machinery.parser import H90XMLCallGraphGenerator
 import os
 import sys
 import fileinput
-import pdb
 import logging, atexit
 
 ##################### MAIN ##############################
@@ -47,6 +49,10 @@ parser.add_option("-d", "--debug", action="store_true", dest="debug",
                   help="show debug print in standard error output")
 parser.add_option("-p", "--pretty", action="store_true", dest="pretty",
                   help="make xml output pretty")
+parser.add_option("--cacheDir", dest="cacheDir",
+                  help="directory to cache the callgraph of each h90 file in between runs, such that only changed files are parsed again (default: no caching)", metavar="DIR")
+parser.add_option("--profile", dest="profile",
+                  help="write wall time, peak memory and line count per stage and source file as JSON report to FILENAME", metavar="FILENAME")
 (options, args) = parser.parse_args()
 
 setupDeferredLogging('preprocessor.log', logging.DEBUG if options.debug else logging.INFO)
@@ -55,6 +61,8 @@ if (not options.sourceDir):
     logging.error("sourceDirectory option is mandatory. Use '--help' for informations on how to use this module")
     sys.exit(1)
 
+profile = PreprocessorProfile("annotatedCallGraphFromH90SourceDir", options.profile)
+
 #prepare xml output
 doc = Document()
 callGraphRoot = doc.createElement("callGraph")
@@ -65,15 +73,39 @@ filesInDir = dirEntries(str(options.sourceDir), True, 'h90')
 #first pass: loop through all h90 files (hybrid fortran 90) in the current directory
 #   and build the basic callgraph based on subprocedures and calls. Also parse @-directives for annotations.
 progressIndicatorReset(sys.stderr)
+profile.startStage("callgraph parsing")
+#   each file is parsed into its own fragment document, which is then merged into the callgraph.
+#   -> fragments of unchanged files can be taken from the cache.
 for fileNum, fileInDir in enumerate(filesInDir):
-    parser = H90XMLCallGraphGenerator(doc)
-    parser.processFile(fileInDir)
-    logging.debug("Callgraph generated for " + fileInDir + "")
+    profile.startFile("callgraph parsing", fileInDir)
+    fragmentDoc = None
+    cacheKey = None
+    if options.cacheDir:
+        cacheKey = getContentHash([fileInDir])
+        cachedFragment = loadCachedObject(options.cacheDir, "callgraph_" + os.path.basename(fileInDir), cacheKey)
+        if cachedFragment != None:
+            fragmentDoc = parseString(cachedFragment)
+            logging.debug("Cached callgraph used for " + fileInDir + "")
+    if fragmentDoc == None:
+        fragmentDoc = Document()
+        fragmentDoc.appendChild(fragmentDoc.createElement("callGraph"))
+        parser = H90XMLCallGraphGenerator(fragmentDoc)
+        parser.processFile(fileInDir)
+        logging.debug("Callgraph generated for " + fileInDir + "")
+        if cacheKey != None:
+            storeCachedObject(options.cacheDir, "callgraph_" + os.path.basename(fileInDir), cacheKey, fragmentDoc.toxml())
+    mergeCallGraphFragment(doc, fragmentDoc)
+    profile.endFile("callgraph parsing", fileInDir)
     printProgressIndicator(sys.stderr, fileInDir, fileNum + 1, len(filesInDir), "Callgraph parsing")
 
+profile.endStage("callgraph parsing")
+
 #second pass: moved to generateP90Codebase.py since we need symbol analysis already
 
+profile.startStage("output")
 if (options.pretty):
 	sys.stdout.write(doc.toprettyxml())
 else:
-	sys.stdout.write(doc.toxml())
\ No newline at end of file
+	sys.stdout.write(doc.toxml())
+profile.endStage("output")
+profile.write()
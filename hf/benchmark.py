@@ -0,0 +1,259 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2016 Michel Müller, Tokyo Institute of Technology
+
+# This file is part of Hybrid Fortran.
+
+# Hybrid Fortran is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Hybrid Fortran is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
+
+#**********************************************************************#
+#  Procedure        benchmark.py                                       #
+#  Comment          Benchmarks for the performance critical parts of   #
+#                   the Hybrid Fortran preprocessor, using synthetic   #
+#                   inputs.                                            #
+#**********************************************************************#
+
+from xml.dom.minidom import Document
+from optparse import OptionParser
+from tools.metadata import setDomainDependants
+from tools.commons import setupDeferredLogging
+from tools.filesystem import dirEntries
+import os, sys, time, logging, tempfile, shutil
+
+def createSyntheticCallGraph(numOfRoutines, layerWidth=10, callsPerRoutine=2):
+	'''Callgraph with routines arranged in layers, where every routine calls routines of the next layer.
+	Each routine has two arguments, a local and a module symbol, which get passed on to its callees together with its second argument.
+	Returns the document and the number of routine visits when walking every path through the callgraph.'''
+	doc = Document()
+	doc.appendChild(doc.createElement("callGraph"))
+	routinesNode = doc.createElement("routines")
+	callsNode = doc.createElement("calls")
+	doc.documentElement.appendChild(routinesNode)
+	doc.documentElement.appendChild(callsNode)
+
+	def appendArguments(parent, symbolNames):
+		argumentsNode = doc.createElement("arguments")
+		for symbolName in symbolNames:
+			argumentNode = doc.createElement("argument")
+			argumentNode.setAttribute("symbolName", symbolName)
+			argumentsNode.appendChild(argumentNode)
+		parent.appendChild(argumentsNode)
+
+	routineName = lambda routineIndex: "routine%i" %(routineIndex)
+	for routineIndex in range(numOfRoutines):
+		routine = doc.createElement("routine")
+		routine.setAttribute("name", routineName(routineIndex))
+		routine.setAttribute("module", "synthetic")
+		routine.setAttribute("source", "synthetic")
+		appendArguments(routine, ["a", "b"])
+		routinesNode.appendChild(routine)
+		_, _, entries = setDomainDependants(doc, routine, "attribute(autoDom)", "a, b, local, moduleData")
+		entries[3].setAttribute("sourceModule", "synthetic_data")
+		entries[3].setAttribute("sourceSymbol", "moduleData")
+
+	#number of paths from a root to each routine, i.e. how often it is reached when walking every path
+	numOfPathsByRoutineIndex = [1 if routineIndex < layerWidth else 0 for routineIndex in range(numOfRoutines)]
+	for routineIndex in range(numOfRoutines):
+		layerStart = (routineIndex // layerWidth + 1) * layerWidth
+		if layerStart >= numOfRoutines:
+			continue
+		for callNum in range(callsPerRoutine):
+			calleeIndex = layerStart + (routineIndex + callNum) % layerWidth
+			if calleeIndex >= numOfRoutines:
+				continue
+			call = doc.createElement("call")
+			call.setAttribute("caller", routineName(routineIndex))
+			call.setAttribute("callee", routineName(calleeIndex))
+			appendArguments(call, ["local", "b"] if callNum % 2 == 0 else ["moduleData", "b"])
+			callsNode.appendChild(call)
+			numOfPathsByRoutineIndex[calleeIndex] += numOfPathsByRoutineIndex[routineIndex]
+	return doc, sum(numOfPathsByRoutineIndex)
+
+def createSyntheticSourceFile(path, numOfRoutines, numOfStatementsPerRoutine=20):
+	'''Module with routines that each declare domain dependant symbols, run a parallel region and call the next routine.
+	Returns the number of lines written.'''
+	lines = ["module synthetic", "contains"]
+	for routineIndex in range(numOfRoutines):
+		lines += [
+			"subroutine routine%i(n, m, a, b)" %(routineIndex),
+			"implicit none",
+			"integer(4), intent(in) :: n, m",
+			"real(8), intent(in), dimension(n,m) :: a",
+			"real(8), intent(out), dimension(n,m) :: b",
+			"real(8) :: c",
+			"@domainDependant{attribute(autoDom)}",
+			"a, b",
+			"@end domainDependant",
+			"@parallelRegion{domName(i,j), domSize(n,m)}",
+		]
+		lines += ["c = a(i,j) * %i.0d0 + b(i,j)" %(statementIndex) for statementIndex in range(numOfStatementsPerRoutine)]
+		lines += ["b(i,j) = c", "@end parallelRegion"]
+		if routineIndex + 1 < numOfRoutines:
+			lines.append("call routine%i(n, m, a, b)" %(routineIndex + 1))
+		lines.append("end subroutine")
+	lines.append("end module")
+	sourceFile = open(path, 'w')
+	try:
+		sourceFile.write("\n".join(lines) + "\n")
+	finally:
+		sourceFile.close()
+	return len(lines)
+
+def benchmarkCallGraphParsing(options):
+	from machinery.parser import H90XMLCallGraphGenerator
+	temporaryDir = None
+	if options.sourceDir:
+		filesInDir = dirEntries(str(options.sourceDir), True, 'h90')
+	else:
+		temporaryDir = tempfile.mkdtemp()
+		filesInDir = [os.path.join(temporaryDir, "synthetic.h90")]
+		createSyntheticSourceFile(filesInDir[0], options.numOfRoutines)
+	try:
+		numOfLines = 0
+		for fileInDir in filesInDir:
+			sourceFile = open(fileInDir, 'r')
+			try:
+				numOfLines += len(sourceFile.readlines())
+			finally:
+				sourceFile.close()
+		startTime = time.time()
+		for fileInDir in filesInDir:
+			doc = Document()
+			doc.appendChild(doc.createElement("callGraph"))
+			H90XMLCallGraphGenerator(doc).processFile(fileInDir)
+		elapsed = time.time() - startTime
+	finally:
+		if temporaryDir:
+			shutil.rmtree(temporaryDir)
+	print "callgraph parsing: %i files, %i lines: %.3fs (%.0f lines/s)" %(
+		len(filesInDir),
+		numOfLines,
+		elapsed,
+		numOfLines / elapsed if elapsed > 0 else 0
+	)
+
+def benchmarkSymbolAnalysis(options):
+	from tools.analysis import SymbolDependencyAnalyzer
+	doc, numOfPaths = createSyntheticCallGraph(options.numOfRoutines)
+	startTime = time.time()
+	analyzer = SymbolDependencyAnalyzer(doc)
+	symbolAnalysisByRoutine = analyzer.getSymbolAnalysisByRoutine()
+	elapsed = time.time() - startTime
+	print "symbol analysis: %i routines, %i calls, %.3g call paths: %.3fs (%i routines analysed)" %(
+		options.numOfRoutines,
+		len(doc.getElementsByTagName("call")),
+		numOfPaths,
+		elapsed,
+		len(symbolAnalysisByRoutine)
+	)
+
+def benchmarkAccessRepresentations(options):
+	'''Converts the kernels on an analysed callgraph and reports the time spent in symbol access representations.'''
+	from io import FileIO
+	from tools.metadata import parseString
+	from tools.analysis import SymbolDependencyAnalyzer
+	from models.symbol import Symbol
+	from machinery.codebase import Codebase, parseSymbols, getImplementationNamesByTemplateName, getImplementationsByTemplateName
+	from serve import IncrementalBuild
+	temporaryDir = tempfile.mkdtemp()
+	sourceDir = options.sourceDir
+	if not sourceDir:
+		sourceDir = os.path.join(temporaryDir, "source")
+		os.mkdir(sourceDir)
+		createSyntheticSourceFile(os.path.join(sourceDir, "synthetic.h90"), options.numOfRoutines)
+	accessRepresentation = Symbol.accessRepresentation
+	elapsedInAccessRepresentations = [0.0]
+	numOfCalls = [0]
+	def timedAccessRepresentation(*args, **kwargs):
+		startTime = time.time()
+		try:
+			return accessRepresentation(*args, **kwargs)
+		finally:
+			elapsedInAccessRepresentations[0] += time.time() - startTime
+			numOfCalls[0] += 1
+	try:
+		preparedDir = os.path.join(temporaryDir, "prepared")
+		os.mkdir(preparedDir)
+		implementationNamesByTemplateName = {"default": options.implementation}
+		if os.path.isfile(options.implementation):
+			implementationNamesByTemplateName = getImplementationNamesByTemplateName(options.implementation)
+		implementationsByTemplateName = getImplementationsByTemplateName(implementationNamesByTemplateName, [])
+		appliesTo = options.appliesTo if options.appliesTo.upper() != "CPU" else ""
+		#like the build, the framework library is converted together with the sources
+		frameworkLibraryDir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "hf_lib")
+		build = IncrementalBuild([str(sourceDir), frameworkLibraryDir], preparedDir, temporaryDir, appliesTo, implementationsByTemplateName)
+		filesInDir = []
+		for sourcePath in build.getSourcePaths():
+			filesInDir.append(build.prepareSource(sourcePath))
+			build.parseCallgraphFragment(filesInDir[-1])
+		cgDoc = parseString(build.getAnalyzedCallgraph(filesInDir), immutable=False)
+		parseSymbols(cgDoc, filesInDir, implementationsByTemplateName)
+		codebase = Codebase(cgDoc, SymbolDependencyAnalyzer(cgDoc).getSymbolAnalysisByRoutine())
+		outputPath = os.path.join(temporaryDir, "output.P90")
+		outputStream = FileIO(outputPath, mode="wb")
+		Symbol.accessRepresentation = timedAccessRepresentation
+		try:
+			startTime = time.time()
+			for fileInDir in filesInDir:
+				codebase.convertFile(fileInDir, outputStream, implementationsByTemplateName)
+			elapsed = time.time() - startTime
+		finally:
+			Symbol.accessRepresentation = accessRepresentation
+			outputStream.close()
+		outputFile = open(outputPath, 'rb')
+		try:
+			numOfLines = outputFile.read().count("\n")
+		finally:
+			outputFile.close()
+	finally:
+		shutil.rmtree(temporaryDir)
+	print "access representations: %i files, %i lines converted in %.3fs, %i access representations: %.3fs (%.0f%%)" %(
+		len(filesInDir),
+		numOfLines,
+		elapsed,
+		numOfCalls[0],
+		elapsedInAccessRepresentations[0],
+		100 * elapsedInAccessRepresentations[0] / elapsed if elapsed > 0 else 0
+	)
+
+benchmarksByName = {
+	"accessRepresentations": benchmarkAccessRepresentations,
+	"callGraphParsing": benchmarkCallGraphParsing,
+	"symbolAnalysis": benchmarkSymbolAnalysis
+}
+
+##################### MAIN ##############################
+if __name__ == '__main__':
+	parser = OptionParser()
+	parser.add_option("-b", "--benchmark", dest="benchmarks", action="append",
+					  help="benchmark to run (%s), can be specified multiple times (default: all)" %(", ".join(sorted(benchmarksByName.keys()))))
+	parser.add_option("-n", "--routines", dest="numOfRoutines", type="int", default=5000,
+					  help="number of routines in synthetic callgraphs and sources (default: 5000)", metavar="N")
+	parser.add_option("-i", "--sourceDirectory", dest="sourceDir",
+					  help="use the h90 files in DIR (recursively, for the conversion benchmarks also H90 files) instead of a synthetic source", metavar="DIR")
+	parser.add_option("-m", "--implementation", dest="implementation", default="OpenMPFortranImplementation",
+					  help="FortranImplementation classname or JSON containing classnames by template name, used for the conversion benchmarks (default: OpenMPFortranImplementation)", metavar="IMP")
+	parser.add_option("-a", "--appliesTo", dest="appliesTo", default="CPU",
+					  help="architecture for the conversion benchmarks, as specified in the appliesTo section in parallelRegion definitions (default: CPU)")
+	(options, args) = parser.parse_args()
+
+	setupDeferredLogging('preprocessor.log', logging.INFO)
+
+	benchmarkNames = options.benchmarks if options.benchmarks else sorted(benchmarksByName.keys())
+	for benchmarkName in benchmarkNames:
+		if not benchmarkName in benchmarksByName:
+			logging.error("unknown benchmark: %s" %(benchmarkName))
+			sys.exit(1)
+		benchmarksByName[benchmarkName](options)
@@ -18,26 +18,70 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
 
-import pstats, sys
+import pstats, sys, json
 from optparse import OptionParser
 from tools.commons import setupDeferredLogging
 from tools.filesystem import dirEntries
+from tools.profiling import profileReportExtension, combineProfileReports
 import logging
 
+def printProfileSummary(combinedReport, numOfEntries):
+	print "%i preprocessor runs, %.2fs in total, peak RSS %.1f MiB" %(
+		combinedReport["reports"],
+		combinedReport["wallTime"],
+		combinedReport["peakRSS"] / 1024.0
+	)
+	print "slowest stages:"
+	for stage in combinedReport["stages"][:numOfEntries]:
+		print "%10.2fs %10.1f MiB %10i lines  %s: %s (%i runs)" %(
+			stage["wallTime"], stage["peakRSS"] / 1024.0, stage["lines"], stage["tool"], stage["name"], stage["runs"]
+		)
+	print "slowest files (with the growth of the peak RSS while processing them):"
+	for fileEntry in combinedReport["files"][:numOfEntries]:
+		print "%10.2fs %+10.1f MiB %10i lines  %s" %(
+			fileEntry["wallTime"], fileEntry["peakRSSGrowth"] / 1024.0, fileEntry["lines"], fileEntry["name"]
+		)
+
 parser = OptionParser()
 parser.add_option("-i", "--inputDirectory", dest="inputDir",
                   help="read files from DIR", metavar="DIR")
 parser.add_option("-o", "--output", dest="output",
                   help="output combined statistics to FILENAME", metavar="FILENAME")
+parser.add_option("-r", "--reportOutput", dest="reportOutput",
+                  help="output the combined %s reports (created with --profile) as JSON to FILENAME" %(profileReportExtension), metavar="FILENAME")
+parser.add_option("-n", "--numOfEntries", dest="numOfEntries", type="int", default=10,
+                  help="number of stages and files to show in the summary of the %s reports (default: 10)" %(profileReportExtension), metavar="N")
 (options, args) = parser.parse_args()
 
 setupDeferredLogging('preprocessor.log', logging.INFO)
 
-if not options.inputDir or not options.output:
+if not options.inputDir or (not options.output and not options.reportOutput):
 	logging.error("please see --help on how to use this program")
 	sys.exit(1)
 
-statFiles = dirEntries(str(options.inputDir), False, 'cprof')
-logging.debug("combining %s" %(str(statFiles)))
-statistics = pstats.Stats(*statFiles)
-statistics.dump_stats(options.output)
\ No newline at end of file
+if options.output:
+	statFiles = dirEntries(str(options.inputDir), False, 'cprof')
+	logging.debug("combining %s" %(str(statFiles)))
+	statistics = pstats.Stats(*statFiles)
+	statistics.dump_stats(options.output)
+
+if options.reportOutput:
+	reportFiles = dirEntries(str(options.inputDir), False, profileReportExtension)
+	logging.debug("combining %s" %(str(reportFiles)))
+	reports = []
+	for reportFile in sorted(reportFiles):
+		currFile = open(reportFile, 'r')
+		try:
+			reports.append(json.load(currFile))
+		except ValueError as e:
+			logging.error("could not read profile report %s: %s" %(reportFile, str(e)))
+			sys.exit(1)
+		finally:
+			currFile.close()
+	combinedReport = combineProfileReports(reports)
+	outputFile = open(str(options.reportOutput), 'w')
+	try:
+		json.dump(combinedReport, outputFile, sort_keys=True, indent=4, separators=(',', ': '))
+	finally:
+		outputFile.close()
+	printProfileSummary(combinedReport, options.numOfEntries)
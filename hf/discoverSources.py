@@ -0,0 +1,124 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2016 Michel Müller, Tokyo Institute of Technology
+
+# This file is part of Hybrid Fortran.
+
+# Hybrid Fortran is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Hybrid Fortran is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
+
+#Writes the source lists of a Hybrid Fortran project as a makefile to be included by MakefileCommon.
+#The makefile also contains a rule making itself dependant on every directory that has been scanned,
+#so make only repeats the discovery once files have been added, removed or renamed somewhere in the source tree.
+
+import os, sys, traceback
+from optparse import OptionParser
+from tools.commons import setupDeferredLogging
+from tools.filesystem import walkDirectory, filterExceptions
+import logging
+
+def getPathsWithSuffixes(paths, suffixes):
+	return [path for path in paths if path.endswith(tuple(suffixes))]
+
+def walkExistingDirectory(dirPath):
+	if not os.path.isdir(dirPath):
+		logging.warning("%s is not a directory - no sources discovered there" %(dirPath))
+		return [], []
+	return walkDirectory(dirPath)
+
+def getMakeEscaped(text):
+	return text.replace('$', '$$').replace('#', '\\#')
+
+def getSourceLists(sourceDir, libDir, exceptions):
+	sourceFiles, directories = walkExistingDirectory(sourceDir)
+	libFiles = []
+	if libDir:
+		libFiles, libDirectories = walkExistingDirectory(libDir)
+		directories += libDirectories
+	sourceLists = [
+		("SRC_F90", filterExceptions(exceptions, getPathsWithSuffixes(sourceFiles, ['.f90', '.f']))),
+		("SRC_F90PP", filterExceptions(exceptions, getPathsWithSuffixes(sourceFiles, ['.F90', '.F']))),
+		("SRC_C", filterExceptions(exceptions, getPathsWithSuffixes(sourceFiles, ['.c', '.cu']))),
+		("SRC_LIB_FORT", getPathsWithSuffixes(libFiles, ['.f90'])),
+		("SRC_LIB_FORT_PP", getPathsWithSuffixes(libFiles, ['.F90'])),
+		("SRC_LIB_H90", getPathsWithSuffixes(libFiles, ['.h90'])),
+		("SRC_LIB_H90_WITH_PP", getPathsWithSuffixes(libFiles, ['.H90'])),
+		("SRC_H90_WITHOUT_PP", filterExceptions(exceptions, getPathsWithSuffixes(sourceFiles, ['.h90']))),
+		("SRC_H90_WITH_PP", filterExceptions(exceptions, getPathsWithSuffixes(sourceFiles, ['.H90'])))
+	]
+	sourceListsByName = dict(sourceLists)
+	fortranSources = sum([
+		sourceListsByName[name] for name in ["SRC_F90", "SRC_F90PP", "SRC_LIB_FORT", "SRC_LIB_FORT_PP"]
+	], [])
+	targetSources = [
+		path[:-len('.F90')] + '.P90' if path.endswith('.F90') else path
+		for path in fortranSources
+	]
+	sourceLists.append(("SRC_TGT_FORT", filterExceptions(['storage_order'], targetSources) + ['storage_order.F90']))
+	return sourceLists, directories
+
+def writeManifest(manifestPath, sourceLists, directories):
+	#write to a temporary file first, so an interrupted run never leaves a partial manifest behind
+	temporaryPath = manifestPath + '.tmp'
+	manifestFile = open(temporaryPath, 'w')
+	try:
+		manifestFile.write("# generated by discoverSources.py - do not edit\n")
+		for name, paths in sourceLists:
+			manifestFile.write("%s=%s\n" %(name, getMakeEscaped(' '.join(paths))))
+		#absolute paths, since relative directory names could collide with targets like 'source'
+		escapedDirectories = [getMakeEscaped(os.path.abspath(directory)) for directory in directories]
+		manifestFile.write("%s: %s\n" %(manifestPath, ' \\\n\t'.join(escapedDirectories)))
+		#empty rule per directory, so a directory that has been removed or renamed causes a rescan
+		#instead of a 'No rule to make target' error when including the manifest.
+		for escapedDirectory in escapedDirectories:
+			manifestFile.write("%s:\n" %(escapedDirectory))
+	finally:
+		manifestFile.close()
+	os.rename(temporaryPath, manifestPath)
+
+##################### MAIN ##############################
+#get all program arguments
+parser = OptionParser()
+parser.add_option("-s", "--sourceDirectory", dest="sourceDir",
+                  help="read the project sources from DIR", metavar="DIR")
+parser.add_option("-l", "--libDirectory", dest="libDir",
+                  help="read the library sources from DIR", metavar="DIR")
+parser.add_option("-e", "--exceptions", dest="exceptions",
+                  help="exceptions to filter out from the project sources (space separated)")
+parser.add_option("-o", "--output", dest="output",
+                  help="write the source lists as makefile to FILENAME", metavar="FILENAME")
+parser.add_option("-d", "--debug", action="store_true", dest="debug",
+                  help="show debug print in standard error output")
+(options, args) = parser.parse_args()
+
+setupDeferredLogging('preprocessor.log', logging.DEBUG if options.debug else logging.INFO)
+
+if not options.sourceDir or not options.output:
+	logging.error("please see --help on how to use this program")
+	sys.exit(1)
+
+exceptions = []
+if options.exceptions:
+	exceptions = [exception.strip() for exception in options.exceptions.strip().split(' ') if exception.strip() != ""]
+
+try:
+	sourceLists, directories = getSourceLists(options.sourceDir, options.libDir, exceptions)
+	outputDir = os.path.dirname(options.output)
+	if outputDir != "" and not os.path.isdir(outputDir):
+		os.makedirs(outputDir)
+	writeManifest(options.output, sourceLists, directories)
+	logging.debug("%i source directories scanned, manifest written to %s" %(len(directories), options.output))
+except Exception, e:
+	logging.critical('Error when discovering the sources in %s: %s%s\n' %(options.sourceDir, str(e), traceback.format_exc()))
+	sys.exit(64)
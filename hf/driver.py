@@ -0,0 +1,128 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2016 Michel Müller, Tokyo Institute of Technology
+
+# This file is part of Hybrid Fortran.
+
+# Hybrid Fortran is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Hybrid Fortran is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
+
+#Runs the preprocessor tools as subcommands of a single interpreter (see hf_bin/hf):
+#   hf callgraph -i build/hf_preprocessed/ > rawCG.xml
+#With 'batch', several subcommands are run in sequence, so the preprocessor modules are imported
+#and the patterns are compiled only once. Every line of the batch file is one subcommand with its
+#arguments, optionally followed by '> FILENAME' to redirect its standard output:
+#   hf batch commands.txt
+#Empty lines and lines starting with '#' are ignored. The batch stops at the first failing subcommand.
+
+import os, sys, shlex, runpy, traceback, logging
+
+scriptNameBySubcommand = {
+	"callgraph": "annotatedCallGraphFromH90SourceDir.py",
+	"analysis": "loopAnalysisWithAnnotatedCallGraph.py",
+	"generate": "generateP90Codebase.py",
+	"sources": "getSourcesToBeProcessed.py",
+	"templates": "getTemplateNames.py",
+	"filter": "filterExceptions.py",
+	"discover": "discoverSources.py",
+	"sanitize": "strip_fortran_line_continuations.py",
+	"serve": "serve.py",
+	"stats": "combineStats.py"
+}
+
+def printUsage(stream):
+	stream.write("usage: hf SUBCOMMAND [ARGUMENTS] | hf batch FILENAME\nsubcommands:\n")
+	for subcommand in sorted(scriptNameBySubcommand.keys()):
+		stream.write("    %-10s %s\n" %(subcommand, scriptNameBySubcommand[subcommand]))
+
+def resetLogging():
+	#every tool sets up its own log handlers - close them, so the next subcommand starts with a clean root logger
+	logger = logging.getLogger()
+	for handler in list(logger.handlers):
+		handler.flush()
+		handler.close()
+		logger.removeHandler(handler)
+
+def getExitCode(systemExit):
+	if systemExit.code == None:
+		return 0
+	if isinstance(systemExit.code, int):
+		return systemExit.code
+	sys.stderr.write("%s\n" %(systemExit.code))
+	return 1
+
+def runSubcommand(subcommand, arguments, outputPath=None):
+	scriptName = scriptNameBySubcommand.get(subcommand)
+	if scriptName == None:
+		sys.stderr.write("unknown subcommand: %s\n" %(subcommand))
+		printUsage(sys.stderr)
+		return 1
+	scriptPath = os.path.join(os.path.dirname(os.path.abspath(__file__)), scriptName)
+	previousArguments = sys.argv
+	previousStdout = sys.stdout
+	outputFile = None
+	exitCode = 0
+	try:
+		if outputPath:
+			outputFile = open(outputPath, 'w')
+			sys.stdout = outputFile
+		sys.argv = [scriptPath] + arguments
+		runpy.run_path(scriptPath, run_name="__main__")
+	except SystemExit as e:
+		exitCode = getExitCode(e)
+	except Exception:
+		traceback.print_exc()
+		exitCode = 1
+	finally:
+		sys.stdout = previousStdout
+		sys.argv = previousArguments
+		if outputFile != None:
+			outputFile.close()
+		resetLogging()
+	return exitCode
+
+def parseBatchLine(line):
+	words = shlex.split(line)
+	outputPath = None
+	if len(words) >= 2 and words[-2] == ">":
+		outputPath = words[-1]
+		words = words[:-2]
+	return words[0], words[1:], outputPath
+
+def runBatch(batchPath):
+	batchFile = open(batchPath, 'r')
+	try:
+		lines = batchFile.readlines()
+	finally:
+		batchFile.close()
+	for lineNo, line in enumerate(lines):
+		if line.strip() == "" or line.strip().startswith("#"):
+			continue
+		subcommand, arguments, outputPath = parseBatchLine(line)
+		exitCode = runSubcommand(subcommand, arguments, outputPath)
+		if exitCode != 0:
+			sys.stderr.write("%s:%i: '%s' failed with exit code %i\n" %(batchPath, lineNo + 1, line.strip(), exitCode))
+			return exitCode
+	return 0
+
+if __name__ == '__main__':
+	if len(sys.argv) < 2 or sys.argv[1] in ["-h", "--help"]:
+		printUsage(sys.stdout if len(sys.argv) >= 2 else sys.stderr)
+		sys.exit(0 if len(sys.argv) >= 2 else 1)
+	if sys.argv[1] == "batch":
+		if len(sys.argv) != 3:
+			printUsage(sys.stderr)
+			sys.exit(1)
+		sys.exit(runBatch(sys.argv[2]))
+	sys.exit(runSubcommand(sys.argv[1], sys.argv[2:]))
@@ -2,13 +2,9 @@ import re
 import sys
 from optparse import OptionParser
 from tools.commons import setupDeferredLogging
+from tools.filesystem import filterExceptions
 import logging
 
-def filterExceptions(exceptions, paths):
-  exceptionsPiped = '|'.join([re.escape(exception) for exception in exceptions])
-  pattern = re.compile(r'.*?(^|\W)+' + r'(' + exceptionsPiped + r')' + r'($|\W)+.*')
-  return [path for path in paths if not pattern.match(path)]
-
 ##################### MAIN ##############################
 #get all program arguments
 parser = OptionParser()
@@ -18,18 +18,60 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
 
-from xml.dom.minidom import Document
-from tools.metadata import parseString, ImmutableDOMDocument, getClonedDocument
+from tools.metadata import parseString
 from optparse import OptionParser
-from machinery.parser import H90XMLSymbolDeclarationExtractor, getSymbolsByName, getModuleNodesByName, getParallelRegionData
-from machinery.converter import H90toF90Converter, getSymbolsByRoutineNameAndSymbolName, getSymbolsByModuleNameAndSymbolName
+from machinery.codebase import Codebase, parseSymbols, getImplementationNamesByTemplateName, getImplementationsByTemplateName
 from machinery.commons import ConversionOptions
-from tools.commons import UsageError, openFile, getDataFromFile, setupDeferredLogging, printProgressIndicator, progressIndicatorReset
+from tools.commons import UsageError, DeferredMemoryHandler, getDataFromFile, setupDeferredLogging, printProgressIndicator, progressIndicatorReset
 from tools.filesystem import dirEntries
 from tools.analysis import SymbolDependencyAnalyzer
-import implementations.fortran
+from tools.cache import getContentHash, loadCachedObject, storeCachedObject
+from tools.profiling import PreprocessorProfile, getPeakRSS
 from io import FileIO
-import os, errno, sys, json, traceback, logging
+import os, errno, sys, json, time, traceback, logging
+
+def convertFile(fileInDir):
+	#the implementation is streamed to a partial file that only replaces the output once it is complete -
+	#the make rules copy any .P90.temp file they find, a failed conversion must not leave a truncated one behind.
+	outputPath = os.path.join(os.path.normpath(options.outputDir), os.path.splitext(os.path.basename(fileInDir))[0] + ".P90.temp")
+	partialPath = outputPath + ".partial"
+	outputStream = FileIO(partialPath, mode="wb")
+	isComplete = False
+	try:
+		codebase.convertFile(fileInDir, outputStream, implementationsByTemplateName)
+		isComplete = True
+	except UsageError as e:
+		logging.error('Error: %s' %(str(e)))
+		return 1
+	finally:
+		outputStream.close()
+		if isComplete:
+			os.rename(partialPath, outputPath)
+		else:
+			os.remove(partialPath)
+	return 0
+
+def initializeWorker():
+	#workers are forked with a copy of the deferred log messages of the parent, which are still going to be flushed by the parent.
+	#-> start with an empty buffer, otherwise every worker prints them again.
+	for handler in logging.getLogger().handlers:
+		if isinstance(handler, DeferredMemoryHandler):
+			handler.buffer = []
+
+def convertFileInWorker(fileInDir):
+	#workers are forked after the codebase meta information has been built, so they all share it with the parent.
+	#the parser and converter exit on errors - we catch that here, otherwise the pool would wait forever for this result.
+	exitCode = 0
+	startTime = time.time()
+	peakRSSAtStart = getPeakRSS()
+	try:
+		exitCode = convertFile(fileInDir)
+	except SystemExit as e:
+		exitCode = e.code if type(e.code) == int else 1
+	finally:
+		for handler in logging.getLogger().handlers:
+			handler.flush()
+	return fileInDir, exitCode, time.time() - startTime, getPeakRSS() - peakRSSAtStart
 
 ##################### MAIN ##############################
 #get all program arguments
@@ -46,6 +88,12 @@ parser.add_option("-m", "--implementation", dest="implementation",
 									help="specify either a FortranImplementation classname or a JSON containing classnames by template name and a 'default' entry", metavar="IMP")
 parser.add_option("--optionFlags", dest="optionFlags",
 									help="can be used to switch on or off the following flags (comma separated): DO_NOT_TOUCH_GPU_CACHE_SETTINGS")
+parser.add_option("-j", "--jobs", dest="jobs", type="int", default=1,
+									help="number of processes to use for the conversion to standard Fortran (default: 1)", metavar="N")
+parser.add_option("--cacheDir", dest="cacheDir",
+									help="directory to cache the symbol informations of the codebase in between runs (default: no caching)", metavar="DIR")
+parser.add_option("--profile", dest="profile",
+									help="write wall time, peak memory and line count per stage and source file as JSON report to FILENAME", metavar="FILENAME")
 (options, args) = parser.parse_args()
 
 setupDeferredLogging('preprocessor.log', logging.DEBUG if options.debug else logging.INFO, showDeferredLogging=not options.debug)
@@ -71,7 +119,12 @@ if (not options.implementation):
 	logging.error("implementation option is mandatory. Use '--help' for informations on how to use this module")
 	sys.exit(1)
 
+if options.jobs < 1:
+	logging.error("jobs option needs to be at least 1")
+	sys.exit(1)
+
 ConversionOptions.Instance().debugPrint = options.debug
+profile = PreprocessorProfile("generateP90Codebase", options.profile)
 filesInDir = dirEntries(str(options.sourceDir), True, 'h90')
 
 try:
@@ -82,82 +135,55 @@ except OSError as e:
 		raise e
 	pass
 
-#   get the callgraph information
-cgDoc = parseString(getDataFromFile(options.callgraph), immutable=False)
-
 #   build up implementationNamesByTemplateName
-implementationNamesByTemplateName = None
-try:
-	implementationNamesByTemplateName = json.loads(getDataFromFile(options.implementation))
-except ValueError as e:
-	logging.critical('Error decoding implementation json (%s): %s' \
-		%(str(options.implementation), str(e))
-	)
-	sys.exit(1)
-except Exception as e:
-	logging.critical('Could not interpret implementation parameter as json file to read. Trying to use it as an implementation name directly')
-	implementationNamesByTemplateName = {'default':options.implementation}
+implementationNamesByTemplateName = getImplementationNamesByTemplateName(options.implementation)
 logging.debug('Initializing H90toF90Converter with the following implementations: %s' %(json.dumps(implementationNamesByTemplateName)))
-implementationsByTemplateName = dict(
-	(templateName, getattr(implementations.fortran, implementationNamesByTemplateName[templateName])(optionFlags))
-	for templateName in implementationNamesByTemplateName.keys()
-)
-
-#   parse the @domainDependant symbol declarations flags in all h90 files
-#   -> update the callgraph document with this information.
-#   note: We do this, since for simplicity reasons, the declaration parser relies on the symbol names that
-#   have been declared in @domainDependant directives. Since these directives come *after* the declaration,
-#   we need this pass
-# cgDoc = getClonedDocument(cgDoc)
-for fileNum, fileInDir in enumerate(filesInDir):
-	parser = H90XMLSymbolDeclarationExtractor(cgDoc, implementationsByTemplateName=implementationsByTemplateName)
-	parser.processFile(fileInDir)
-	logging.debug("Symbol declarations extracted for " + fileInDir + "")
-	printProgressIndicator(sys.stderr, fileInDir, fileNum + 1, len(filesInDir), "Symbol parsing, excluding imports")
-progressIndicatorReset(sys.stderr)
-
-#   build up symbol table indexed by module name
-moduleNodesByNameWithoutImplicitImports = getModuleNodesByName(cgDoc)
-symbolAnalyzer = SymbolDependencyAnalyzer(cgDoc)
-symbolAnalysisByRoutineNameAndSymbolNameWithoutImplicitImports = symbolAnalyzer.getSymbolAnalysisByRoutine()
-symbolsByModuleNameAndSymbolNameWithoutImplicitImports = getSymbolsByModuleNameAndSymbolName(
-	ImmutableDOMDocument(cgDoc),
-	moduleNodesByNameWithoutImplicitImports,
-	symbolAnalysisByRoutineNameAndSymbolName=symbolAnalysisByRoutineNameAndSymbolNameWithoutImplicitImports
-)
-
-#   parse the symbols again, this time know about all informations in the sourced modules in import
-#   -> update the callgraph document with this information.
-for fileNum, fileInDir in enumerate(filesInDir):
-	parser = H90XMLSymbolDeclarationExtractor(
+implementationsByTemplateName = getImplementationsByTemplateName(implementationNamesByTemplateName, optionFlags)
+
+#   look up the results of the symbol parsing and analysis in the cache
+#   note: This only covers builds without any change. Otherwise parseSymbols reuses the results of each file whose content,
+#   own callgraph nodes and imported modules are unchanged.
+cacheKey = None
+cachedCodebaseInformation = None
+cacheSettings = [json.dumps(implementationNamesByTemplateName, sort_keys=True)] + sorted(optionFlags)
+if options.cacheDir:
+	cacheKey = getContentHash([options.callgraph] + filesInDir, cacheSettings)
+	cachedCodebaseInformation = loadCachedObject(options.cacheDir, "codebase", cacheKey)
+
+if cachedCodebaseInformation != None:
+	sys.stderr.write('Using cached symbol informations from %s\n' %(options.cacheDir))
+	cgDoc = parseString(cachedCodebaseInformation["callgraph"], immutable=False)
+else:
+	#   get the callgraph information
+	cgDoc = parseString(getDataFromFile(options.callgraph), immutable=False)
+	parseSymbols(
 		cgDoc,
-		symbolsByModuleNameAndSymbolNameWithoutImplicitImports,
-		implementationsByTemplateName=implementationsByTemplateName
+		filesInDir,
+		implementationsByTemplateName,
+		profile,
+		cacheDir=options.cacheDir,
+		cacheSettings=cacheSettings
 	)
-	parser.processFile(fileInDir)
-	logging.debug("Symbol imports and declarations extracted for " + fileInDir + "")
-	printProgressIndicator(sys.stderr, fileInDir, fileNum + 1, len(filesInDir), "Symbol parsing, including imports")
-progressIndicatorReset(sys.stderr)
 
 #   build up meta informations about the whole codebase
 try:
 	sys.stderr.write('Processing informations about the whole codebase\n')
-	moduleNodesByName = getModuleNodesByName(cgDoc)
-	parallelRegionData = getParallelRegionData(cgDoc)
-	symbolAnalyzer = SymbolDependencyAnalyzer(cgDoc)
-	#next line writes some information to cgDoc as a sideeffect. $$$ clean this up, ideally make cgDoc immutable everywhere for better performance
-	symbolAnalysisByRoutineNameAndSymbolName = symbolAnalyzer.getSymbolAnalysisByRoutine()
-	symbolsByModuleNameAndSymbolName = getSymbolsByModuleNameAndSymbolName(
-		ImmutableDOMDocument(cgDoc),
-		moduleNodesByName,
-		symbolAnalysisByRoutineNameAndSymbolName=symbolAnalysisByRoutineNameAndSymbolName
-	)
-	symbolsByRoutineNameAndSymbolName = getSymbolsByRoutineNameAndSymbolName(
-		ImmutableDOMDocument(cgDoc),
-		parallelRegionData[2],
-		parallelRegionData[1],
-		symbolAnalysisByRoutineNameAndSymbolName=symbolAnalysisByRoutineNameAndSymbolName
-	)
+	profile.startStage("codebase analysis")
+	if cachedCodebaseInformation != None:
+		symbolAnalysisByRoutineNameAndSymbolName = cachedCodebaseInformation["symbolAnalysisByRoutineNameAndSymbolName"]
+	else:
+		symbolAnalyzer = SymbolDependencyAnalyzer(cgDoc)
+		#next line writes some information to cgDoc as a sideeffect. $$$ clean this up, ideally make cgDoc immutable everywhere for better performance
+		symbolAnalysisByRoutineNameAndSymbolName = symbolAnalyzer.getSymbolAnalysisByRoutine()
+		if cacheKey != None:
+			#symbols hold references into the callgraph, so we store the callgraph and analysis and rebuild the symbol tables from them.
+			storeCachedObject(options.cacheDir, "codebase", cacheKey, {
+				"callgraph": cgDoc.toxml(),
+				"symbolAnalysisByRoutineNameAndSymbolName": symbolAnalysisByRoutineNameAndSymbolName
+			})
+	codebase = Codebase(cgDoc, symbolAnalysisByRoutineNameAndSymbolName)
+	codebase.prepareConversion(implementationsByTemplateName)
+	profile.endStage("codebase analysis")
 except UsageError as e:
 	logging.error('Error: %s' %(str(e)))
 	sys.exit(1)
@@ -169,25 +195,34 @@ except Exception as e:
 
 
 #   Finally, do the conversion based on all the information above.
-for fileNum, fileInDir in enumerate(filesInDir):
-	outputPath = os.path.join(os.path.normpath(options.outputDir), os.path.splitext(os.path.basename(fileInDir))[0] + ".P90.temp")
-	printProgressIndicator(sys.stderr, fileInDir, fileNum + 1, len(filesInDir), "Converting to Standard Fortran")
-	outputStream = FileIO(outputPath, mode="wb")
+profile.startStage("conversion")
+if options.jobs == 1 or len(filesInDir) < 2:
+	for fileNum, fileInDir in enumerate(filesInDir):
+		printProgressIndicator(sys.stderr, fileInDir, fileNum + 1, len(filesInDir), "Converting to Standard Fortran")
+		profile.startFile("conversion", fileInDir)
+		exitCode = convertFile(fileInDir)
+		if exitCode != 0:
+			sys.exit(exitCode)
+		profile.endFile("conversion", fileInDir)
+else:
+	#each file is converted on its own, only reading the meta information above (including the routine node attributes
+	#set by the conversion of other files, see Codebase.prepareConversion) -> output is the same as in the serial case.
+	import multiprocessing #only imported here, since it adds to the startup time of every serial run
+	pool = multiprocessing.Pool(min(options.jobs, len(filesInDir)), initializer=initializeWorker)
 	try:
-		converter = H90toF90Converter(
-			ImmutableDOMDocument(cgDoc), #using our immutable version we can speed up ALL THE THINGS through caching
-			implementationsByTemplateName,
-			outputStream,
-			moduleNodesByName,
-			parallelRegionData,
-			symbolAnalysisByRoutineNameAndSymbolName,
-			symbolsByModuleNameAndSymbolName,
-			symbolsByRoutineNameAndSymbolName,
-		)
-		converter.processFile(fileInDir)
-	except UsageError as e:
-		logging.error('Error: %s' %(str(e)))
-		sys.exit(1)
+		for fileNum, (fileInDir, exitCode, wallTime, peakRSSGrowth) in enumerate(pool.imap(convertFileInWorker, filesInDir)):
+			printProgressIndicator(sys.stderr, fileInDir, fileNum + 1, len(filesInDir), "Converting to Standard Fortran")
+			if exitCode != 0:
+				sys.exit(exitCode)
+			profile.recordFile("conversion", fileInDir, wallTime, peakRSSGrowth)
+		pool.close()
+	except:
+		#any error or exit while converting (including KeyboardInterrupt) -> stop the workers before joining them,
+		#joining a pool that has neither been closed nor terminated would raise and hide the original error.
+		pool.terminate()
+		raise
 	finally:
-		outputStream.close()
-progressIndicatorReset(sys.stderr)
\ No newline at end of file
+		pool.join()
+progressIndicatorReset(sys.stderr)
+profile.endStage("conversion")
+profile.write()
@@ -147,7 +147,7 @@ def getSourcesWithModuleSymbolChanges(inputXML, referenceXML):
 
 def getSourcesByUsedSource(xmlData):
   result = {}
-  for entry in referenceXML.getElementsByTagName('entry'):
+  for entry in xmlData.getElementsByTagName('entry'):
     sourceName = entry.parentNode.parentNode.parentNode.getAttribute('source')
     if sourceName in [None, '']:
       continue
@@ -160,7 +160,7 @@ def getSourcesByUsedSource(xmlData):
 
 def getSourcesToUpdateForModuleSymbolChanges(inputXML, referenceXML):
   sourcesWithModuleSymbolChanges = getSourcesWithModuleSymbolChanges(inputXML, referenceXML)
-  sourcesByUsedSource = getSourcesByUsedSource(inputXML)
+  sourcesByUsedSource = getSourcesByUsedSource(referenceXML)
   sourcesToUpdateKeyed = {}
   for source in sourcesWithModuleSymbolChanges:
     sourcesUsingIt = sourcesByUsedSource.get(source)
@@ -171,50 +171,51 @@ def getSourcesToUpdateForModuleSymbolChanges(inputXML, referenceXML):
   return sourcesToUpdateKeyed.keys()
 
 ##################### MAIN ##############################
-#get all program arguments
-parser = OptionParser()
-parser.add_option("-r", "--reference", dest="reference", help="reference callgraph")
-parser.add_option("-i", "--input", dest="input", help="input callgraph to be analysed")
-parser.add_option("-d", "--debug", action="store_true", dest="debug", help="show debug print in standard error output")
-(options, args) = parser.parse_args()
-
-setupDeferredLogging('preprocessor.log', logging.DEBUG if options.debug else logging.INFO)
-
-if (not options.reference or not options.input):
-  raise Exception("Missing options. Please use '-h' option to see usage.")
-
-inputXML = None
-referenceXML = None
-
-inputXMLFile = open(str(options.input),'r')
-inputXMLData = inputXMLFile.read()
-inputXMLFile.close()
-inputXML = parseString(inputXMLData)
-referenceXMLFile = None
-try:
-  referenceXMLFile = open(str(options.reference),'r')
-except Exception:
-  pass
-try:
-  if referenceXMLFile != None:
-    referenceXMLData = referenceXMLFile.read()
-    referenceXMLFile.close()
-    referenceXML = parseString(referenceXMLData)
-    sourcesToUpdateKeyed = {}
-    for source in getSourcesWithParallelRegionPositionChanges(inputXML, referenceXML):
-      sourcesToUpdateKeyed[source] = None
-    for source in getSourcesToUpdateForModuleSymbolChanges(inputXML, referenceXML):
-      sourcesToUpdateKeyed[source] = None
-    print(
-      " ".join(sourcesToUpdateKeyed.keys())
-    )
-  else:
-    print(
-      " ".join(getRoutinesBySource(inputXML).keys())
-    )
-except Exception, e:
-  logging.critical('Error when generating analysing, which sources are to be reprocessed: %s' %(str(e)))
-  sys.exit(1)
+if __name__ == '__main__':
+  #get all program arguments
+  parser = OptionParser()
+  parser.add_option("-r", "--reference", dest="reference", help="reference callgraph")
+  parser.add_option("-i", "--input", dest="input", help="input callgraph to be analysed")
+  parser.add_option("-d", "--debug", action="store_true", dest="debug", help="show debug print in standard error output")
+  (options, args) = parser.parse_args()
+
+  setupDeferredLogging('preprocessor.log', logging.DEBUG if options.debug else logging.INFO)
+
+  if (not options.reference or not options.input):
+    raise Exception("Missing options. Please use '-h' option to see usage.")
+
+  inputXML = None
+  referenceXML = None
+
+  inputXMLFile = open(str(options.input),'r')
+  inputXMLData = inputXMLFile.read()
+  inputXMLFile.close()
+  inputXML = parseString(inputXMLData)
+  referenceXMLFile = None
+  try:
+    referenceXMLFile = open(str(options.reference),'r')
+  except Exception:
+    pass
+  try:
+    if referenceXMLFile != None:
+      referenceXMLData = referenceXMLFile.read()
+      referenceXMLFile.close()
+      referenceXML = parseString(referenceXMLData)
+      sourcesToUpdateKeyed = {}
+      for source in getSourcesWithParallelRegionPositionChanges(inputXML, referenceXML):
+        sourcesToUpdateKeyed[source] = None
+      for source in getSourcesToUpdateForModuleSymbolChanges(inputXML, referenceXML):
+        sourcesToUpdateKeyed[source] = None
+      print(
+        " ".join(sourcesToUpdateKeyed.keys())
+      )
+    else:
+      print(
+        " ".join(getRoutinesBySource(inputXML).keys())
+      )
+  except Exception, e:
+    logging.critical('Error when generating analysing, which sources are to be reprocessed: %s' %(str(e)))
+    sys.exit(1)
 
 
 
@@ -86,6 +86,11 @@ class FortranImplementation(object):
 	def generateRoutines(self, routine):
 		return [routine]
 
+	def generatedRoutineNodeAttributes(self, routineNode):
+		'''The attributes generateRoutines sets on the callgraph node of the routine it is given.
+		Callers in other files read them, so they are set for all files before the conversion (see Codebase).'''
+		return {}
+
 	def filePreparation(self, filename):
 		return '''#include "storage_order.F90"\n'''
 
@@ -870,6 +875,11 @@ class CUDAFortranImplementation(DeviceDataFortranImplementation):
 		self.currRoutineNode = None
 		super(CUDAFortranImplementation, self).__init__(optionFlags)
 
+	def generatedRoutineNodeAttributes(self, routineNode):
+		if routineNode.getAttribute("parallelRegionPosition") != "within":
+			return {}
+		return {"parallelRegionPosition": "inside", "isKernelCaller": "yes"}
+
 	def generateRoutines(self, routine):
 		def generateHostRoutine(routine):
 			hostRoutine = routine.clone(synthesizedHostRoutineName(routine.name))
@@ -914,8 +924,8 @@ class CUDAFortranImplementation(DeviceDataFortranImplementation):
 			parallelRegionIndex += 1
 
 		routines[0].name = synthesizedDeviceRoutineName(routines[0].name)
-		routine.node.setAttribute("parallelRegionPosition", "inside")
-		routine.node.setAttribute("isKernelCaller", "yes")
+		for name, value in self.generatedRoutineNodeAttributes(routine.node).items():
+			routine.node.setAttribute(name, value)
 		routine.parallelRegionTemplates = []
 		routine.regions = kernelWrapperRegions
 		return routines
@@ -31,13 +31,13 @@ from xml.dom.minidom import Document
 from tools.metadata import parseString
 from xml.dom import NotFoundErr
 from tools.analysis import SymbolDependencyAnalyzer
-from tools.metadata import firstDuplicateChild, getNodeValue, getCalleesByCallerName, getCallersByCalleeName
+from tools.metadata import firstDuplicateChild, updateStructuralKeyIndex, getNodeValue, getCalleesByCallerName, getCallersByCalleeName
 from tools.commons import openFile, printProgressIndicator, progressIndicatorReset, setupDeferredLogging, UsageError
+from tools.profiling import PreprocessorProfile
 from optparse import OptionParser
 import logging
 import os
 import sys
-import pdb
 import traceback
 import logging
 
@@ -51,6 +51,7 @@ def getTemplateRelations(routineNode):
 	return templateRelations
 
 def addTemplateRelation(routineNode, templateRelation):
+	doc = routineNode.ownerDocument
 	parallelRegionsNodes = routineNode.getElementsByTagName("activeParallelRegions")
 	parallelRegionNode = None
 	if len(parallelRegionsNodes) == 0:
@@ -80,6 +81,7 @@ def addAttributeToAllCallGraphAncestors(routines, callNodesByCalleeName, routine
 				continue
 			callerNode = routine
 			routine.setAttribute(attributeName, attributeValue)
+			updateStructuralKeyIndex(routine)
 			for templateRelation in templateRelations:
 				addTemplateRelation(routine, templateRelation)
 			addAttributeToAllCallGraphAncestors(routines, callNodesByCalleeName, callerNode, attributeName, attributeValue)
@@ -105,6 +107,7 @@ def addAttributeToAllCallGraphHeirs(routines, callNodesByCallerName, routineNode
 				continue
 			calleeNode = routine
 			routine.setAttribute(attributeName, attributeValue)
+			updateStructuralKeyIndex(routine)
 			for templateRelation in templateRelations:
 				addTemplateRelation(routine, templateRelation)
 			addAttributeToAllCallGraphHeirs(routines, callNodesByCallerName, calleeNode, attributeName, attributeValue)
@@ -134,13 +137,15 @@ def getFirstKernelCallerInCalleesOf(routineName, callNodesByCallerName, parallel
 def filterParallelRegionNodes(doc, routineNode, appliesTo, templates):
 	def purgeTemplateRelation(routineNode, regionsNode, templateRelation):
 		regionsNode.removeChild(templateRelation)
+		updateStructuralKeyIndex(regionsNode, templateRelation)
 		remainingTemplateRelations = regionsNode.getElementsByTagName("templateRelation")
 		if not remainingTemplateRelations or len(remainingTemplateRelations) == 0:
 			try:
 				routineNode.removeChild(regionsNode)
+				updateStructuralKeyIndex(routineNode, regionsNode)
 			except NotFoundErr:
-				logging.critical('Error when analysing callgraph file file %s: region node %s not found in routine node %s'
-					%(str(options.source), str(regionsNode.toprettyxml()), str(routineNode.toprettyxml()))
+				logging.critical('Error when analysing callgraph: region node %s not found in routine node %s'
+					%(str(regionsNode.toprettyxml()), str(routineNode.toprettyxml()))
 				)
 				sys.exit(1)
 
@@ -207,6 +212,7 @@ def analyseParallelRegions(doc, appliesTo):
 		if not parallelRegionNode.parentNode.tagName == "routine":
 			raise Exception("Parallel region not within routine.")
 		parallelRegionNode.parentNode.setAttribute("parallelRegionPosition", "within")
+		updateStructuralKeyIndex(parallelRegionNode.parentNode)
 		routine = parallelRegionNode.parentNode
 		routineName = routine.getAttribute("name")
 		if routineName == None:
@@ -227,6 +233,7 @@ def analyseParallelRegions(doc, appliesTo):
 		for child in children:
 			newRegionNode.appendChild(child.cloneNode(deep=True))
 		routine.removeChild(parallelRegionNode)
+		updateStructuralKeyIndex(routine, parallelRegionNode)
 		if newRegionNodeNeedsAppending:
 			routine.appendChild(newRegionNode)
 
@@ -255,49 +262,63 @@ This may cause device attribute mismatch compiler errors. In this case please wr
 					logging.warning("...same for %s: calls kernel %s, kernel wrapper %s" %(kernelCallerName, routineName, kernelWrapperName))
 
 ##################### MAIN ##############################
-#get all program arguments
-parser = OptionParser()
-parser.add_option("-i", "--sourceXML", dest="source",
-                  help="read callgraph from this XML file", metavar="XML")
-parser.add_option("-a", "--appliesTo", dest="appliesTo",
-                  help="specify the framework for which the loopstructure shall be extracted (as specified in the appliesTo section in parallelRegion definitions)")
-parser.add_option("-d", "--debug", action="store_true", dest="debug",
-                  help="show debug print in standard error output"
-                  )
-parser.add_option("-p", "--pretty", action="store_true", dest="pretty",
-                  help="make xml output pretty")
-(options, args) = parser.parse_args()
+if __name__ == '__main__':
+	#get all program arguments
+	parser = OptionParser()
+	parser.add_option("-i", "--sourceXML", dest="source",
+	                  help="read callgraph from this XML file", metavar="XML")
+	parser.add_option("-a", "--appliesTo", dest="appliesTo",
+	                  help="specify the framework for which the loopstructure shall be extracted (as specified in the appliesTo section in parallelRegion definitions)")
+	parser.add_option("-d", "--debug", action="store_true", dest="debug",
+	                  help="show debug print in standard error output"
+	                  )
+	parser.add_option("-p", "--pretty", action="store_true", dest="pretty",
+	                  help="make xml output pretty")
+	parser.add_option("--profile", dest="profile",
+	                  help="write wall time, peak memory and line count per stage as JSON report to FILENAME", metavar="FILENAME")
+	(options, args) = parser.parse_args()
 
-setupDeferredLogging('preprocessor.log', logging.DEBUG if options.debug else logging.INFO)
+	setupDeferredLogging('preprocessor.log', logging.DEBUG if options.debug else logging.INFO)
 
-if (not options.source):
-    logging.error("sourceXML option is mandatory. Use '--help' for informations on how to use this module")
-    sys.exit(1)
+	if (not options.source):
+	    logging.error("sourceXML option is mandatory. Use '--help' for informations on how to use this module")
+	    sys.exit(1)
 
-appliesTo = ""
-if options.appliesTo and options.appliesTo.upper() != "CPU":
-	appliesTo = options.appliesTo
+	appliesTo = ""
+	if options.appliesTo and options.appliesTo.upper() != "CPU":
+		appliesTo = options.appliesTo
 
-#read in working xml
-sys.stderr.write("Reading codebase meta information\n")
-srcFile = openFile(str(options.source),'r')
-data = srcFile.read()
-srcFile.close()
-doc = parseString(data)
+	profile = PreprocessorProfile("loopAnalysisWithAnnotatedCallGraph", options.profile)
 
-try:
-	analyseParallelRegions(doc, appliesTo)
-except UsageError as e:
-    logging.error('Error: %s' %(str(e)))
-    sys.exit(1)
-except Exception as e:
-	logging.critical('Error when analysing callgraph file %s: %s'
-		%(str(options.source), str(e))
-	)
-	logging.info(traceback.format_exc())
-	sys.exit(1)
+	#read in working xml
+	sys.stderr.write("Reading codebase meta information\n")
+	profile.startStage("reading")
+	profile.startFile("reading", options.source)
+	srcFile = openFile(str(options.source),'r')
+	data = srcFile.read()
+	srcFile.close()
+	doc = parseString(data)
+	profile.endFile("reading", options.source)
+	profile.endStage("reading")
 
-if (options.pretty):
-	sys.stdout.write(doc.toprettyxml())
-else:
-	sys.stdout.write(doc.toxml())
\ No newline at end of file
+	try:
+		profile.startStage("parallel region analysis")
+		analyseParallelRegions(doc, appliesTo)
+		profile.endStage("parallel region analysis")
+	except UsageError as e:
+	    logging.error('Error: %s' %(str(e)))
+	    sys.exit(1)
+	except Exception as e:
+		logging.critical('Error when analysing callgraph file %s: %s'
+			%(str(options.source), str(e))
+		)
+		logging.info(traceback.format_exc())
+		sys.exit(1)
+
+	profile.startStage("output")
+	if (options.pretty):
+		sys.stdout.write(doc.toprettyxml())
+	else:
+		sys.stdout.write(doc.toxml())
+	profile.endStage("output")
+	profile.write()
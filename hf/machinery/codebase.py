@@ -0,0 +1,401 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2016 Michel Müller, Tokyo Institute of Technology
+
+# This file is part of Hybrid Fortran.
+
+# Hybrid Fortran is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Hybrid Fortran is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
+
+import os, sys, json, logging, hashlib
+from xml.dom.minidom import Node
+from tools.metadata import ImmutableDOMDocument, parseString, regionTemplatesByID, getOrCreateFirstLevelElement, addTemplateToLibrary, \
+    updateStructuralKeyIndex
+from tools.commons import getDataFromFile, printProgressIndicator, progressIndicatorReset
+from tools.cache import getContentHash, loadCachedObject, storeCachedObject
+from tools.analysis import SymbolDependencyAnalyzer
+from tools.profiling import PreprocessorProfile
+from machinery.parser import H90XMLSymbolDeclarationExtractor, importsRequireSymbolResolution, getModuleNodesByName, getParallelRegionData
+from machinery.converter import H90toF90Converter, getSymbolsByRoutineNameAndSymbolName, getSymbolsByModuleNameAndSymbolName
+from models.symbol import clearInternedValues
+import implementations.fortran
+
+def getImplementationNamesByTemplateName(implementationArgument):
+    '''implementationArgument is either a JSON file containing classnames by template name and a 'default' entry or a classname.'''
+    try:
+        return json.loads(getDataFromFile(implementationArgument))
+    except ValueError as e:
+        logging.critical('Error decoding implementation json (%s): %s' \
+            %(str(implementationArgument), str(e))
+        )
+        sys.exit(1)
+    except Exception as e:
+        logging.critical('Could not interpret implementation parameter as json file to read. Trying to use it as an implementation name directly')
+        return {'default':implementationArgument}
+
+def getImplementationsByTemplateName(implementationNamesByTemplateName, optionFlags):
+    return dict(
+        (templateName, getattr(implementations.fortran, implementationNamesByTemplateName[templateName])(optionFlags))
+        for templateName in implementationNamesByTemplateName.keys()
+    )
+
+class SymbolParsingCache(object):
+    '''Per file cache of what the symbol parsing passes change in the callgraph: the domainDependants of the routines and modules
+    defined in the file, together with the templates they reference. Entries are keyed on the file content and only used if
+    everything the parser reads is the same as when the entry has been stored: the routine and module nodes of the file and the
+    module nodes it imports, in the state they have when the file is reached in the pass. For the import resolution pass, the
+    symbol tables of the imported modules are compared as well. Template ids are compared by the content of the template, since
+    they are generated anew with every callgraph.
+    Entries are stored in cacheDir or, for processes building the same codebase again and again (hf serve), in the
+    entriesByCategory dictionary kept by the caller.'''
+
+    def __init__(self, cgDoc, cacheDir, cacheSettings=None, entriesByCategory=None):
+        self.cgDoc = cgDoc
+        self.cacheDir = cacheDir
+        self.cacheSettings = cacheSettings if cacheSettings != None else []
+        self.entriesByCategory = entriesByCategory
+        self.nodesBySourceName = {}
+        self.templateKeysByID = {}
+        self.symbolTableKeysByModuleName = {}
+        if not self.isEnabled:
+            return
+        self.moduleNodesByName = getModuleNodesByName(cgDoc)
+        for node in cgDoc.getElementsByTagName("routine") + cgDoc.getElementsByTagName("module"):
+            sourceName = node.getAttribute("source")
+            if sourceName in [None, ""]:
+                #callgraph from a version that didn't record the source of modules -> we can't tell which nodes a file changes
+                logging.info("No source recorded for %s %s in the callgraph - symbols are parsed without cache" %(
+                    node.tagName,
+                    node.getAttribute("name")
+                ))
+                self.cacheDir = None
+                self.entriesByCategory = None
+                return
+            self.nodesBySourceName.setdefault(sourceName, []).append(node)
+
+    @property
+    def isEnabled(self):
+        return self.cacheDir != None or self.entriesByCategory != None
+
+    def getOwnNodes(self, fileInDir):
+        #same naming as the source attribute written by H90XMLCallGraphGenerator
+        return self.nodesBySourceName.get(os.path.basename(fileInDir).split('.')[0], [])
+
+    def getTemplateKey(self, templateID):
+        templateKey = self.templateKeysByID.get(templateID)
+        if templateKey == None:
+            template = regionTemplatesByID(self.cgDoc, "domainDependantTemplate").get(templateID)
+            if template == None:
+                template = regionTemplatesByID(self.cgDoc, "parallelRegionTemplate").get(templateID)
+            templateKey = self.getNodeKey(template, omitID=True) if template != None else None
+            self.templateKeysByID[templateID] = templateKey
+        return templateKey
+
+    def getNodeKey(self, node, omitID=False):
+        '''Comparable representation of node and its descendants, with the templates referenced by their content.'''
+        if node.nodeType != Node.ELEMENT_NODE:
+            return node.nodeValue
+        attributes = []
+        for name, value in node.attributes.items():
+            if name == "id" and omitID:
+                continue
+            if name == "id" and node.tagName == "templateRelation":
+                value = self.getTemplateKey(value)
+            attributes.append((name, value))
+        return (
+            node.tagName,
+            tuple(sorted(attributes)),
+            tuple(self.getNodeKey(childNode) for childNode in node.childNodes)
+        )
+
+    def getSymbolAnalysisKey(self, symbolAnalysisByRoutineNameAndSymbolName, moduleName):
+        return tuple(
+            (symbolName, tuple(
+                (
+                    analysis.name,
+                    analysis.symbolType,
+                    analysis.sourceModule,
+                    analysis.sourceSymbol,
+                    tuple(sorted(analysis.aliasNamesByRoutineName.items())),
+                    tuple(sorted(analysis.argumentIndexByRoutineName.items()))
+                )
+                for analysis in analysisPerCallee
+            ))
+            for symbolName, analysisPerCallee in sorted(symbolAnalysisByRoutineNameAndSymbolName.get(moduleName, {}).items())
+        )
+
+    def storeSymbolTableKeys(self, symbolAnalysisByRoutineNameAndSymbolName):
+        '''To be called once the module symbol tables for the import resolution pass have been built.'''
+        if not self.isEnabled:
+            return
+        for moduleName, moduleNode in self.moduleNodesByName.items():
+            self.symbolTableKeysByModuleName[moduleName] = (
+                self.getNodeKey(moduleNode),
+                self.getSymbolAnalysisKey(symbolAnalysisByRoutineNameAndSymbolName, moduleName)
+            )
+
+    def getInputDigest(self, ownNodeKeys, ownNodes, importedModuleNames, passName):
+        ownModuleNames = set(node.getAttribute("name") for node in ownNodes if node.tagName == "module")
+        inputKeys = [ownNodeKeys]
+        for moduleName in sorted(importedModuleNames):
+            if moduleName in ownModuleNames:
+                continue
+            moduleNode = self.moduleNodesByName.get(moduleName)
+            inputKeys.append((
+                moduleName,
+                self.getNodeKey(moduleNode) if moduleNode != None else None,
+                self.symbolTableKeysByModuleName.get(moduleName) if passName == "symbolImports" else None
+            ))
+        #json, since the parser sets str values while nodes loaded from the cache hold unicode
+        return hashlib.sha1(json.dumps(inputKeys)).hexdigest()
+
+    def getCategory(self, fileInDir, passName):
+        return passName + "_" + os.path.basename(fileInDir)
+
+    def load(self, fileInDir, passName, ownNodes, ownNodeKeys):
+        '''Returns the cached entry for fileInDir in case it is valid for the current state of the callgraph, None otherwise.'''
+        if not self.isEnabled:
+            return None
+        category = self.getCategory(fileInDir, passName)
+        key = getContentHash([fileInDir], [passName] + self.cacheSettings)
+        if self.entriesByCategory != None:
+            storedKey, cachedEntry = self.entriesByCategory.get(category, (None, None))
+            if storedKey != key:
+                cachedEntry = None
+        else:
+            cachedEntry = loadCachedObject(self.cacheDir, category, key)
+        if cachedEntry == None:
+            return None
+        if cachedEntry["inputDigest"] != self.getInputDigest(ownNodeKeys, ownNodes, cachedEntry["importedModuleNames"], passName):
+            logging.debug("Cached symbols for %s not used since the callgraph has changed" %(fileInDir))
+            return None
+        return cachedEntry
+
+    def store(self, fileInDir, passName, ownNodes, ownNodeKeys, importedModuleNames, additionalInformation={}):
+        '''ownNodeKeys are the keys of ownNodes from before the pass. The other inputs aren't changed by parsing fileInDir.'''
+        if not self.isEnabled:
+            return
+        templateTexts = []
+        templateIndicesByID = {}
+        domainDependantsTexts = []
+        for node in ownNodes:
+            domainDependantsNode = self.getDomainDependantsNode(node)
+            if domainDependantsNode == None:
+                domainDependantsTexts.append(None)
+                continue
+            domainDependantsNode = domainDependantsNode.cloneNode(True)
+            for relationNode in domainDependantsNode.getElementsByTagName("templateRelation"):
+                templateID = relationNode.getAttribute("id")
+                if not templateID in templateIndicesByID:
+                    templateNode = regionTemplatesByID(self.cgDoc, "domainDependantTemplate")[templateID].cloneNode(True)
+                    templateNode.removeAttribute("id")
+                    templateIndicesByID[templateID] = len(templateTexts)
+                    templateTexts.append(templateNode.toxml())
+                relationNode.setAttribute("id", str(templateIndicesByID[templateID]))
+            domainDependantsTexts.append(domainDependantsNode.toxml())
+        cachedEntry = {
+            "importedModuleNames": sorted(importedModuleNames),
+            "inputDigest": self.getInputDigest(ownNodeKeys, ownNodes, importedModuleNames, passName),
+            "templates": templateTexts,
+            "domainDependants": domainDependantsTexts
+        }
+        cachedEntry.update(additionalInformation)
+        category = self.getCategory(fileInDir, passName)
+        key = getContentHash([fileInDir], [passName] + self.cacheSettings)
+        if self.entriesByCategory != None:
+            #only the latest entry per file and pass is kept, the memory of a long running process would grow otherwise
+            self.entriesByCategory[category] = (key, cachedEntry)
+        else:
+            storeCachedObject(self.cacheDir, category, key, cachedEntry)
+
+    def apply(self, cachedEntry, ownNodes):
+        '''Changes the callgraph the same way as parsing the file again would (other than the ids of new templates).'''
+        import uuid
+        templateLibrary = getOrCreateFirstLevelElement(self.cgDoc, "domainDependantTemplates")
+        templateIDs = []
+        for templateText in cachedEntry["templates"]:
+            templateNode = self.cgDoc.importNode(parseString(templateText).documentElement, True)
+            templateNode.setAttribute("id", str(uuid.uuid4()))
+            templateIDs.append(addTemplateToLibrary(self.cgDoc, templateLibrary, templateNode).getAttribute("id"))
+        for node, domainDependantsText in zip(ownNodes, cachedEntry["domainDependants"]):
+            if domainDependantsText == None:
+                continue
+            domainDependantsNode = self.cgDoc.importNode(parseString(domainDependantsText).documentElement, True)
+            for relationNode in domainDependantsNode.getElementsByTagName("templateRelation"):
+                relationNode.setAttribute("id", templateIDs[int(relationNode.getAttribute("id"))])
+            previousDomainDependantsNode = self.getDomainDependantsNode(node)
+            if previousDomainDependantsNode != None:
+                node.replaceChild(domainDependantsNode, previousDomainDependantsNode)
+            else:
+                node.appendChild(domainDependantsNode)
+            updateStructuralKeyIndex(node)
+
+    def getDomainDependantsNode(self, node):
+        for childNode in node.childNodes:
+            if childNode.nodeType == Node.ELEMENT_NODE and childNode.tagName == "domainDependants":
+                return childNode
+        return None
+
+def parseSymbols(cgDoc, filesInDir, implementationsByTemplateName, profile=None, cacheDir=None, cacheSettings=None,
+    cachedEntriesByCategory=None):
+    #   parse the @domainDependant symbol declarations flags in all h90 files
+    #   -> update the callgraph document with this information.
+    #   note: We do this, since for simplicity reasons, the declaration parser relies on the symbol names that
+    #   have been declared in @domainDependant directives. Since these directives come *after* the declaration,
+    #   we need this pass
+    #   cacheDir: files whose inputs haven't changed since a previous run take their changes to the callgraph from there.
+    #   cacheSettings: everything other than the files that the parsing depends on, e.g. implementations and option flags.
+    #   cachedEntriesByCategory: like cacheDir, but in memory - for callers that parse the symbols of a codebase repeatedly.
+    if profile == None:
+        profile = PreprocessorProfile("parseSymbols")
+    #a new codebase is being built -> the names and domains interned for the previous one (if any) are not needed anymore
+    clearInternedValues()
+    cache = SymbolParsingCache(cgDoc, cacheDir, cacheSettings, cachedEntriesByCategory)
+    selectiveImportsByFile = {}
+    profile.startStage("symbol parsing")
+    for fileNum, fileInDir in enumerate(filesInDir):
+        profile.startFile("symbol parsing", fileInDir)
+        ownNodes = cache.getOwnNodes(fileInDir)
+        ownNodeKeys = [cache.getNodeKey(node) for node in ownNodes] if cache.isEnabled else None
+        cachedEntry = cache.load(fileInDir, "symbols", ownNodes, ownNodeKeys)
+        if cachedEntry != None:
+            cache.apply(cachedEntry, ownNodes)
+            selectiveImportsByFile[fileInDir] = cachedEntry["selectiveImports"]
+            logging.debug("Cached symbol declarations used for " + fileInDir + "")
+        else:
+            parser = H90XMLSymbolDeclarationExtractor(cgDoc, implementationsByTemplateName=implementationsByTemplateName)
+            parser.processFile(fileInDir)
+            selectiveImportsByFile[fileInDir] = parser.selectiveImports
+            cache.store(fileInDir, "symbols", ownNodes, ownNodeKeys, parser.importedModuleNames, {
+                "selectiveImports": parser.selectiveImports
+            })
+            logging.debug("Symbol declarations extracted for " + fileInDir + "")
+        profile.endFile("symbol parsing", fileInDir)
+        printProgressIndicator(sys.stderr, fileInDir, fileNum + 1, len(filesInDir), "Symbol parsing, excluding imports")
+    progressIndicatorReset(sys.stderr)
+    profile.endStage("symbol parsing")
+
+    #   build up symbol table indexed by module name
+    moduleNodesByNameWithoutImplicitImports = getModuleNodesByName(cgDoc)
+    symbolAnalyzer = SymbolDependencyAnalyzer(cgDoc)
+    symbolAnalysisByRoutineNameAndSymbolNameWithoutImplicitImports = symbolAnalyzer.getSymbolAnalysisByRoutine()
+    symbolsByModuleNameAndSymbolNameWithoutImplicitImports = getSymbolsByModuleNameAndSymbolName(
+        ImmutableDOMDocument(cgDoc),
+        moduleNodesByNameWithoutImplicitImports,
+        symbolAnalysisByRoutineNameAndSymbolName=symbolAnalysisByRoutineNameAndSymbolNameWithoutImplicitImports
+    )
+    cache.storeSymbolTableKeys(symbolAnalysisByRoutineNameAndSymbolNameWithoutImplicitImports)
+
+    profile.startStage("symbol import resolution")
+    #   parse the symbols again, this time know about all informations in the sourced modules in import
+    #   -> update the callgraph document with this information.
+    #   note: Files without imports of analysed module symbols would come out of this pass unchanged, so they are skipped
+    #   based on the imports recorded in the first pass.
+    for fileNum, fileInDir in enumerate(filesInDir):
+        printProgressIndicator(sys.stderr, fileInDir, fileNum + 1, len(filesInDir), "Symbol parsing, including imports")
+        if not importsRequireSymbolResolution(selectiveImportsByFile[fileInDir], symbolsByModuleNameAndSymbolNameWithoutImplicitImports):
+            logging.debug("No imports to be resolved in " + fileInDir + "")
+            continue
+        profile.startFile("symbol import resolution", fileInDir)
+        ownNodes = cache.getOwnNodes(fileInDir)
+        ownNodeKeys = [cache.getNodeKey(node) for node in ownNodes] if cache.isEnabled else None
+        cachedEntry = cache.load(fileInDir, "symbolImports", ownNodes, ownNodeKeys)
+        if cachedEntry != None:
+            cache.apply(cachedEntry, ownNodes)
+            logging.debug("Cached symbol imports and declarations used for " + fileInDir + "")
+        else:
+            parser = H90XMLSymbolDeclarationExtractor(
+                cgDoc,
+                symbolsByModuleNameAndSymbolNameWithoutImplicitImports,
+                implementationsByTemplateName=implementationsByTemplateName
+            )
+            parser.processFile(fileInDir)
+            cache.store(fileInDir, "symbolImports", ownNodes, ownNodeKeys, parser.importedModuleNames)
+            logging.debug("Symbol imports and declarations extracted for " + fileInDir + "")
+        profile.endFile("symbol import resolution", fileInDir)
+    progressIndicatorReset(sys.stderr)
+    profile.endStage("symbol import resolution")
+
+class Codebase(object):
+    '''The meta information about the whole codebase that is needed to convert any one of its files to standard Fortran.
+    Once built, it is only being read, so it can be shared by forked workers and reused for as many conversions as needed.
+    The exception are the routine node attributes set by the conversion (see prepareConversion), which are set for each file
+    such that its output doesn't depend on the other files that have been converted before.'''
+
+    def __init__(self, cgDoc, symbolAnalysisByRoutineNameAndSymbolName):
+        #   from here on the callgraph is only being read -> replace it with its immutable version, which releases the minidom document.
+        #   using our immutable version we can speed up ALL THE THINGS through indexed lookups.
+        self.cgDoc = ImmutableDOMDocument(cgDoc)
+        self.symbolAnalysisByRoutineNameAndSymbolName = symbolAnalysisByRoutineNameAndSymbolName
+        self.moduleNodesByName = getModuleNodesByName(self.cgDoc)
+        self.parallelRegionData = getParallelRegionData(self.cgDoc)
+        self.symbolsByModuleNameAndSymbolName = getSymbolsByModuleNameAndSymbolName(
+            self.cgDoc,
+            self.moduleNodesByName,
+            symbolAnalysisByRoutineNameAndSymbolName=symbolAnalysisByRoutineNameAndSymbolName
+        )
+        self.symbolsByRoutineNameAndSymbolName = getSymbolsByRoutineNameAndSymbolName(
+            self.cgDoc,
+            self.parallelRegionData[2],
+            self.parallelRegionData[1],
+            symbolAnalysisByRoutineNameAndSymbolName=symbolAnalysisByRoutineNameAndSymbolName
+        )
+        self.generatedRoutineNodeAttributes = None
+
+    def prepareConversion(self, implementationsByTemplateName):
+        '''Collects the attributes that the conversion of each routine sets on its node, together with the original ones.
+        To be called before any file is converted, e.g. before forking workers, otherwise it's done by the first convertFile.'''
+        self.generatedRoutineNodeAttributes = []
+        for routineNode in self.cgDoc.getElementsByTagName("routine"):
+            implementation = implementationsByTemplateName.get(routineNode.getAttribute("implementationTemplate"))
+            if implementation == None:
+                implementation = implementationsByTemplateName.get("default")
+            if implementation == None:
+                raise Exception("no default implementation defined")
+            generatedAttributes = implementation.generatedRoutineNodeAttributes(routineNode)
+            if len(generatedAttributes) == 0:
+                continue
+            originalAttributes = dict(
+                (name, routineNode.getAttribute(name) if routineNode.hasAttribute(name) else None)
+                for name in generatedAttributes
+            )
+            self.generatedRoutineNodeAttributes.append((routineNode, originalAttributes, generatedAttributes))
+
+    def prepareRoutineNodes(self, fileInDir):
+        '''Callers read the attributes that the conversion sets on the callee's node. Sets them for the routines of all other
+        files, as if these had been converted already, and resets them for the routines of fileInDir, which are converted now.'''
+        sourceName = os.path.basename(fileInDir).split('.')[0]
+        for routineNode, originalAttributes, generatedAttributes in self.generatedRoutineNodeAttributes:
+            attributes = originalAttributes if routineNode.getAttribute("source") == sourceName else generatedAttributes
+            for name, value in attributes.items():
+                if value == None:
+                    routineNode.removeAttribute(name)
+                else:
+                    routineNode.setAttribute(name, value)
+
+    def convertFile(self, fileInDir, outputStream, implementationsByTemplateName):
+        if self.generatedRoutineNodeAttributes == None:
+            self.prepareConversion(implementationsByTemplateName)
+        self.prepareRoutineNodes(fileInDir)
+        converter = H90toF90Converter(
+            self.cgDoc,
+            implementationsByTemplateName,
+            outputStream,
+            self.moduleNodesByName,
+            self.parallelRegionData,
+            self.symbolAnalysisByRoutineNameAndSymbolName,
+            self.symbolsByModuleNameAndSymbolName,
+            self.symbolsByRoutineNameAndSymbolName,
+        )
+        converter.processFile(fileInDir)
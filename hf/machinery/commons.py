@@ -18,8 +18,8 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
 
-import re, logging
-from tools.commons import BracketAnalyzer, Singleton, UsageError, findRightMostOccurrenceNotInsideQuotes, \
+import re, logging, bisect
+from tools.commons import BracketAnalyzer, Singleton, UsageError, \
     splitIntoComponentsAndRemainder, getComponentNameAndBracketContent
 from tools.patterns import RegExPatterns
 
@@ -177,6 +177,45 @@ class FortranRoutineArgumentParser:
         arguments, _ = currBracketAnalyzer.getListOfArgumentsInOpenedBracketsAndRemainder(argumentMatch.group(1))
         self.arguments = arguments
 
+class LineBreakCandidates(object):
+    '''The blanks of a code line that it can be broken up at. The line is scanned once, after that the right most blank
+    outside of quotes can be found for any remainder of the line through bisection.
+    Quotes are paired up the same way as in tools.commons.areIndexesWithinQuotes: In order of appearance, regardless of their
+    type, and only if a remainder contains an even number of them.'''
+    blankOrQuotePattern = re.compile(r'''['" ]''')
+
+    def __init__(self, codeLine):
+        self.quotePositions = []
+        self.blankPositions = []
+        self.blankPositionsByQuoteParity = ([], [])
+        for match in self.blankOrQuotePattern.finditer(codeLine):
+            position = match.start()
+            if match.group(0) != ' ':
+                self.quotePositions.append(position)
+                continue
+            self.blankPositions.append(position)
+            self.blankPositionsByQuoteParity[len(self.quotePositions) % 2].append(position)
+
+    def findRightMostBlankOutsideQuotes(self, searchStart, rightStartAt, remainderLength):
+        '''Returns the position of the right most blank outside quotes in codeLine[searchStart:searchStart + rightStartAt],
+        relative to searchStart. If there is none, the search is widened by 5 characters at a time, as long as the
+        remainder is longer - if nothing is possible to break up it's better to go a little bit over the limit,
+        often the compiler will still cope. Returns -1 if no blank has been found.'''
+        numOfQuotesBefore = bisect.bisect_left(self.quotePositions, searchStart)
+        if (len(self.quotePositions) - numOfQuotesBefore) % 2 != 0:
+            candidates = self.blankPositions
+        else:
+            candidates = self.blankPositionsByQuoteParity[numOfQuotesBefore % 2]
+        candidateIndex = bisect.bisect_left(candidates, searchStart + rightStartAt)
+        if candidateIndex > 0 and candidates[candidateIndex - 1] > searchStart:
+            return candidates[candidateIndex - 1] - searchStart
+        if candidateIndex >= len(candidates):
+            return -1
+        widenedRightStartAt = rightStartAt + ((candidates[candidateIndex] - searchStart - rightStartAt) // 5 + 1) * 5
+        if remainderLength <= widenedRightStartAt:
+            return -1
+        return candidates[bisect.bisect_left(candidates, searchStart + widenedRightStartAt) - 1] - searchStart
+
 class FortranCodeSanitizer:
     def __init__(self):
         self.tabIncreasingPattern = re.compile(r'\s*(?:(?:module|select|do|subroutine|function|program|attributes)|if\W.*?\Wthen)(?:\W|$).*', re.IGNORECASE)
@@ -206,63 +245,59 @@ class FortranCodeSanitizer:
             if len(codeLine) <= howManyCharsPerLine:
                 sanitizedCodeLines.append(codeLine)
                 continue
-            remainder = codeLine
-            previousLineLength = len(remainder)
-            blankPos = -1
-            remainderContainsLineContinuation = False
-            while len(remainder) > howManyCharsPerLine - len(lineSep):
-                isOpenMPDirectiveLine = self.openMPLinePattern.match(remainder) != None
-                isOpenACCDirectiveLine = self.openACCLinePattern.match(remainder) != None
-                if commentChar in remainder and not isOpenMPDirectiveLine and not isOpenACCDirectiveLine:
-                    commentPos = remainder.find(commentChar)
-                    if commentPos <= howManyCharsPerLine:
-                        break
+            #the remainder of the line is always prevLineContinuation + codeLine[searchStart:] - it is only being
+            #built as a string once it's written out.
+            isOpenMPDirectiveLine = self.openMPLinePattern.match(codeLine) != None
+            isOpenACCDirectiveLine = self.openACCLinePattern.match(codeLine) != None
+            lineBreakCandidates = LineBreakCandidates(codeLine)
+            searchStart = 0
+            prevLineContinuation = ""
+            remainderLength = len(codeLine)
+            previousLineLength = remainderLength
+            commentPos = -1
+            if not isOpenMPDirectiveLine and not isOpenACCDirectiveLine:
+                commentPos = codeLine.find(commentChar)
+            while remainderLength > howManyCharsPerLine - len(lineSep):
+                if commentPos >= 0 and commentPos < searchStart:
+                    commentPos = codeLine.find(commentChar, searchStart)
+                if commentPos >= 0 and len(prevLineContinuation) + commentPos - searchStart <= howManyCharsPerLine:
+                    break
                 #find a blank that's NOT within a quoted string
-                searchString = remainder
-                prevLineContinuation = ""
-                if remainderContainsLineContinuation and (isOpenMPDirectiveLine or isOpenACCDirectiveLine):
-                    searchString = remainder[7:]
-                    prevLineContinuation = remainder[:7]
-                elif remainderContainsLineContinuation:
-                    searchString = remainder[2:]
-                    prevLineContinuation = remainder[:2]
-                startOffset = 0
-                while len(searchString) + len(prevLineContinuation) > howManyCharsPerLine - len(lineSep) + startOffset:
-                    blankPos = findRightMostOccurrenceNotInsideQuotes(' ', searchString, rightStartAt=howManyCharsPerLine - len(lineSep) + startOffset)
-                    startOffset += 5 #if nothing is possible to break up it's better to go a little bit over the limit, often the compiler will still cope
-                    if blankPos >= 1:
-                        break
+                blankPos = lineBreakCandidates.findRightMostBlankOutsideQuotes(
+                    searchStart,
+                    howManyCharsPerLine - len(lineSep),
+                    remainderLength
+                )
                 if blankPos < 1:
-                    currLine = remainder
-                    remainder = ""
+                    currLine = prevLineContinuation + codeLine[searchStart:]
+                    remainderLength = 0
                 else:
-                    currLine = prevLineContinuation + searchString[:blankPos] + lineSep
-                    if blankPos >= 1 and isOpenMPDirectiveLine:
-                        remainder = '!$OMP& ' + searchString[blankPos:]
-                        remainderContainsLineContinuation = True
-                    elif blankPos >= 1 and isOpenACCDirectiveLine:
-                        remainder = '!$acc& ' + searchString[blankPos:]
-                        remainderContainsLineContinuation = True
-                    elif blankPos >= 1:
-                        remainder = '& ' + searchString[blankPos:]
-                        remainderContainsLineContinuation = True
+                    currLine = prevLineContinuation + codeLine[searchStart:searchStart + blankPos] + lineSep
+                    searchStart += blankPos
+                    if isOpenMPDirectiveLine:
+                        prevLineContinuation = '!$OMP& '
+                    elif isOpenACCDirectiveLine:
+                        prevLineContinuation = '!$acc& '
+                    else:
+                        prevLineContinuation = '& '
+                    remainderLength = len(prevLineContinuation) + len(codeLine) - searchStart
                 sanitizedCodeLines.append(currLine)
-                if blankPos < 1 or len(remainder) >= previousLineLength:
+                if blankPos < 1 or remainderLength >= previousLineLength:
                     #blank not found or at beginning of line
                     #-> bail out in order to avoid infinite loop - just keep the line as it was.
                     logging.warning(
                         "The following line could not be broken up for Fortran compatibility - no suitable spaces found: %s (remainder: %s)\n" %(
                             currLine,
-                            remainder
+                            prevLineContinuation + codeLine[searchStart:] if remainderLength > 0 else ""
                         ),
                         extra={"hfLineNo":currLineNo, "hfFile":currFile}
                     )
                     break
-                previousLineLength = len(remainder)
+                previousLineLength = remainderLength
             if toBeCommented:
                 currLine = commentChar + " " + currLine
-            if remainder != "":
-                sanitizedCodeLines.append(remainder)
+            if remainderLength > 0:
+                sanitizedCodeLines.append(prevLineContinuation + codeLine[searchStart:])
 
         # ----------- re indent codelines ----------------------------- #
         # ----------- and strip whitespace ---------------------------- #
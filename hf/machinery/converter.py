@@ -24,7 +24,7 @@ from models.routine import Routine, AnalyzableRoutine
 from models.module import Module, ModuleStub
 from models.region import RegionType, RoutineSpecificationRegion
 from tools.metadata import *
-from tools.commons import UsageError, BracketAnalyzer, stacktrace
+from tools.commons import UsageError, BracketAnalyzer, stacktrace, isDebugLoggingEnabled
 from tools.analysis import SymbolDependencyAnalyzer, getAnalysisForSymbol, getArguments
 from machinery.parser import H90CallGraphAndSymbolDeclarationsParser, getSymbolsByName, currFile, currLineNo
 from machinery.commons import FortranCodeSanitizer, ConversionOptions, parseSpecification
@@ -126,15 +126,17 @@ class H90toF90Converter(H90CallGraphAndSymbolDeclarationsParser):
             sys.exit(1)
 
     def switchToNewRegion(self, regionClassName="Region", oldRegion=None):
-        logging.debug("switching to new %s on line %i; called from:\n%s" %(
-            regionClassName,
-            self.lineNo,
-            stacktrace()
-        ))
+        if isDebugLoggingEnabled():
+            logging.debug(
+                "switching to new %s on line %i; called from:\n%s",
+                regionClassName,
+                self.lineNo,
+                stacktrace()
+            )
         self.currRegion = self.currRoutine.createRegion(regionClassName, oldRegion)
 
     def endRegion(self):
-        logging.debug("ending region on line %i" %(self.lineNo))
+        logging.debug("ending region on line %i", self.lineNo)
         self.currRegion = None
 
     def prepareActiveParallelRegion(self, implementationFunctionName):
@@ -263,7 +265,8 @@ This is not allowed for implementations using %s.\
 
     def processModuleEndMatch(self, moduleEndMatch):
         self.prepareLine(moduleEndMatch.group(0), self.tab_outsideSub)
-        self.outputStream.write(self.codeSanitizer.sanitizeLines(self.currModule.implemented() + "\n\n"))
+        for text in self.currModule.implementedElements():
+            self.outputStream.write(self.codeSanitizer.sanitizeLines(text))
         self.currModule = None
         self.implementation.processModuleEnd()
         super(H90toF90Converter, self).processModuleEndMatch(moduleEndMatch)
@@ -305,10 +308,13 @@ This is not allowed for implementations using %s.\
 
     def processParallelRegionMatch(self, parallelRegionMatch):
         super(H90toF90Converter, self).processParallelRegionMatch(parallelRegionMatch)
-        logging.debug(
-            "...parallel region starts on line %i with active symbols %s" %(self.lineNo, str(self.currSymbolsByName.values())),
-            extra={"hfLineNo":currLineNo, "hfFile":currFile}
-        )
+        if isDebugLoggingEnabled():
+            logging.debug(
+                "...parallel region starts on line %i with active symbols %s",
+                self.lineNo,
+                self.currSymbolsByName.values(),
+                extra={"hfLineNo":currLineNo, "hfFile":currFile}
+            )
         if self.currRoutine.node.getAttribute('parallelRegionPosition') != "within":
             self.prepareLine("","")
             return
@@ -18,10 +18,10 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
 
-import os, sys, fileinput, re, traceback, logging
+import os, sys, re, traceback, logging
 from tools.metadata import *
 from models.symbol import *
-from tools.commons import UsageError, BracketAnalyzer
+from tools.commons import UsageError, BracketAnalyzer, isDebugLoggingEnabled
 from tools.analysis import SymbolDependencyAnalyzer, getAnalysisForSymbol, getArguments
 from tools.patterns import RegExPatterns
 from machinery.commons import FortranRoutineArgumentParser, FortranCodeSanitizer, parseSpecification, updateTypeParameterProperties
@@ -92,7 +92,7 @@ class CallGraphParser(object):
         return
 
     def processProcBeginMatch(self, subProcBeginMatch):
-        logging.debug('entering %s' %(subProcBeginMatch.group(1)), extra={"hfLineNo":currLineNo, "hfFile":currFile})
+        logging.debug('entering %s', subProcBeginMatch.group(1), extra={"hfLineNo":currLineNo, "hfFile":currFile})
         self.currSubprocName = subProcBeginMatch.group(1)
         self.currArgumentParser = FortranRoutineArgumentParser()
         self.currArgumentParser.processString(subProcBeginMatch.group(0), self.patterns)
@@ -161,22 +161,24 @@ class CallGraphParser(object):
         return
 
     def processNoneState(self, line):
-        moduleBeginMatch = self.patterns.moduleBeginPattern.match(line)
-        subProcBeginMatch = self.patterns.subprocBeginPattern.match(line)
-        templateMatch = self.patterns.templatePattern.match(line)
-        templateEndMatch = self.patterns.templateEndPattern.match(line)
-        branchMatch = self.patterns.branchPattern.match(line)
-        if branchMatch:
-            self.processBranchMatch(branchMatch)
-        elif templateMatch:
-            self.processTemplateMatch(templateMatch)
-        elif templateEndMatch:
-            self.processTemplateEndMatch(templateEndMatch)
-        elif moduleBeginMatch:
-            self.currModuleName = moduleBeginMatch.group(1)
+        patternName, match = self.patterns.getDispatcher((
+            'branchPattern',
+            'templatePattern',
+            'templateEndPattern',
+            'moduleBeginPattern',
+            'subprocBeginPattern'
+        )).match(line)
+        if patternName == 'branchPattern':
+            self.processBranchMatch(match)
+        elif patternName == 'templatePattern':
+            self.processTemplateMatch(match)
+        elif patternName == 'templateEndPattern':
+            self.processTemplateEndMatch(match)
+        elif patternName == 'moduleBeginPattern':
+            self.currModuleName = match.group(1)
             self.state = 'inside_module'
-            self.processModuleBeginMatch(moduleBeginMatch)
-        elif subProcBeginMatch:
+            self.processModuleBeginMatch(match)
+        elif patternName == 'subprocBeginPattern':
             raise UsageError("please put this Hybrid Fortran subroutine into a module")
         else:
             self.processNoMatch(line)
@@ -188,48 +190,49 @@ class CallGraphParser(object):
         return
 
     def processInsideModuleState(self, line):
-        moduleEndMatch = self.patterns.moduleEndPattern.match(line)
-        domainDependantMatch = self.patterns.domainDependantPattern.match(line)
-        templateMatch = self.patterns.templatePattern.match(line)
-        templateEndMatch = self.patterns.templateEndPattern.match(line)
-        branchMatch = self.patterns.branchPattern.match(line)
-        containsMatch = self.patterns.containsPattern.match(line)
-        interfaceMatch = self.patterns.interfacePattern.match(line)
-        typeMatch = self.patterns.typePattern.match(line)
-
-        if branchMatch:
-            self.processBranchMatch(branchMatch)
-        elif interfaceMatch:
-            self.processInterfaceMatch(interfaceMatch)
+        patternName, match = self.patterns.getDispatcher((
+            'branchPattern',
+            'interfacePattern',
+            'typePattern',
+            'templatePattern',
+            'templateEndPattern',
+            'domainDependantPattern',
+            'moduleEndPattern',
+            'containsPattern'
+        )).match(line)
+        if patternName == 'branchPattern':
+            self.processBranchMatch(match)
+        elif patternName == 'interfacePattern':
+            self.processInterfaceMatch(match)
             if self.state == "inside_branch":
                 self.stateBeforeBranch = 'inside_interface'
             else:
                 self.state = 'inside_interface'
-        elif typeMatch:
-            self.processTypeMatch(typeMatch)
+        elif patternName == 'typePattern':
+            self.processTypeMatch(match)
             if self.state == "inside_branch":
                 self.stateBeforeBranch = 'inside_type'
             else:
                 self.state = 'inside_type'
-        elif templateMatch:
-            self.processTemplateMatch(templateMatch)
-        elif templateEndMatch:
-            self.processTemplateEndMatch(templateEndMatch)
-        elif domainDependantMatch:
+        elif patternName == 'templatePattern':
+            self.processTemplateMatch(match)
+        elif patternName == 'templateEndPattern':
+            self.processTemplateEndMatch(match)
+        elif patternName == 'domainDependantPattern':
             if self.state == "inside_branch":
                 self.stateBeforeBranch = 'inside_moduleDomainDependantRegion'
             else:
                 self.state = 'inside_moduleDomainDependantRegion'
-            self.processDomainDependantMatch(domainDependantMatch)
-        elif moduleEndMatch:
-            self.processModuleEndMatch(moduleEndMatch)
+            self.processDomainDependantMatch(match)
+        elif patternName == 'moduleEndPattern':
+            self.processModuleEndMatch(match)
             self.currModuleName = None
             if self.state == "inside_branch":
                 self.stateBeforeBranch = 'none'
             else:
                 self.state = 'none'
-        elif containsMatch:
-            self.processContainsMatch(containsMatch)
+        elif patternName == 'containsPattern':
+            self.processContainsMatch(match)
             if self.state == "inside_branch":
                 self.stateBeforeBranch = 'inside_module_body'
             else:
@@ -261,35 +264,37 @@ class CallGraphParser(object):
             self.processNoMatch(line)
 
     def processInsideModuleBodyState(self, line):
-        subProcBeginMatch = self.patterns.subprocBeginPattern.match(line)
-        moduleEndMatch = self.patterns.moduleEndPattern.match(line)
-        templateMatch = self.patterns.templatePattern.match(line)
-        templateEndMatch = self.patterns.templateEndPattern.match(line)
-        branchMatch = self.patterns.branchPattern.match(line)
-
-        if branchMatch:
-            self.processBranchMatch(branchMatch)
-        elif templateMatch:
-            self.processTemplateMatch(templateMatch)
-        elif templateEndMatch:
-            self.processTemplateEndMatch(templateEndMatch)
-        elif moduleEndMatch:
-            self.processModuleEndMatch(moduleEndMatch)
+        patternName, match = self.patterns.getDispatcher((
+            'branchPattern',
+            'templatePattern',
+            'templateEndPattern',
+            'moduleEndPattern',
+            'subprocBeginPattern',
+            'subprocEndPattern'
+        )).match(line)
+        if patternName == 'branchPattern':
+            self.processBranchMatch(match)
+        elif patternName == 'templatePattern':
+            self.processTemplateMatch(match)
+        elif patternName == 'templateEndPattern':
+            self.processTemplateEndMatch(match)
+        elif patternName == 'moduleEndPattern':
+            self.processModuleEndMatch(match)
             self.currModuleName = None
             if self.state == "inside_branch":
                 self.stateBeforeBranch = 'none'
             else:
                 self.state = 'none'
-        elif subProcBeginMatch:
-            if (not subProcBeginMatch.group(1) or subProcBeginMatch.group(1) == ''):
+        elif patternName == 'subprocBeginPattern':
+            if (not match.group(1) or match.group(1) == ''):
                 raise UsageError("subprocedure begin without matching subprocedure name")
-            self.processProcBeginMatch(subProcBeginMatch)
+            self.processProcBeginMatch(match)
             if self.state == "inside_branch":
                 self.stateBeforeBranch = 'inside_declarations'
             else:
                 self.state = 'inside_declarations'
             self.processSubprocStartPost()
-        elif (self.patterns.subprocEndPattern.match(line)):
+        elif patternName == 'subprocEndPattern':
             raise UsageError("end subprocedure without matching begin subprocedure")
         else:
             self.processNoMatch(line)
@@ -298,43 +303,43 @@ class CallGraphParser(object):
         return
 
     def processInsideDeclarationsState(self, line):
-        subProcCallMatch = self.patterns.subprocCallPattern.match(line)
-        parallelRegionMatch = self.patterns.parallelRegionPattern.match(line)
-        domainDependantMatch = self.patterns.domainDependantPattern.match(line)
-        subProcEndMatch = self.patterns.subprocEndPattern.match(line)
-        templateMatch = self.patterns.templatePattern.match(line)
-        templateEndMatch = self.patterns.templateEndPattern.match(line)
-        branchMatch = self.patterns.branchPattern.match(line)
-
-        if branchMatch:
-            self.processBranchMatch(branchMatch)
-        elif (domainDependantMatch):
+        patternName, match = self.patterns.getDispatcher((
+            'branchPattern',
+            'domainDependantPattern',
+            'subprocCallPattern',
+            'subprocEndPattern',
+            'parallelRegionPattern',
+            'subprocBeginPattern',
+            'templatePattern',
+            'templateEndPattern'
+        )).match(line)
+        if patternName == 'branchPattern':
+            self.processBranchMatch(match)
+        elif patternName == 'domainDependantPattern':
             if self.state == "inside_branch":
                 self.stateBeforeBranch = 'inside_domainDependantRegion'
             else:
                 self.state = 'inside_domainDependantRegion'
-            self.processDomainDependantMatch(domainDependantMatch)
-        elif subProcCallMatch:
-            self.processCallMatch(subProcCallMatch)
+            self.processDomainDependantMatch(match)
+        elif patternName == 'subprocCallPattern':
+            self.processCallMatch(match)
             if (self.state == "inside_branch" and self.stateBeforeBranch != 'inside_subroutine_call') or (self.state != "inside_branch" and self.state != 'inside_subroutine_call'):
                 self.processCallPost()
-        elif subProcEndMatch:
-            self.processProcEndMatch(subProcEndMatch)
+        elif patternName == 'subprocEndPattern':
+            self.processProcEndMatch(match)
             if self.state == "inside_branch":
                 self.stateBeforeBranch = 'inside_module_body'
             else:
                 self.state = 'inside_module_body'
-        elif parallelRegionMatch:
-            self.processParallelRegionMatch(parallelRegionMatch)
+        elif patternName == 'parallelRegionPattern':
+            self.processParallelRegionMatch(match)
             if self.state == "inside_branch":
                 self.stateBeforeBranch = 'inside_parallelRegion'
             else:
                 self.state = 'inside_parallelRegion'
-        elif (self.patterns.subprocBeginPattern.match(line)):
+        elif patternName == 'subprocBeginPattern':
             raise UsageError("subprocedure within subprocedure not allowed")
-        elif templateMatch:
-            raise UsageError("template directives are only allowed outside of subroutines")
-        elif templateEndMatch:
+        elif patternName in ['templatePattern', 'templateEndPattern']:
             raise UsageError("template directives are only allowed outside of subroutines")
         else:
             importMatch1 = self.patterns.importPattern.match(line)
@@ -362,74 +367,75 @@ class CallGraphParser(object):
 
     def processInsideSubroutineBodyState(self, line):
         #note: Branches (@if statements) are ignored here, we want to keep analyzing their statements for callgraphs.
-        domainDependantMatch = self.patterns.domainDependantPattern.match(line)
-        subProcCallMatch = self.patterns.subprocCallPattern.match(line)
-        parallelRegionMatch = self.patterns.parallelRegionPattern.match(line)
-        domainDependantMatch = self.patterns.domainDependantPattern.match(line)
-        subProcEndMatch = self.patterns.subprocEndPattern.match(line)
-        templateMatch = self.patterns.templatePattern.match(line)
-        templateEndMatch = self.patterns.templateEndPattern.match(line)
-        branchMatch = self.patterns.branchPattern.match(line)
-
-        if branchMatch:
-            self.processBranchMatch(branchMatch)
-        elif domainDependantMatch:
+        patternName, match = self.patterns.getDispatcher((
+            'branchPattern',
+            'domainDependantPattern',
+            'subprocCallPattern',
+            'subprocEndPattern',
+            'parallelRegionPattern',
+            'subprocBeginPattern',
+            'templatePattern',
+            'templateEndPattern'
+        )).match(line)
+        if patternName == 'branchPattern':
+            self.processBranchMatch(match)
+        elif patternName == 'domainDependantPattern':
             if self.state == "inside_branch":
                 self.stateBeforeBranch = 'inside_domainDependantRegion'
             else:
                 self.state = 'inside_domainDependantRegion'
-            self.processDomainDependantMatch(domainDependantMatch)
-        elif subProcCallMatch:
-            self.processCallMatch(subProcCallMatch)
+            self.processDomainDependantMatch(match)
+        elif patternName == 'subprocCallPattern':
+            self.processCallMatch(match)
             if (self.state == "inside_branch" and self.stateBeforeBranch != 'inside_subroutine_call') or (self.state != "inside_branch" and self.state != 'inside_subroutine_call'):
                 self.processCallPost()
-        elif subProcEndMatch:
-            self.processProcEndMatch(subProcEndMatch)
+        elif patternName == 'subprocEndPattern':
+            self.processProcEndMatch(match)
             if self.state == "inside_branch":
                 self.stateBeforeBranch = 'inside_module_body'
             else:
                 self.state = 'inside_module_body'
-        elif parallelRegionMatch:
-            self.processParallelRegionMatch(parallelRegionMatch)
+        elif patternName == 'parallelRegionPattern':
+            self.processParallelRegionMatch(match)
             if self.state == "inside_branch":
                 self.stateBeforeBranch = 'inside_parallelRegion'
             else:
                 self.state = 'inside_parallelRegion'
-        elif self.patterns.subprocBeginPattern.match(line):
+        elif patternName == 'subprocBeginPattern':
             raise UsageError("subprocedure within subprocedure not allowed")
-        elif templateMatch:
-            raise UsageError("template directives are only allowed outside of subroutines")
-        elif templateEndMatch:
+        elif patternName in ['templatePattern', 'templateEndPattern']:
             raise UsageError("template directives are only allowed outside of subroutines")
 
     def processInsideParallelRegionState(self, line):
-        subProcCallMatch = self.patterns.subprocCallPattern.match(line)
-        parallelRegionEndMatch = self.patterns.parallelRegionEndPattern.match(line)
-        templateMatch = self.patterns.templatePattern.match(line)
-        templateEndMatch = self.patterns.templateEndPattern.match(line)
-        branchMatch = self.patterns.branchPattern.match(line)
-
+        patternName, match = self.patterns.getDispatcher((
+            'branchPattern',
+            'subprocCallPattern',
+            'parallelRegionEndPattern',
+            'parallelRegionPattern',
+            'subprocEndPattern',
+            'subprocBeginPattern',
+            'templatePattern',
+            'templateEndPattern'
+        )).match(line)
         newState = None
-        if branchMatch:
-            self.processBranchMatch(branchMatch)
-        elif subProcCallMatch:
-            self.processCallMatch(subProcCallMatch)
+        if patternName == 'branchPattern':
+            self.processBranchMatch(match)
+        elif patternName == 'subprocCallPattern':
+            self.processCallMatch(match)
             if (self.state == "inside_branch" and self.stateBeforeBranch != 'inside_subroutine_call') or (self.state != "inside_branch" and self.state != 'inside_subroutine_call'):
                 self.processCallPost()
-        elif (parallelRegionEndMatch):
-            self.processParallelRegionEndMatch(parallelRegionEndMatch)
+        elif patternName == 'parallelRegionEndPattern':
+            self.processParallelRegionEndMatch(match)
             newState = "inside_subroutine_body"
         # elif (self.patterns.earlyReturnPattern.match(line)):
         #     raise UsageError("early return in the same subroutine within parallelRegion not allowed")
-        elif (self.patterns.parallelRegionPattern.match(line)):
+        elif patternName == 'parallelRegionPattern':
             raise UsageError("parallelRegion within parallelRegion not allowed")
-        elif (self.patterns.subprocEndPattern.match(line)):
+        elif patternName == 'subprocEndPattern':
             raise UsageError("subprocedure end before @end parallelRegion")
-        elif (self.patterns.subprocBeginPattern.match(line)):
+        elif patternName == 'subprocBeginPattern':
             raise UsageError("subprocedure within subprocedure not allowed")
-        elif templateMatch:
-            raise UsageError("template directives are only allowed outside of subroutines")
-        elif templateEndMatch:
+        elif patternName in ['templatePattern', 'templateEndPattern']:
             raise UsageError("template directives are only allowed outside of subroutines")
         else:
             self.processNoMatch(line)
@@ -441,30 +447,35 @@ class CallGraphParser(object):
             self.state = newState
 
     def processInsideModuleDomainDependantRegionState(self, line):
-        domainDependantEndMatch = self.patterns.domainDependantEndPattern.match(line)
-        templateMatch = self.patterns.templatePattern.match(line)
-        templateEndMatch = self.patterns.templateEndPattern.match(line)
-        branchMatch = self.patterns.branchPattern.match(line)
-
+        patternName, match = self.patterns.getDispatcher((
+            'branchPattern',
+            'domainDependantEndPattern',
+            'earlyReturnPattern',
+            'subprocCallPattern',
+            'parallelRegionEndPattern',
+            'parallelRegionPattern',
+            'subprocEndPattern',
+            'subprocBeginPattern',
+            'templatePattern',
+            'templateEndPattern'
+        )).match(line)
         newState = None
-        if branchMatch:
-            self.processBranchMatch(branchMatch)
-        elif domainDependantEndMatch:
-            self.processDomainDependantEndMatch(domainDependantEndMatch)
+        if patternName == 'branchPattern':
+            self.processBranchMatch(match)
+        elif patternName == 'domainDependantEndPattern':
+            self.processDomainDependantEndMatch(match)
             newState = "inside_module"
-        elif (self.patterns.earlyReturnPattern.match(line)):
+        elif patternName == 'earlyReturnPattern':
             raise UsageError("early return not allowed here")
-        elif self.patterns.subprocCallPattern.match(line):
+        elif patternName == 'subprocCallPattern':
             raise UsageError("subprocedure call within domainDependants not allowed")
-        elif (self.patterns.parallelRegionEndPattern.match(line) or self.patterns.parallelRegionPattern.match(line)):
+        elif patternName in ['parallelRegionEndPattern', 'parallelRegionPattern']:
             raise UsageError("parallelRegion within domainDependants not allowed")
-        elif (self.patterns.subprocEndPattern.match(line)):
+        elif patternName == 'subprocEndPattern':
             raise UsageError("subprocedure end before @end domainDependant")
-        elif (self.patterns.subprocBeginPattern.match(line)):
+        elif patternName == 'subprocBeginPattern':
             raise UsageError("subprocedure within subprocedure not allowed")
-        elif templateMatch:
-            raise UsageError("template directives not allowed here")
-        elif templateEndMatch:
+        elif patternName in ['templatePattern', 'templateEndPattern']:
             raise UsageError("template directives not allowed here")
         if newState == None:
             return
@@ -474,30 +485,35 @@ class CallGraphParser(object):
             self.state = newState
 
     def processInsideDomainDependantRegionState(self, line):
-        domainDependantEndMatch = self.patterns.domainDependantEndPattern.match(line)
-        templateMatch = self.patterns.templatePattern.match(line)
-        templateEndMatch = self.patterns.templateEndPattern.match(line)
-        branchMatch = self.patterns.branchPattern.match(line)
-
+        patternName, match = self.patterns.getDispatcher((
+            'branchPattern',
+            'domainDependantEndPattern',
+            'earlyReturnPattern',
+            'subprocCallPattern',
+            'parallelRegionEndPattern',
+            'parallelRegionPattern',
+            'subprocEndPattern',
+            'subprocBeginPattern',
+            'templatePattern',
+            'templateEndPattern'
+        )).match(line)
         newState = None
-        if branchMatch:
-            self.processBranchMatch(branchMatch)
-        elif domainDependantEndMatch:
-            self.processDomainDependantEndMatch(domainDependantEndMatch)
+        if patternName == 'branchPattern':
+            self.processBranchMatch(match)
+        elif patternName == 'domainDependantEndPattern':
+            self.processDomainDependantEndMatch(match)
             newState = "inside_subroutine_body"
-        elif (self.patterns.earlyReturnPattern.match(line)):
+        elif patternName == 'earlyReturnPattern':
             raise UsageError("early return not allowed here")
-        elif self.patterns.subprocCallPattern.match(line):
+        elif patternName == 'subprocCallPattern':
             raise UsageError("subprocedure call within domainDependants not allowed")
-        elif (self.patterns.parallelRegionEndPattern.match(line) or self.patterns.parallelRegionPattern.match(line)):
+        elif patternName in ['parallelRegionEndPattern', 'parallelRegionPattern']:
             raise UsageError("parallelRegion within domainDependants not allowed")
-        elif (self.patterns.subprocEndPattern.match(line)):
+        elif patternName == 'subprocEndPattern':
             raise UsageError("subprocedure end before @end domainDependant")
-        elif (self.patterns.subprocBeginPattern.match(line)):
+        elif patternName == 'subprocBeginPattern':
             raise UsageError("subprocedure within subprocedure not allowed")
-        elif templateMatch:
-            raise UsageError("template directives not allowed here")
-        elif templateEndMatch:
+        elif patternName in ['templatePattern', 'templateEndPattern']:
             raise UsageError("template directives not allowed here")
         if newState == None:
             return
@@ -519,14 +535,21 @@ class CallGraphParser(object):
         #analyse this line. handle the line according to current parser state.
         self.stateSwitch.get(self.state, self.processUndefinedState)(line)
 
-        logging.debug("line processed. parser in '%s' state. active symbols: %s" %(self.state, self.currSymbolsByName.keys()), extra={"hfLineNo":currLineNo, "hfFile":currFile})
+        if isDebugLoggingEnabled():
+            logging.debug("line processed. parser in '%s' state. active symbols: %s", self.state, self.currSymbolsByName.keys(), extra={"hfLineNo":currLineNo, "hfFile":currFile})
 
     def processFile(self, fileName):
         self.lineNo = 1
         self.fileName = fileName
         global currFile
         currFile = os.path.basename(fileName)
-        for line in fileinput.input([fileName]):
+        #read the whole file at once, the lines are kept as they are in the file, including the line breaks.
+        sourceFile = open(fileName, 'r')
+        try:
+            lines = sourceFile.readlines()
+        finally:
+            sourceFile.close()
+        for line in lines:
             try:
                 self.processLine(line)
             except Exception as e:
@@ -593,6 +616,7 @@ class H90XMLCallGraphGenerator(CallGraphParser):
             argument.setAttribute('symbolName', symbolName)
             arguments.appendChild(argument)
         nodeToAppendTo.appendChild(arguments)
+        updateStructuralKeyIndex(nodeToAppendTo)
 
     def processCallPost(self):
         self.processArguments(self.currCallNode)
@@ -610,6 +634,7 @@ class H90XMLCallGraphGenerator(CallGraphParser):
         super(H90XMLCallGraphGenerator, self).processModuleBeginMatch(moduleBeginMatch)
         module = self.doc.createElement('module')
         module.setAttribute('name', self.currModuleName)
+        module.setAttribute('source', os.path.basename(self.fileName).split('.')[0])
         self.modules.appendChild(module)
         self.currModuleNode = module
 
@@ -639,6 +664,7 @@ class H90XMLCallGraphGenerator(CallGraphParser):
     def processParallelRegionEndMatch(self, parallelRegionEndMatch):
         super(H90XMLCallGraphGenerator, self).processParallelRegionEndMatch(parallelRegionEndMatch)
         self.currParallelRegionRelationNode.setAttribute("endLine", str(self.lineNo))
+        updateStructuralKeyIndex(self.currParallelRegionRelationNode)
         self.currParallelRegionTemplateNode = None
         self.currParallelRegionRelationNode = None
 
@@ -677,6 +703,13 @@ class H90XMLCallGraphGenerator(CallGraphParser):
             return
         addAndGetEntries(self.doc, self.currDomainDependantRelationNode, line)
 
+def importsRequireSymbolResolution(selectiveImports, symbolsByModuleNameAndSymbolName):
+    '''True if parsing a file with the given selective imports again, this time with the module symbols available, can change the callgraph'''
+    for moduleName, moduleSymbolParsingRequired in selectiveImports:
+        if moduleSymbolParsingRequired or symbolsByModuleNameAndSymbolName.get(moduleName):
+            return True
+    return False
+
 def getSymbolsByName(cgDoc, parentNode, parallelRegionTemplates=[], currentModuleName=None, currentSymbolsByName={}, symbolAnalysisByRoutineNameAndSymbolName={}, isModuleSymbols=False):
     patterns = RegExPatterns.Instance()
     templatesAndEntries = getDomainDependantTemplatesAndEntries(cgDoc, parentNode)
@@ -802,13 +835,13 @@ class H90CallGraphAndSymbolDeclarationsParser(CallGraphParser):
                 if hasattr(self, 'symbolAnalysisByRoutineNameAndSymbolName') \
                 else {}
         ))
-        logging.debug(
-            "Symbols loaded from template. Symbols currently active in scope: %s. Module Symbol Property: %s" %(
-                str(self.currSymbolsByName.values()),
-                str([self.currSymbolsByName[symbolName].isModuleSymbol for symbolName in self.currSymbolsByName.keys()])
-            ),
-            extra={"hfLineNo":currLineNo, "hfFile":currFile}
-        )
+        if isDebugLoggingEnabled():
+            logging.debug(
+                "Symbols loaded from template. Symbols currently active in scope: %s. Module Symbol Property: %s",
+                self.currSymbolsByName.values(),
+                [self.currSymbolsByName[symbolName].isModuleSymbol for symbolName in self.currSymbolsByName.keys()],
+                extra={"hfLineNo":currLineNo, "hfFile":currFile}
+            )
 
     def createSymbolsForParent(self, parent, symbolNames, parallelRegionTemplates):
         if isinstance(self.cgDoc, ImmutableDOMDocument):
@@ -884,7 +917,7 @@ class H90CallGraphAndSymbolDeclarationsParser(CallGraphParser):
                     symbols = self.createSymbolsForCurrentContext(symbolNamesWithoutDomainDependantSpecs)
                     for symbol in symbols:
                         self.currSymbolsByName[symbol.uniqueIdentifier] = symbol
-                        logging.debug("symbol %s added to current context because of declaration %s" %(symbol, line))
+                        logging.debug("symbol %s added to current context because of declaration %s", symbol, line)
             return matchedSymbols
 
         scopeName = self.currModuleName if isModuleSpecification else self.currSubprocName
@@ -996,7 +1029,7 @@ class H90CallGraphAndSymbolDeclarationsParser(CallGraphParser):
 
     def processSymbolSpecification(self, specTuple, symbol):
         '''process everything that happens per h90 declaration symbol'''
-        logging.debug("processing symbol declaration for %s" %(symbol))
+        logging.debug("processing symbol declaration for %s", symbol)
         isInModuleScope = self.currSubprocName in [None, ""]
         symbol.isMatched = True
         symbol.loadDeclaration(
@@ -1007,7 +1040,7 @@ class H90CallGraphAndSymbolDeclarationsParser(CallGraphParser):
         updateTypeParameterProperties(symbol, self.currSymbolsByName.values())
 
     def processKnownSymbolImportMatch(self, importMatch, symbol):
-        logging.debug("processing symbol import for %s" %(symbol))
+        logging.debug("processing symbol import for %s", symbol)
         symbol.isMatched = True
         moduleName, sourceName = symbol.getModuleNameAndSourceSymbolNameFromImportMatch(importMatch)
         moduleNode = self.moduleNodesByName.get(moduleName)
@@ -1153,7 +1186,7 @@ class H90CallGraphAndSymbolDeclarationsParser(CallGraphParser):
                 continue
             if symbol.isMatched \
             or (routineNode and routineNode.getAttribute('parallelRegionPosition') in [None, '']):
-                logging.debug("removing %s from active symbols" %(dependant))
+                logging.debug("removing %s from active symbols", dependant)
                 del self.currSymbolsByName[dependant]
                 continue
             if len(symbol.domains) == 0:
@@ -1161,7 +1194,7 @@ class H90CallGraphAndSymbolDeclarationsParser(CallGraphParser):
                 #$$$ this code can probably be left away now that we analyze additional module symbols that haven't been declared domain dependant specifically within the module
                 symbol.sourceModule = "HF90_LOCAL_MODULE"
                 symbol.isModuleSymbol = True
-                logging.debug("removing %s from active symbols" %(dependant))
+                logging.debug("removing %s from active symbols", dependant)
                 del self.currSymbolsByName[dependant]
                 continue
             unmatched.append(dependant)
@@ -1188,6 +1221,10 @@ class H90XMLSymbolDeclarationExtractor(H90CallGraphAndSymbolDeclarationsParser):
         self.symbolsByModuleNameAndSymbolName = symbolsByModuleNameAndSymbolName
         self.entryNodesBySymbolName = {}
         self.currSymbols = []
+        #(moduleName, moduleSymbolParsingRequired) for every selective import in the parsed file
+        self.selectiveImports = []
+        #all modules whose nodes or symbols have been read for imports
+        self.importedModuleNames = set()
 
     def udpateActiveSymbols(self, isModule=False):
         currSymbolNames = self.currSymbolsByName.keys()
@@ -1252,7 +1289,16 @@ class H90XMLSymbolDeclarationExtractor(H90CallGraphAndSymbolDeclarationsParser):
                 continue
             symbol.storeDomainDependantEntryNodeAttributes(entryNode)
 
+    def moduleSymbolParsingRequired(self, parentNode):
+        return not self.implementation.supportsNativeModuleImportsWithinKernels \
+            and parentNode.getAttribute("parallelRegionPosition") in ["within", "outside"]
+
+    def processKnownSymbolImportMatch(self, importMatch, symbol):
+        self.importedModuleNames.add(importMatch.group(1))
+        super(H90XMLSymbolDeclarationExtractor, self).processKnownSymbolImportMatch(importMatch, symbol)
+
     def processImport(self, parentNode, uidLocal, uidSource, moduleName, sourceSymbol, symbolInScope):
+        self.importedModuleNames.add(moduleName)
         super(H90XMLSymbolDeclarationExtractor, self).processImport(
             parentNode,
             uidLocal,
@@ -1261,13 +1307,17 @@ class H90XMLSymbolDeclarationExtractor(H90CallGraphAndSymbolDeclarationsParser):
             sourceSymbol,
             symbolInScope
         )
+        if uidLocal and uidSource and sourceSymbol and symbolInScope:
+            self.selectiveImports.append((
+                moduleName,
+                parentNode == None or self.moduleSymbolParsingRequired(parentNode)
+            ))
         if not self.symbolsByModuleNameAndSymbolName:
             return #in case we run this at a point where foreign symbol analysis is not available yet
         if not uidLocal or not uidSource or not sourceSymbol or not symbolInScope:
             return
         symbol = self.currSymbolsByName.get(uidLocal)
-        moduleSymbolParsingRequired = not self.implementation.supportsNativeModuleImportsWithinKernels \
-            and parentNode.getAttribute("parallelRegionPosition") in ["within", "outside"]
+        moduleSymbolParsingRequired = self.moduleSymbolParsingRequired(parentNode)
         moduleSymbolsByName = self.symbolsByModuleNameAndSymbolName.get(moduleName)
         if not moduleSymbolsByName and moduleSymbolParsingRequired:
             raise UsageError(
@@ -1320,7 +1370,7 @@ class H90XMLSymbolDeclarationExtractor(H90CallGraphAndSymbolDeclarationsParser):
     def processModuleEndMatch(self, moduleEndMatch):
         #get handles to currently active symbols -> temporarily save the handles
         self.udpateActiveSymbols(isModule=True)
-        logging.debug("exiting module %s. Storing informations for symbols %s" %(self.currModuleName, str(self.currSymbols)), extra={"hfLineNo":currLineNo, "hfFile":currFile})
+        logging.debug("exiting module %s. Storing informations for symbols %s", self.currModuleName, self.currSymbols, extra={"hfLineNo":currLineNo, "hfFile":currFile})
         #finish parsing -> superclass destroys handles
         super(H90XMLSymbolDeclarationExtractor, self).processModuleEndMatch(moduleEndMatch)
         self.checkScope(isModule=True)
@@ -1334,7 +1384,7 @@ class H90XMLSymbolDeclarationExtractor(H90CallGraphAndSymbolDeclarationsParser):
     def processProcEndMatch(self, subProcEndMatch):
         #get handles to currently active symbols -> temporarily save the handles
         self.udpateActiveSymbols()
-        logging.debug("exiting procedure %s. Storing informations for symbols %s" %(self.currSubprocName, str(self.currSymbols)), extra={"hfLineNo":currLineNo, "hfFile":currFile})
+        logging.debug("exiting procedure %s. Storing informations for symbols %s", self.currSubprocName, self.currSymbols, extra={"hfLineNo":currLineNo, "hfFile":currFile})
         #finish parsing -> superclass destroys handles
         super(H90XMLSymbolDeclarationExtractor, self).processProcEndMatch(subProcEndMatch)
         self.checkScope()
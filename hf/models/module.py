@@ -67,10 +67,20 @@ class Module(object):
 		self._postTextByRoutine[routine.name] = ""
 		return routine
 
-	def implemented(self):
+	def implementedElements(self):
+		'''Yields the implemented module text piece by piece. The text of a routine is only generated once the
+		previous piece has been written, and the routine is released after its text has been yielded, so the text of
+		the whole module is never built.
+		Note: This does not bound the peak memory by the largest routine. All routines of the module are parsed and analysed
+		before the first one is implemented, since routines share the module's symbols (which are updated by the analysis of
+		later routines) and implementations can update routine nodes that are referenced by the callers.
+		What is saved is the implemented text of all but the current routine.
+		Each yielded text is to be sanitized on its own - empty texts separate the module elements.'''
 		routines = []
 		for routine in self.routines:
 			routines += routine.implementation.generateRoutines(routine)
+		self._routinesByNameAndImplementationClass = {}
+		self._firstRoutinesByName = {}
 
 		for routine in routines:
 			routine._analyseSymbolUsage() #need to do this twice to get additional context right
@@ -91,20 +101,23 @@ class Module(object):
 		self._footerText = self._undecidedText
 		self._undecidedText = ""
 
-		implementedModuleElements = \
-			[self._headerText.strip()] \
-			+ [
-				(
-					routine.implemented() + "\n" + self._postTextByRoutine.get(routine.name, "").strip()
-				).strip()
-				for routine in routines
-			] \
-			+ [self._footerText.strip()]
-		purgedModuleElements = [
-			text + "\n" for text in implementedModuleElements
-			if text != ""
-		]
-		return '\n'.join([text for text in purgedModuleElements])
+		hasElements = False
+		for text in self._implementedElementTexts(routines):
+			strippedText = text.strip()
+			if strippedText == "":
+				continue
+			if hasElements:
+				yield ""
+			yield strippedText
+			hasElements = True
+
+	def _implementedElementTexts(self, routines):
+		yield self._headerText
+		routines.reverse()
+		while len(routines) > 0:
+			routine = routines.pop()
+			yield routine.implemented() + "\n" + self._postTextByRoutine.get(routine.name, "").strip()
+		yield self._footerText
 
 class ModuleStub(Module):
 	def __init__(self, name):
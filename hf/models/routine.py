@@ -35,6 +35,8 @@ def getModuleArraysForCallee(calleeName, symbolAnalysisByRoutineNameAndSymbolNam
 			if symbol == None:
 				#this happens for scalars for example
 				continue
+			#the module symbols are shared between all routines - the analysis for this callee goes into a copy
+			symbol = symbol.clone()
 			symbol.analysis = symbolAnalysis
 			moduleSymbols.append(symbol)
 	return moduleSymbols
@@ -20,9 +20,8 @@
 
 import re, sys, copy
 import logging
-import pdb
 from tools.metadata import *
-from tools.commons import enum, BracketAnalyzer, Singleton, UsageError, \
+from tools.commons import enum, BracketAnalyzer, Singleton, UsageError, isDebugLoggingEnabled, \
 	splitTextAtLeftMostOccurrence, splitIntoComponentsAndRemainder, getComponentNameAndBracketContent
 from tools.patterns import RegExPatterns
 from tools.analysis import SymbolDependencyAnalyzer, SymbolType
@@ -218,6 +217,53 @@ def uniqueIdentifier(symbolName, suffix):
 def deviceVersionIdentifier(symbolName):
 	return (symbolName + "_hfdev").strip()
 
+#the same names and domains come up in thousands of symbols - they are interned, such that all symbols share one instance.
+#note: the builtin intern does not support unicode, which is what we get from the callgraph.
+_internedStringsByTypeAndValue = {}
+_internedDomainEntriesByKey = {}
+_internedDomainEntriesByID = {}
+_internedDomainsByEntryIDs = {}
+_internedDomainsByID = {}
+
+def clearInternedValues():
+	'''Releases the interned names and domains - to be called whenever a new codebase is built in the same process,
+	otherwise the tables grow with every build (see serve.py). Existing symbols keep their values, they only don't share
+	them with the symbols created afterwards.
+	Note: The tables can't hold their values weakly, since strings and tuples don't support weak references.'''
+	for table in [
+		_internedStringsByTypeAndValue,
+		_internedDomainEntriesByKey,
+		_internedDomainEntriesByID,
+		_internedDomainsByEntryIDs,
+		_internedDomainsByID
+	]:
+		table.clear()
+
+def internedString(text):
+	if text == None:
+		return None
+	return _internedStringsByTypeAndValue.setdefault((type(text), text), text)
+
+def internedDomains(domains):
+	'''Returns the domains as a tuple of (domain name, domain size) tuples that is shared by all symbols with equal domains.'''
+	if id(domains) in _internedDomainsByID:
+		return domains
+	entries = []
+	for entry in domains:
+		if not id(entry) in _internedDomainEntriesByID:
+			domName, domSize = entry
+			key = (type(domName), domName, type(domSize), domSize)
+			internedEntry = _internedDomainEntriesByKey.get(key)
+			if internedEntry == None:
+				internedEntry = (internedString(domName), internedString(domSize))
+				_internedDomainEntriesByKey[key] = internedEntry
+				_internedDomainEntriesByID[id(internedEntry)] = internedEntry
+			entry = internedEntry
+		entries.append(entry)
+	internedDomains = _internedDomainsByEntryIDs.setdefault(tuple([id(entry) for entry in entries]), tuple(entries))
+	_internedDomainsByID[id(internedDomains)] = internedDomains
+	return internedDomains
+
 MERGEABLE_DEFAULT_SYMBOL_INSTANCE_ATTRIBUTES = {
 	"isDeclaredExplicitely": False,
 	"hasUndecidedDomainSizes": False,
@@ -254,12 +300,64 @@ class ScopeError(Exception):
     pass
 
 class Symbol(object):
+	#tens of thousands of symbols are alive in large codebases -> no per instance dictionaries
+	__slots__ = (
+		"name",
+		"patterns",
+		"analysis",
+		"importPattern",
+		"importMapPattern",
+		"pointerOrAllocatablePattern",
+		"typeDependencyPattern",
+		"initLevel",
+		"routineNode",
+		"declarationSuffix",
+		"template",
+		"createdBy",
+		"intent",
+		"isConstant",
+		"attributes",
+		"parallelRegionPosition",
+		"isOnDevice",
+		"isModuleSymbol",
+		"isUserSpecified",
+		"isDeclaredExplicitely",
+		"hasUndecidedDomainSizes",
+		"isMatched",
+		"usedTypeParameters",
+		"parallelRegionTemplates",
+		"declaredDimensionSizes",
+		"isAutoDom",
+		"isCompacted",
+		"domPPName",
+		"accPPName",
+		"_domains",
+		"_entryNode",
+		"_isUsingDevicePostfix",
+		"_isArgumentOverride",
+		"_nameOfScopeOverride",
+		"_nameInScope",
+		"_isHostSymbol",
+		"_isPresent",
+		"_isToBeTransfered",
+		"_residingModule",
+		"_isTypeParameter",
+		"_declarationPrefix",
+		"_sourceModuleIdentifier",
+		"_sourceSymbol",
+		"_declarationTypeOverride",
+		"_templateDomains",
+		"_kernelDomainNames",
+		"_kernelInactiveDomainSizes",
+		"_knownKernelDomainSizesByName"
+	)
+
 	def __init__(self, name, template=None, patterns=None, symbolEntry=None, scopeNode=None, analysis=None, parallelRegionTemplates=[]):
 		if not name or name == "":
 			raise Exception("Name required for initializing symbol")
 
 		self.loadDefaults()
-		self.name = name
+		self.name = internedString(name)
 		if patterns != None:
 			self.patterns = patterns
 		else:
@@ -292,7 +390,7 @@ class Symbol(object):
 		if ConversionOptions.Instance().debugPrint:
 			import inspect
 			self.createdBy = inspect.getouterframes(inspect.currentframe(), 2)[1][3]
-		logging.debug("[" + self.name + ".init " + str(self.initLevel) + "] initialized")
+		logging.debug("[%s.init %s] initialized", self.name, self.initLevel)
 
 	def __repr__(self):
 		return self.name
@@ -404,7 +502,7 @@ class Symbol(object):
 	def isTypeParameter(self, _isTypeParameter):
 		self._isTypeParameter = _isTypeParameter
 		if self._isTypeParameter:
-			logging.debug("Symbol %s has been found to be a type parameter" %(self))
+			logging.debug("Symbol %s has been found to be a type parameter", self)
 
 	@property
 	def sourceSymbol(self):
@@ -446,6 +544,14 @@ class Symbol(object):
 	def isToBeTransfered(self, _isToBeTransfered):
 		self._isToBeTransfered = _isToBeTransfered
 
+	@property
+	def domains(self):
+		return self._domains
+
+	@domains.setter
+	def domains(self, domains):
+		self._domains = internedDomains(domains)
+
 	@property
 	def isArray(self):
 		if self.domains and len(self.domains) > 0:
@@ -604,8 +710,9 @@ EXAMPLE:\n\
 
 	def loadDefaults(self):
 		def loadAttributesFromObject(obj):
+			#the default containers are modified in place by some symbols -> each symbol needs its own
 			for attribute in obj:
-				setattr(self, attribute, obj[attribute])
+				setattr(self, attribute, copy.copy(obj[attribute]))
 
 		self.intent = None
 		self.isConstant = False
@@ -625,6 +732,23 @@ EXAMPLE:\n\
 		loadAttributesFromObject(MERGEABLE_DEFAULT_SYMBOL_INSTANCE_ATTRIBUTES)
 		loadAttributesFromObject(MERGEABLE_DEFAULT_SYMBOL_INSTANCE_DOMAIN_ATTRIBUTES)
 
+	def clone(self):
+		'''Copy of this symbol that shares all of its state with this symbol. Names, domains, templates and analysis are
+		immutable, so each of the two symbols only gets its own version once a new value is assigned to it (copy on write).
+		The containers that are modified in place are copied right away.'''
+		clone = object.__new__(type(self))
+		for symbolClass in type(self).__mro__:
+			for attributeName in getattr(symbolClass, "__slots__", ()):
+				if not hasattr(self, attributeName):
+					continue
+				value = getattr(self, attributeName)
+				if attributeName == "_knownKernelDomainSizesByName":
+					value = dict((domName, list(domSizes)) for domName, domSizes in value.items())
+				elif attributeName in ["_kernelDomainNames", "_kernelInactiveDomainSizes", "usedTypeParameters"]:
+					value = copy.copy(value)
+				setattr(clone, attributeName, value)
+		return clone
+
 	def merge(self, otherSymbol):
 		def getMergedSimpleAttributeValue(attributeName):
 			mine = getattr(self, attributeName)
@@ -752,7 +876,7 @@ EXAMPLE:\n\
 			self.isHostSymbol = True
 		if "transferHere" in attributes:
 			self._isToBeTransfered = True
-		logging.debug("[" + self.name + ".init " + str(self.initLevel) + "] attributes set")
+		logging.debug("[%s.init %s] attributes set", self.name, self.initLevel)
 
 	def storeDomainDependantEntryNodeAttributes(self, overloadEntryNode=None):
 		domainDependantEntryNode = self._entryNode
@@ -760,7 +884,7 @@ EXAMPLE:\n\
 			domainDependantEntryNode = overloadEntryNode
 		if domainDependantEntryNode == None:
 			raise Exception("no entry node specified for %s - cannot store attributes" %(self.name))
-		logging.debug("[" + self.name + ".init " + str(self.initLevel) + "] storing symbol attributes. Init Level: %s" %(str(self.initLevel)))
+		logging.debug("[%s.init %s] storing symbol attributes. Init Level: %s", self.name, self.initLevel, self.initLevel)
 		if self.intent:
 			domainDependantEntryNode.setAttribute("intent", self.intent)
 		if self.declarationPrefix:
@@ -780,7 +904,7 @@ EXAMPLE:\n\
 			)
 
 	def loadDomainDependantEntryNodeAttributes(self, domainDependantEntryNode, warnOnOverwrite=True):
-		logging.debug("[" + self.name + ".init " + str(self.initLevel) + "] +++++++++ LOADING DOMAIN DEPENDANT NODE ++++++++++ ")
+		logging.debug("[%s.init %s] +++++++++ LOADING DOMAIN DEPENDANT NODE ++++++++++ ", self.name, self.initLevel)
 
 		#   This symbol has an explicit domain dependant entry - make sure to store this as the name used in the scope
 		self._nameInScope = self.name
@@ -800,12 +924,13 @@ EXAMPLE:\n\
 			and self.declaredDimensionSizes == None \
 			else self.declaredDimensionSizes
 		if self.declaredDimensionSizes and len(self.declaredDimensionSizes) > 0 and self.initLevel < Init.ROUTINENODE_ATTRIBUTES_LOADED:
-			self.domains = []
+			domains = []
 			for dimSize in self.declaredDimensionSizes:
 				if dimSize.strip() != "":
-					self.domains.append(('HF_GENERIC_DIM', dimSize))
+					domains.append(('HF_GENERIC_DIM', dimSize))
 					self._kernelInactiveDomainSizes.append(dimSize)
-			logging.debug("[" + self.name + ".init " + str(self.initLevel) + "] dimsizes from domain dependant node: %s " %(str(self.declaredDimensionSizes)))
+			self.domains = domains
+			logging.debug("[%s.init %s] dimsizes from domain dependant node: %s ", self.name, self.initLevel, self.declaredDimensionSizes)
 		self.initLevel = max(self.initLevel, Init.DEPENDANT_ENTRYNODE_ATTRIBUTES_LOADED)
 		self.checkIntegrityOfDomains()
 
@@ -855,7 +980,7 @@ EXAMPLE:\n\
 			))
 		if self.initLevel >= Init.DECLARATION_LOADED and self.declaredDimensionSizes == None:
 			raise Exception("symbol %s is in declaration loaded state, but dimensions are not initialized" %(self.name))
-		logging.debug("domain integrity checked for symbol %s" %(self))
+		logging.debug("domain integrity checked for symbol %s", self)
 
 	def loadTemplateAttributes(self, parallelRegionTemplates=[]):
 		if self.initLevel < Init.TEMPLATE_LOADED:
@@ -871,21 +996,22 @@ EXAMPLE:\n\
 		self.loadDomains(templateDomains, parallelRegionTemplates)
 		self.adjustDomainsToKernelPosition()
 		logging.debug(
-			"[" + str(self) + ".init " + str(self.initLevel) + "] Domains loaded from callgraph information for symbol %s. Parallel active: %s. Parallel Inactive: %s. Declaration Prefix: %s. templateDomains: %s declarationPrefix: %s. Parallel Regions: %i\n" %(
-				str(self),
-				str(self._kernelDomainNames),
-				str(self._kernelInactiveDomainSizes),
-				declarationPrefixFromTemplate,
-				templateDomains,
-				declarationPrefixFromTemplate,
-				len(parallelRegionTemplates)
-			)
+			"[%s.init %s] Domains loaded from callgraph information for symbol %s. Parallel active: %s. Parallel Inactive: %s. Declaration Prefix: %s. templateDomains: %s declarationPrefix: %s. Parallel Regions: %i\n",
+			self,
+			self.initLevel,
+			self,
+			self._kernelDomainNames,
+			self._kernelInactiveDomainSizes,
+			declarationPrefixFromTemplate,
+			templateDomains,
+			declarationPrefixFromTemplate,
+			len(parallelRegionTemplates)
 		)
 
 	def loadDeclarationPrefixFromString(self, declarationPrefix):
 		if declarationPrefix != None and declarationPrefix.strip() != "":
 			self.declarationPrefix = declarationPrefix
-		logging.debug("[" + self.name + ".init " + str(self.initLevel) + "] declaration prefix loaded: %s" %(declarationPrefix))
+		logging.debug("[%s.init %s] declaration prefix loaded: %s", self.name, self.initLevel, declarationPrefix)
 
 	def loadDomains(self, templateDomains, parallelRegionTemplates=[]):
 		if templateDomains == None or len(templateDomains) == 0:
@@ -915,10 +1041,13 @@ EXAMPLE:\n\
 		parallelRegionDomNamesBySize = {}
 		for parallelRegionTemplate in parallelRegionTemplates:
 			regionDomNameAndSize = getDomNameAndSize(parallelRegionTemplate)
-			logging.debug("[" + self.name + ".init " + str(self.initLevel) + "] analyzing domains for parallel region: %s; dependant domsize by name: %s" %(
-				str(regionDomNameAndSize),
-				str(dependantDomSizeByName)
-			))
+			logging.debug(
+				"[%s.init %s] analyzing domains for parallel region: %s; dependant domsize by name: %s",
+				self.name,
+				self.initLevel,
+				regionDomNameAndSize,
+				dependantDomSizeByName
+			)
 			for index, (regionDomName, regionDomSize) in enumerate(regionDomNameAndSize):
 				#The same domain name can sometimes have different domain sizes used in different parallel regions, so we build up a list of these sizes.
 				if not regionDomName in self._knownKernelDomainSizesByName:
@@ -940,11 +1069,10 @@ EXAMPLE:\n\
 			parallelRegionDomNamesBySize[dependantDomSize] = dependantDomName
 
 		#   match the domain sizes to those in the index. this is important so we don't cancel them out later in the region position adjustment code
-		dimsBeforeReset = copy.deepcopy(self.domains)
-		self.domains = []
-		for (dependantDomName, dependantDomSize) in dimsBeforeReset:
-			domNameAlias = parallelRegionDomNamesBySize.get(dependantDomSize, dependantDomName)
-			self.domains.append((domNameAlias, dependantDomSize))
+		self.domains = [
+			(parallelRegionDomNamesBySize.get(dependantDomSize, dependantDomName), dependantDomSize)
+			for (dependantDomName, dependantDomSize) in self.domains
+		]
 
 		#   put the non parallel domains in the '_kernelInactiveDomainSizes' set.
 		for (dependantDomName, dependantDomSize) in self.domains:
@@ -963,20 +1091,20 @@ EXAMPLE:\n\
 			raise Exception("Symbol %s's routine node attributes are loaded without loading the entry node attributes first."
 				%(str(self))
 			)
-		logging.debug("[" + self.name + ".init " + str(self.initLevel) + "] +++++++++ LOADING MODULE NODE ++++++++++ ")
+		logging.debug("[%s.init %s] +++++++++ LOADING MODULE NODE ++++++++++ ", self.name, self.initLevel)
 		self.routineNode = moduleNode #MMU 2015-11-18: $$$ This needs to be commented or rethought
 		self.loadTemplateAttributes()
 		self.updateNameInScope()
 		self.initLevel = max(self.initLevel, Init.ROUTINENODE_ATTRIBUTES_LOADED)
 		self.checkIntegrityOfDomains()
-		logging.debug("[" + self.name + ".init " + str(self.initLevel) + "] symbol attributes loaded from module node. Domains at this point: %s. Init Level: %s" %(str(self.domains), str(self.initLevel)))
+		logging.debug("[%s.init %s] symbol attributes loaded from module node. Domains at this point: %s. Init Level: %s", self.name, self.initLevel, self.domains, self.initLevel)
 
 	def loadRoutineNodeAttributes(self, routineNode, parallelRegionTemplates):
 		if self.initLevel < Init.DEPENDANT_ENTRYNODE_ATTRIBUTES_LOADED:
 			raise Exception("Symbol %s's routine node attributes are loaded without loading the entry node attributes first."
 				%(str(self))
 			)
-		logging.debug("[" + self.name + ".init " + str(self.initLevel) + "] +++++++++ LOADING ROUTINE NODE ++++++++++ ")
+		logging.debug("[%s.init %s] +++++++++ LOADING ROUTINE NODE ++++++++++ ", self.name, self.initLevel)
 		self.routineNode = routineNode
 		#get and check parallelRegionPosition
 		routineName = self.nameOfScope
@@ -994,7 +1122,7 @@ EXAMPLE:\n\
 		self.updateNameInScope()
 		self.initLevel = max(self.initLevel, Init.ROUTINENODE_ATTRIBUTES_LOADED)
 		self.checkIntegrityOfDomains()
-		logging.debug("[" + self.name + ".init " + str(self.initLevel) + "] routine node attributes loaded for symbol %s. Domains at this point: %s" %(self.name, str(self.domains)))
+		logging.debug("[%s.init %s] routine node attributes loaded for symbol %s. Domains at this point: %s", self.name, self.initLevel, self.name, self.domains)
 
 	def adjustDomainsToKernelPosition(self):
 		if self.parallelRegionPosition in [None, ""] and self.declaredDimensionSizes != None:
@@ -1025,7 +1153,7 @@ EXAMPLE:\n\
 				)
 			)
 
-		logging.debug("[" + self.name + ".init " + str(self.initLevel) + "] +++++++++ LOADING DECLARATION ++++++++++ ")
+		logging.debug("[%s.init %s] +++++++++ LOADING DECLARATION ++++++++++ ", self.name, self.initLevel)
 
 		#   The name used in the declaration pattern is just self.name - so store this as the scoped name for now
 		self._nameInScope = self.name
@@ -1071,11 +1199,13 @@ EXAMPLE:\n\
 		knownDimensionSizes = [d for (_, d) in self.domains]
 		if self.isAutoDom and self.hasUndecidedDomainSizes:
 			if len(self.domains) == 0:
+				domains = []
 				for dimensionSize in dimensionSizes:
 					if dimensionSize in knownDimensionSizes:
 						continue
-					self.domains.append(("HF_GENERIC_UNKNOWN_DIM", dimensionSize))
+					domains.append(("HF_GENERIC_UNKNOWN_DIM", dimensionSize))
 					self._kernelInactiveDomainSizes.append(dimensionSize)
+				self.domains = domains
 			elif len(dimensionSizes) != len(self.domains):
 				raise Exception("Symbol %s's declared shape does not match its domainDependant directive. \
 Automatic reshaping is not supported since this is a pointer type. Domains in Directive: %s || dimensions in declaration: %s \
@@ -1089,14 +1219,17 @@ Automatic reshaping is not supported since this is a pointer type. Domains in Di
 		elif self.isAutoDom:
 			# for the stencil use case: user will still specify the dimensions in the declaration
 			# -> autodom picks them up and integrates them as parallel active dims
-			logging.debug("[" + self.name + ".init " + str(self.initLevel) + "] Loading dimensions for autoDom, non-pointer symbol %s. Declared dimensions: %s, Known dimension sizes used for parallel regions: %s, Parallel Active Dims: %s, Parallel Inactive Dims: %s" %(
-				str(self), str(dimensionSizes), str(self._knownKernelDomainSizesByName), str(self._kernelDomainNames), str(self._kernelInactiveDomainSizes)
-			))
+			logging.debug(
+				"[%s.init %s] Loading dimensions for autoDom, non-pointer symbol %s. Declared dimensions: %s, Known dimension sizes used for parallel regions: %s, Parallel Active Dims: %s, Parallel Inactive Dims: %s",
+				self.name, self.initLevel, self, dimensionSizes, self._knownKernelDomainSizesByName, self._kernelDomainNames, self._kernelInactiveDomainSizes
+			)
+			domains = list(self.domains)
 			for dimensionSize in dimensionSizes:
 				if dimensionSize in knownDimensionSizes:
 					continue
-				self.domains.append(("HF_GENERIC_PARALLEL_INACTIVE_DIM", dimensionSize))
+				domains.append(("HF_GENERIC_PARALLEL_INACTIVE_DIM", dimensionSize))
 				self._kernelInactiveDomainSizes.append(dimensionSize)
+			self.domains = domains
 
 		if not self.hasUndecidedDomainSizes:
 			self.adjustDomainsToKernelPosition()
@@ -1113,7 +1246,7 @@ Parallel region position: %s, Current template: %s"
 			self.domains = getReorderedDomainsAccordingToDeclaration(self.domains, dimensionSizes)
 		self.initLevel = max(self.initLevel, Init.DECLARATION_LOADED)
 		self.checkIntegrityOfDomains()
-		logging.debug("[" + self.name + ".init " + str(self.initLevel) + "] declaration loaded for symbol %s. Domains at this point: %s" %(self.name, str(self.domains)))
+		logging.debug("[%s.init %s] declaration loaded for symbol %s. Domains at this point: %s", self.name, self.initLevel, self.name, self.domains)
 
 	def getModuleNameAndSourceSymbolNameFromImportMatch(self, importMatch):
 		sourceModuleName = importMatch.group(1)
@@ -1137,7 +1270,7 @@ Parallel region position: %s, Current template: %s"
 					self.initLevel
 				)
 			)
-		logging.debug("[" + self.name + ".init " + str(self.initLevel) + "] +++++++++ LOADING IMPORT INFORMATION ++++++++++ ")
+		logging.debug("[%s.init %s] +++++++++ LOADING IMPORT INFORMATION ++++++++++ ", self.name, self.initLevel)
 		self._sourceModuleIdentifier = moduleNode.getAttribute('name')
 
 		#   From this point on we need this list set in order for intermittent consistency checks to pass
@@ -1169,10 +1302,9 @@ Parallel region position: %s, Current template: %s"
 			# raise Exception("Symbol %s not found in module information available to Hybrid Fortran. Please use an appropriate @domainDependant specification." %(self.name))
 		informationLoadedFromModule = True
 		logging.debug(
-				"[" + str(self) + ".init " + str(self.initLevel) + "] Loading symbol information for %s imported from %s\n\
-Current Domains: %s\n" %(
-					self.name, self._sourceModuleIdentifier, str(self.domains)
-				)
+				"[%s.init %s] Loading symbol information for %s imported from %s\n\
+Current Domains: %s\n",
+				self, self.initLevel, self.name, self._sourceModuleIdentifier, self.domains
 			)
 		attributes, domains, declarationPrefix, accPP, domPP = getAttributesDomainsDeclarationPrefixAndMacroNames(moduleTemplate, routineTemplate)
 		self.setOptionsFromAttributes(attributes)
@@ -1185,12 +1317,13 @@ Current Domains: %s\n" %(
 		self.initLevel = max(self.initLevel, Init.DECLARATION_LOADED)
 		self.checkIntegrityOfDomains()
 		logging.debug(
-				"[" + str(self) + ".init " + str(self.initLevel) + "] Symbol %s's initialization completed using module information.\nDomains found in module: %s; parallel active: %s; parallel inactive: %s\n" %(
-					str(self),
-					str(domains),
-					str(self._kernelDomainNames),
-					str(self._kernelInactiveDomainSizes)
-				)
+				"[%s.init %s] Symbol %s's initialization completed using module information.\nDomains found in module: %s; parallel active: %s; parallel inactive: %s\n",
+				self,
+				self.initLevel,
+				self,
+				domains,
+				self._kernelDomainNames,
+				self._kernelInactiveDomainSizes
 			)
 
 	def getSanitizedDeclarationPrefix(self, purgeList=None):
@@ -1213,12 +1346,15 @@ Current Domains: %s\n" %(
 		)
 
 	def getDeclarationLine(self, parentRoutine, purgeList=None, patterns=RegExPatterns.Instance(), name_prefix="", useDomainReordering=True, skip_on_missing_declaration=False):
-		logging.debug("[" + self.name + ".init " + str(self.initLevel) + "] Decl.Line.Gen: Purge List: %s, Name Prefix: %s, Domain Reordering: %s, Skip on Missing: %s." %(
-			str(purgeList),
+		logging.debug(
+			"[%s.init %s] Decl.Line.Gen: Purge List: %s, Name Prefix: %s, Domain Reordering: %s, Skip on Missing: %s.",
+			self.name,
+			self.initLevel,
+			purgeList,
 			name_prefix,
-			str(useDomainReordering),
-			str(skip_on_missing_declaration)
-		))
+			useDomainReordering,
+			skip_on_missing_declaration
+		)
 		if skip_on_missing_declaration and (self.declarationPrefix == None or self.declarationPrefix == ""):
 			return ""
 		declarationPrefix = self.getSanitizedDeclarationPrefix(purgeList)
@@ -1438,7 +1574,7 @@ Please specify the domains and their sizes with domName and domSize attributes i
 		else:
 			symbolNameUsedInAccessor = self.nameInScope(useDeviceVersionIfAvailable=useDeviceVersionIfAvailable)
 
-		logging.debug("[" + self.name + ".init " + str(self.initLevel) + "] producing access representation for symbol %s; parallel iterators: %s, offsets: %s" %(self.name, str(iterators), str(offsets)))
+		logging.debug("[%s.init %s] producing access representation for symbol %s; parallel iterators: %s, offsets: %s", self.name, self.initLevel, self.name, iterators, offsets)
 
 		if len(iterators) == 0 \
 		and len(offsets) != 0 \
@@ -1455,20 +1591,21 @@ Please specify the domains and their sizes with domName and domSize attributes i
 		result = symbolNameUsedInAccessor
 
 		if len(self.domains) == 0:
-			logging.debug("[" + self.name + ".init " + str(self.initLevel) + "] Symbol has 0 domains - only returning name.")
+			logging.debug("[%s.init %s] Symbol has 0 domains - only returning name.", self.name, self.initLevel)
 			return result
 		iterators = getIterators(self.domains, iterators, offsets)
 		if len(iterators) == 0:
-			logging.debug("[" + self.name + ".init " + str(self.initLevel) + "] No iterators have been determined - only returning name.")
+			logging.debug("[%s.init %s] No iterators have been determined - only returning name.", self.name, self.initLevel)
 			return result
 
 		needsAdditionalClosingBracket = False
 		result += "( " #we add a space here so there is a higher change that the line can be broken up. iterators with preprocessor macros can take a lot of space.
 		accPP, accPPIsExplicit = self.accPP()
-		logging.debug("[" + self.name + ".init " + str(self.initLevel) + "] accPP Macro: %s, Explicit Macro: %s, Active Domains matching domain dependant template: %s, Number of Parallel Domains: %i\
-Currently loaded template: %s\n" %(
-				accPP, str(accPPIsExplicit), self.activeDomainsMatchSpecification, self.numOfParallelDomains, self.template.toxml() if self.template != None else "None"
-			))
+		if isDebugLoggingEnabled():
+			logging.debug("[%s.init %s] accPP Macro: %s, Explicit Macro: %s, Active Domains matching domain dependant template: %s, Number of Parallel Domains: %i\
+Currently loaded template: %s\n",
+				self.name, self.initLevel, accPP, accPPIsExplicit, self.activeDomainsMatchSpecification, self.numOfParallelDomains, self.template.toxml() if self.template != None else "None"
+			)
 		if self.useOrderingMacro(iterators, useDomainReordering, accPP, accPPIsExplicit):
 			needsAdditionalClosingBracket = True
 			if not accPPIsExplicit and parallelRegionNode:
@@ -1486,10 +1623,7 @@ Currently loaded template: %s\n" %(
 	def getTemplateEntryNodeValues(self, parentName):
 		if not self.template:
 			return None
-		parentNodes = self.template.getElementsByTagName(parentName)
-		if not parentNodes or len(parentNodes) == 0:
-			return None
-		return [entry.firstChild.nodeValue for entry in parentNodes[0].childNodes]
+		return getChildNodeValues(self.template, parentName)
 
 	def getSpecificationTuple(self, line):
 		specTuple = parseSpecification(line)
@@ -1544,6 +1678,8 @@ Currently loaded template: %s\n" %(
 			return "", False
 
 class ImplicitForeignModuleSymbol(Symbol):
+	__slots__ = ()
+
 	def __init__(self, _sourceModuleIdentifier, nameInScope, sourceSymbol, template=None):
 		Symbol.__init__(self, nameInScope, template)
 		self._nameInScope = nameInScope
@@ -1551,6 +1687,8 @@ class ImplicitForeignModuleSymbol(Symbol):
 		self.sourceSymbol = sourceSymbol
 
 class FrameworkArray(Symbol):
+	__slots__ = ("compactedSymbols",)
+
 	def __init__(self, calleeName, declarationPrefix, domains, isOnDevice):
 		if not calleeName or calleeName == "":
 			raise Exception("Name required for initializing framework array")
@@ -0,0 +1,329 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2016 Michel Müller, Tokyo Institute of Technology
+
+# This file is part of Hybrid Fortran.
+
+# Hybrid Fortran is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Hybrid Fortran is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
+
+#Watch mode for development: Keeps the preprocessor state of one architecture in memory and regenerates
+#the P90 files affected by a change in the h90/H90 sources, without going through make and a cold python pipeline.
+#The sources are polled for changes (inotify is not available to python 2 without additional packages).
+#   hf serve -i source -i $HF_DIR/hf_lib -p build/hf_preprocessed -o build/cpu/source -a CPU -m build/cpu/implementationNamesByTemplate
+
+import os, sys, time, subprocess, traceback, logging
+from io import FileIO
+from optparse import OptionParser
+from xml.dom.minidom import Document
+from tools.metadata import parseString, mergeCallGraphFragment
+from tools.commons import UsageError, setupDeferredLogging
+from tools.filesystem import walkDirectory, dirEntries
+from tools.analysis import SymbolDependencyAnalyzer
+from machinery.parser import H90XMLCallGraphGenerator
+from machinery.codebase import Codebase, parseSymbols, getImplementationNamesByTemplateName, getImplementationsByTemplateName
+from machinery.commons import ConversionOptions
+from strip_fortran_line_continuations import pre_sanitize_fortran
+from loopAnalysisWithAnnotatedCallGraph import analyseParallelRegions
+from getSourcesToBeProcessed import getSourcesWithParallelRegionPositionChanges, getSourcesToUpdateForModuleSymbolChanges
+
+def getSourceName(path):
+	#the same as the source attribute of routines in the callgraph
+	return os.path.basename(path).split('.')[0]
+
+def getGeneratedRoutineNodeAttributesByRoutineName(codebase):
+	return dict(
+		(routineNode.getAttribute("name"), sorted(generatedAttributes.items()))
+		for routineNode, _, generatedAttributes in codebase.generatedRoutineNodeAttributes
+	)
+
+def getCallerSourceNames(cgDoc, calleeNames):
+	sourceNamesByRoutineName = {}
+	for routineNode in cgDoc.getElementsByTagName("routine"):
+		sourceNamesByRoutineName.setdefault(routineNode.getAttribute("name"), set()).add(routineNode.getAttribute("source"))
+	callerSourceNames = set()
+	for callNode in cgDoc.getElementsByTagName("call"):
+		if callNode.getAttribute("callee") in calleeNames:
+			callerSourceNames.update(sourceNamesByRoutineName.get(callNode.getAttribute("caller"), set()))
+	return callerSourceNames
+
+def writeIfChanged(path, data):
+	'''Like copy_if_new_or_changed.sh: unchanged files keep their timestamp, so make does not compile them again.'''
+	if os.path.exists(path):
+		currFile = open(path, 'rb')
+		try:
+			if currFile.read() == data:
+				return False
+		finally:
+			currFile.close()
+	currFile = open(path, 'wb')
+	try:
+		currFile.write(data)
+	finally:
+		currFile.close()
+	return True
+
+class IncrementalBuild(object):
+	'''The preprocessor state for one architecture, updated with every change in the sources:
+	callgraph fragments by source file, the symbol parsing results by source file, the analyzed callgraph and the attributes
+	set by the conversion of the last build (to find the sources affected by a change) and the implementations.
+	The symbol parsing passes are only run for the sources whose own callgraph nodes or imported modules have changed
+	(see SymbolParsingCache), while the symbol dependency analysis runs on the whole callgraph for every change.
+	The conversion is limited to the affected sources.'''
+
+	def __init__(self, sourceDirs, preparedDir, outputDir, appliesTo, implementationsByTemplateName, cppFlags=None):
+		self.sourceDirs = sourceDirs
+		self.preparedDir = preparedDir
+		self.outputDir = outputDir
+		self.appliesTo = appliesTo
+		self.implementationsByTemplateName = implementationsByTemplateName
+		self.cppFlags = cppFlags if cppFlags != None else []
+		self.sourceStatesByPath = {}
+		self.scannedSourceStatesByPath = {}
+		self.preparedPathsBySourcePath = {}
+		self.fragmentsByPreparedPath = {}
+		self.analyzedCallgraph = None
+		self.symbolParsingEntriesByCategory = {}
+		self.generatedRoutineNodeAttributesByRoutineName = None
+		self.pendingSourceNames = set()
+
+	def getSourcePaths(self):
+		sourcePaths = []
+		for sourceDir in self.sourceDirs:
+			filePaths, _ = walkDirectory(sourceDir)
+			sourcePaths += [path for path in filePaths if path.endswith(('.h90', '.H90'))]
+		return sourcePaths
+
+	def scan(self):
+		'''Returns the sources that have been added or changed since they have last been marked as up to date
+		and the ones that have been removed since the last scan.'''
+		changedSourcePaths = []
+		scannedSourceStatesByPath = {}
+		for path in self.getSourcePaths():
+			try:
+				fileStat = os.stat(path)
+			except OSError:
+				continue
+			scannedSourceStatesByPath[path] = (fileStat.st_mtime, fileStat.st_size)
+			if self.sourceStatesByPath.get(path) != scannedSourceStatesByPath[path]:
+				changedSourcePaths.append(path)
+		#sources that have failed to be parsed have not been marked as up to date, but can have been prepared already
+		removedSourcePaths = sorted(
+			path for path in set(self.sourceStatesByPath.keys()) | set(self.preparedPathsBySourcePath.keys())
+			if not path in scannedSourceStatesByPath
+		)
+		for path in removedSourcePaths:
+			self.sourceStatesByPath.pop(path, None)
+		self.scannedSourceStatesByPath = scannedSourceStatesByPath
+		return changedSourcePaths, removedSourcePaths
+
+	def markUpToDate(self, sourcePath):
+		'''Stores the state of sourcePath from the last scan, such that it's only reported as changed again once it's been edited.'''
+		self.sourceStatesByPath[sourcePath] = self.scannedSourceStatesByPath[sourcePath]
+
+	def prepareSource(self, sourcePath):
+		'''Does the same as the rules for build/hf_preprocessed in MakefileCommon, i.e. the C preprocessor for H90 files
+		followed by strip_fortran_line_continuations.py.'''
+		preparedPath = os.path.join(self.preparedDir, getSourceName(sourcePath) + ".h90")
+		sourceFile = open(sourcePath, 'r')
+		try:
+			text = sourceFile.read()
+		finally:
+			sourceFile.close()
+		if sourcePath.endswith('.H90'):
+			#Fortran's '//' operator would be taken for a comment by the C preprocessor, and macros can use '`' for line breaks
+			cpp = subprocess.Popen(
+				["gcc", "-E", "-w"] + self.cppFlags + ["-"],
+				stdin=subprocess.PIPE,
+				stdout=subprocess.PIPE,
+				cwd=os.path.dirname(os.path.abspath(sourcePath))
+			)
+			text, _ = cpp.communicate(text.replace("//", "¢"))
+			if cpp.returncode != 0:
+				raise UsageError("C preprocessor failed for %s" %(sourcePath))
+			text = text.replace("`", "\n").replace("¢", "//")
+		preparedText = "".join(pre_sanitize_fortran(text.splitlines(True))) + "\n"
+		writeIfChanged(preparedPath, preparedText)
+		return preparedPath
+
+	def parseCallgraphFragment(self, preparedPath):
+		fragmentDoc = Document()
+		fragmentDoc.appendChild(fragmentDoc.createElement("callGraph"))
+		H90XMLCallGraphGenerator(fragmentDoc).processFile(preparedPath)
+		self.fragmentsByPreparedPath[preparedPath] = fragmentDoc
+
+	def getAnalyzedCallgraph(self, filesInDir):
+		doc = Document()
+		doc.appendChild(doc.createElement("callGraph"))
+		for fileInDir in filesInDir:
+			mergeCallGraphFragment(doc, self.fragmentsByPreparedPath[fileInDir])
+		analyseParallelRegions(doc, self.appliesTo)
+		#the make pipeline passes the callgraph on as XML - going through the same serialization keeps the output identical
+		return doc.toxml()
+
+	def getAffectedSourceNames(self, analyzedCallgraph, changedSourceNames):
+		if self.analyzedCallgraph == None:
+			return None
+		affectedSourceNames = set(changedSourceNames)
+		referenceXML = parseString(self.analyzedCallgraph)
+		inputXML = parseString(analyzedCallgraph)
+		affectedSourceNames.update(getSourcesWithParallelRegionPositionChanges(inputXML, referenceXML))
+		affectedSourceNames.update(getSourcesToUpdateForModuleSymbolChanges(inputXML, referenceXML))
+		return affectedSourceNames
+
+	def convert(self, codebase, fileInDir):
+		outputPath = os.path.join(self.outputDir, getSourceName(fileInDir) + ".P90")
+		temporaryPath = outputPath + ".serve"
+		outputStream = FileIO(temporaryPath, mode="wb")
+		try:
+			codebase.convertFile(fileInDir, outputStream, self.implementationsByTemplateName)
+		finally:
+			outputStream.close()
+		try:
+			currFile = open(temporaryPath, 'rb')
+			try:
+				return writeIfChanged(outputPath, currFile.read())
+			finally:
+				currFile.close()
+		finally:
+			os.remove(temporaryPath)
+
+	def update(self):
+		'''Returns the names of the regenerated sources or None if nothing has changed.'''
+		changedSourcePaths, removedSourcePaths = self.scan()
+		if len(changedSourcePaths) == 0 and len(removedSourcePaths) == 0:
+			return None
+		for sourcePath in removedSourcePaths:
+			preparedPath = self.preparedPathsBySourcePath.pop(sourcePath, None)
+			self.fragmentsByPreparedPath.pop(preparedPath, None)
+			for path in [preparedPath, os.path.join(self.outputDir, getSourceName(sourcePath) + ".P90")]:
+				if path != None and os.path.exists(path):
+					os.remove(path)
+		#a source is only marked as up to date once it's been parsed - if that fails, it's tried again with the next update
+		for sourcePath in changedSourcePaths:
+			preparedPath = self.prepareSource(sourcePath)
+			self.preparedPathsBySourcePath[sourcePath] = preparedPath
+			self.parseCallgraphFragment(preparedPath)
+			self.pendingSourceNames.add(getSourceName(sourcePath))
+			self.markUpToDate(sourcePath)
+
+		filesInDir = [
+			path for path in dirEntries(self.preparedDir, True, 'h90')
+			if path in self.fragmentsByPreparedPath
+		]
+		analyzedCallgraph = self.getAnalyzedCallgraph(filesInDir)
+		affectedSourceNames = self.getAffectedSourceNames(analyzedCallgraph, self.pendingSourceNames)
+		cgDoc = parseString(analyzedCallgraph, immutable=False)
+		parseSymbols(
+			cgDoc,
+			filesInDir,
+			self.implementationsByTemplateName,
+			cachedEntriesByCategory=self.symbolParsingEntriesByCategory
+		)
+		codebase = Codebase(cgDoc, SymbolDependencyAnalyzer(cgDoc).getSymbolAnalysisByRoutine())
+		codebase.prepareConversion(self.implementationsByTemplateName)
+		#callers read the attributes that the conversion sets on their callees (see Codebase.prepareConversion)
+		generatedRoutineNodeAttributesByRoutineName = getGeneratedRoutineNodeAttributesByRoutineName(codebase)
+		if affectedSourceNames != None:
+			affectedSourceNames.update(getCallerSourceNames(codebase.cgDoc, [
+				routineName
+				for routineName in set(generatedRoutineNodeAttributesByRoutineName.keys()) \
+					| set(self.generatedRoutineNodeAttributesByRoutineName.keys())
+				if generatedRoutineNodeAttributesByRoutineName.get(routineName) \
+					!= self.generatedRoutineNodeAttributesByRoutineName.get(routineName)
+			]))
+		regeneratedSourceNames = []
+		for fileInDir in filesInDir:
+			sourceName = getSourceName(fileInDir)
+			if affectedSourceNames != None and not sourceName in affectedSourceNames:
+				continue
+			if self.convert(codebase, fileInDir):
+				regeneratedSourceNames.append(sourceName)
+		self.analyzedCallgraph = analyzedCallgraph
+		self.generatedRoutineNodeAttributesByRoutineName = generatedRoutineNodeAttributesByRoutineName
+		self.pendingSourceNames = set()
+		return regeneratedSourceNames
+
+##################### MAIN ##############################
+if __name__ == '__main__':
+	parser = OptionParser()
+	parser.add_option("-i", "--sourceDirectory", dest="sourceDirs", action="append", default=[],
+										help="watch the h90 and H90 files in DIR recursively (can be given multiple times, e.g. for the project sources and hf_lib)", metavar="DIR")
+	parser.add_option("-p", "--preparedDirectory", dest="preparedDir",
+										help="directory for the sources prepared for parsing (like build/hf_preprocessed)", metavar="DIR")
+	parser.add_option("-o", "--outputDir", dest="outputDir",
+										help="directory to write the P90 files to", metavar="DIR")
+	parser.add_option("-a", "--appliesTo", dest="appliesTo", default="CPU",
+										help="architecture to build for, as specified in the appliesTo section in parallelRegion definitions (default: CPU)")
+	parser.add_option("-m", "--implementation", dest="implementation",
+										help="specify either a FortranImplementation classname or a JSON containing classnames by template name and a 'default' entry", metavar="IMP")
+	parser.add_option("--optionFlags", dest="optionFlags",
+										help="can be used to switch on or off the following flags (comma separated): DO_NOT_TOUCH_GPU_CACHE_SETTINGS")
+	parser.add_option("--cppFlags", dest="cppFlags", default="",
+										help="flags for the C preprocessor run on H90 files, e.g. '-DGPU' (space separated)")
+	parser.add_option("--interval", dest="interval", type="float", default=1.0,
+										help="seconds in between checking the sources for changes (default: 1.0)")
+	parser.add_option("--once", action="store_true", dest="once",
+										help="build once and exit instead of watching the sources")
+	parser.add_option("-d", "--debug", action="store_true", dest="debug",
+										help="show debug print in standard error output")
+	(options, args) = parser.parse_args()
+
+	setupDeferredLogging('preprocessor.log', logging.DEBUG if options.debug else logging.INFO)
+
+	if len(options.sourceDirs) == 0 or not options.preparedDir or not options.outputDir or not options.implementation:
+		logging.error("sourceDirectory, preparedDirectory, outputDir and implementation options are mandatory. Use '--help' for informations on how to use this module")
+		sys.exit(1)
+
+	optionFlags = [flag for flag in options.optionFlags.split(',') if flag not in ['', None]] if options.optionFlags != None else []
+	ConversionOptions.Instance().debugPrint = options.debug
+	for directory in [options.preparedDir, options.outputDir]:
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+	build = IncrementalBuild(
+		options.sourceDirs,
+		options.preparedDir,
+		options.outputDir,
+		"" if options.appliesTo.upper() == "CPU" else options.appliesTo,
+		getImplementationsByTemplateName(getImplementationNamesByTemplateName(options.implementation), optionFlags),
+		[flag for flag in options.cppFlags.split(' ') if flag != '']
+	)
+	exitCode = 0
+	try:
+		while True:
+			startTime = time.time()
+			try:
+				regeneratedSourceNames = build.update()
+				exitCode = 0
+				if regeneratedSourceNames != None:
+					sys.stderr.write("...........%i P90 file(s) regenerated in %.2fs: %s\n" %(
+						len(regeneratedSourceNames), time.time() - startTime, " ".join(regeneratedSourceNames)
+					))
+			except (UsageError, SystemExit) as e:
+				#the parsers exit on errors in the sources - the daemon keeps running. sources that could not be parsed
+				#are not marked as up to date, so they are tried again with the next update.
+				logging.error('Error: %s' %(str(e)))
+				exitCode = 1
+			except Exception as e:
+				logging.critical('Error when updating the build: %s' %(str(e)))
+				logging.info(traceback.format_exc())
+				exitCode = 1
+			for handler in logging.getLogger().handlers:
+				handler.flush()
+			if options.once:
+				break
+			time.sleep(options.interval)
+	except KeyboardInterrupt:
+		pass
+	sys.exit(exitCode)
@@ -4,51 +4,74 @@ from tools.commons import findLeftMostOccurrenceNotInsideQuotes, setupDeferredLo
 
 openMPLinePattern = re.compile(r'\s*\!\$OMP.*', re.IGNORECASE)
 openACCLinePattern = re.compile(r'\s*\!\$ACC.*', re.IGNORECASE)
-emptyLinePattern = re.compile(r'(.*?)(?:[\n\r\f\v]+[ \t]*)+(.*)', re.DOTALL)
-multiLineContinuationPattern = re.compile(r'(.*?)\s*\&\s+(?:\!?\$?(?:OMP|ACC)?\&)?\s*(.*)', re.DOTALL)
+#a line break together with all following empty lines and the indentation of the next line
+emptyLinePattern = re.compile(r'[\n\r\f\v][ \t\n\r\f\v]*')
+emptyLineCharacters = " \t\n\r\f\v"
+multiLineContinuationPattern = re.compile(r'\s*\&\s+(?:\!?\$?(?:OMP|ACC)?\&)?\s*')
 
-fileInputObject = None
-if len(sys.argv) > 1:
-	fileInputObject = fileinput.input(sys.argv[1])
-else:
-	fileInputObject = fileinput.input()
-
-def pre_sanitize_fortran():
+def strip_comments(lines):
 	#first pass: strip out commented code (otherwise we could get in trouble when removing line continuations, if there are comments in between)
-	noComments = ""
-	for line in fileInputObject:
+	for line in lines:
 		if openMPLinePattern.match(line) or openACCLinePattern.match(line):
-			noComments += line
+			yield line
 			continue
 		commentIndex = findLeftMostOccurrenceNotInsideQuotes("!", line)
 		if commentIndex < 0:
-			noComments += line
+			yield line
 			continue
-		noComments += line[:commentIndex] + "\n"
+		yield line[:commentIndex] + "\n"
 
+def strip_empty_lines(texts):
 	#second pass: strip out empty lines (otherwise we could get in trouble when removing line continuations, if there are empty lines in between)
-	stripped = ""
-	remainder = noComments
-	while True:
-		emptyLineMatch = emptyLinePattern.match(remainder)
-		if not emptyLineMatch:
-			stripped += remainder
-			break
-		stripped += emptyLineMatch.group(1) + "\n"
-		remainder = emptyLineMatch.group(2)
+	lineBreakPending = False
+	for text in texts:
+		if lineBreakPending:
+			text = text.lstrip(emptyLineCharacters)
+			if text == "":
+				continue
+			yield "\n"
+			lineBreakPending = False
+		text = emptyLinePattern.sub("\n", text)
+		if text.endswith("\n"):
+			#the empty lines may continue in the next text
+			lineBreakPending = True
+			text = text[:-1]
+		yield text
+	if lineBreakPending:
+		yield "\n"
+
+def split_lines(texts):
+	remainder = ""
+	for text in texts:
+		lines = (remainder + text).split("\n")
+		remainder = lines.pop()
+		for line in lines:
+			yield line + "\n"
+	if remainder != "":
+		yield remainder
 
-	#third pass: remove line continuations
-	remainder = stripped
-	output = ""
-	while True:
-		lineContinuationMatch = multiLineContinuationPattern.match(remainder)
-		if not lineContinuationMatch:
-			output += remainder
-			break
-		output += lineContinuationMatch.group(1) + " "
-		remainder = lineContinuationMatch.group(2)
+def remove_line_continuations(lines):
+	#third pass: remove line continuations. A continuation spans from an '&' at the end of a line to an optional '&' at the beginning of the next one,
+	#so lines are kept back only as long as one of these could follow.
+	pendingLines = []
+	for line in lines:
+		if len(pendingLines) > 0 and not pendingLines[-1].rstrip().endswith("&") and not line.lstrip().startswith("&"):
+			yield multiLineContinuationPattern.sub(" ", "".join(pendingLines))
+			pendingLines = []
+		pendingLines.append(line)
+	if len(pendingLines) > 0:
+		yield multiLineContinuationPattern.sub(" ", "".join(pendingLines))
 
-	print output
+def pre_sanitize_fortran(lines):
+	return remove_line_continuations(split_lines(strip_empty_lines(strip_comments(lines))))
 
-setupDeferredLogging('preprocessor.log', logging.INFO)
-pre_sanitize_fortran()
\ No newline at end of file
+if __name__ == '__main__':
+	fileInputObject = None
+	if len(sys.argv) > 1:
+		fileInputObject = fileinput.input(sys.argv[1])
+	else:
+		fileInputObject = fileinput.input()
+	setupDeferredLogging('preprocessor.log', logging.INFO)
+	for text in pre_sanitize_fortran(fileInputObject):
+		sys.stdout.write(text)
+	sys.stdout.write("\n")
@@ -145,9 +145,21 @@ class SymbolDependencyAnalyzer:
         callsByCalleeName = getCallIndexByAttribute("callee")
         callsByCallerName = getCallIndexByAttribute("caller")
         callGraphEdgesByCallerName = {}
-        callGraphEdgesByCalleeName = {}
 
-        def addCallees(routineName):
+        #walk the callgraph from its roots using a worklist, such that every routine is expanded only once.
+        #recursing over every path would grow with the number of call paths and fail for deep callgraphs.
+        callGraphRootRoutineNames = [
+            routineName
+            for routineName in routinesByName.keys()
+            if len(callsByCalleeName.get(routineName, [])) == 0
+        ]
+        expandedRoutineNames = set()
+        routineNamesToExpand = list(callGraphRootRoutineNames)
+        while len(routineNamesToExpand) > 0:
+            routineName = routineNamesToExpand.pop()
+            if routineName in expandedRoutineNames:
+                continue
+            expandedRoutineNames.add(routineName)
             for call in callsByCallerName.get(routineName, []):
                 callerName = call.getAttribute("caller")
                 if callerName != routineName:
@@ -156,18 +168,7 @@ class SymbolDependencyAnalyzer:
                 edgeList = callGraphEdgesByCallerName.get(routineName, [])
                 edgeList.append((callerName, calleeName))
                 callGraphEdgesByCallerName[routineName] = edgeList
-                edgeList = callGraphEdgesByCalleeName.get(calleeName, [])
-                edgeList.append((callerName, calleeName))
-                callGraphEdgesByCalleeName[calleeName] = edgeList
-                addCallees(calleeName)
-
-        callGraphRootRoutineNames = [
-            routineName
-            for routineName in routinesByName.keys()
-            if len(callsByCalleeName.get(routineName, [])) == 0
-        ]
-        for routineName in callGraphRootRoutineNames:
-            addCallees(routineName)
+                routineNamesToExpand.append(calleeName)
 
         #at this point we should have the complete callgraph
         self.callGraphEdgesByCallerName = callGraphEdgesByCallerName
@@ -176,54 +177,36 @@ class SymbolDependencyAnalyzer:
         self.callsByCallerName = callsByCallerName
         self.doc = doc
         self.symbolsNode = createOrGetFirstNodeWithName('symbols', doc)
+        self.localSymbolInformationByRoutineName = {}
+        self.argumentsByNode = {}
+        self.originAnalysisByRoutineNameAndSymbolName = {}
+
+    def getArgumentsCached(self, node):
+        arguments = self.argumentsByNode.get(node)
+        if arguments == None:
+            arguments = getArguments(node)
+            self.argumentsByNode[node] = arguments
+        return arguments
+
+    def getLocalSymbolInformation(self, routineName):
+        '''(name, sourceModule, sourceSymbol) for the domain dependant entries of a routine - parsed once per routine'''
+        localSymbolInformation = self.localSymbolInformationByRoutineName.get(routineName)
+        if localSymbolInformation != None:
+            return localSymbolInformation
+        localSymbolInformation = [
+            (entry.firstChild.nodeValue, entry.getAttribute("sourceModule"), entry.getAttribute("sourceSymbol"))
+            for (_, entry) in getDomainDependantTemplatesAndEntries(self.doc, self.routinesByName[routineName])
+        ]
+        self.localSymbolInformationByRoutineName[routineName] = localSymbolInformation
+        return localSymbolInformation
 
-    def getSymbolAnalysisFor(self, routineName, symbolAnalysis=None, symbolAnalysisByNameAndSource=None, call=None, analysisWarningsByCalleeName=None):
-        if symbolAnalysis == None:
-            symbolAnalysis = {}
-        if symbolAnalysisByNameAndSource == None:
-            symbolAnalysisByNameAndSource = {}
-        if analysisWarningsByCalleeName == None:
-            analysisWarningsByCalleeName = {}
-        routine = self.routinesByName.get(routineName)
-        if not routine:
-            return symbolAnalysis, symbolAnalysisByNameAndSource
-        routineArguments = getArguments(routine)
-        callArguments = []
-        if call != None:
-            callArguments = getArguments(call)
-            if call.getAttribute("callee") != routineName:
-                raise Exception("call passed to analysis of %s is not a call to this routine: %s" %(
-                    routineName,
-                    prettyprint(call)
-                ))
-            if len(callArguments) != len(routineArguments):
-                warnings = analysisWarningsByCalleeName.get(routineName, [])
-                warnings.append((call.getAttribute("caller"), len(callArguments), len(routineArguments), str(callArguments)))
-                analysisWarningsByCalleeName[routineName] = warnings
-                return symbolAnalysis, symbolAnalysisByNameAndSource
-
-        templates_and_entries = getDomainDependantTemplatesAndEntries(
-            self.doc,
-            routine
-        )
+    def getLocalSymbolAnalysis(self, routineName, routineArguments):
         analysisToAdd = {}
-
-        #check arguments to this routine - temporarily remove previous calls from the analysis.
-        #we don't want to overwrite information from previous calls.
-        temporarilyStoredAnalysisByArgumentName = {}
-        for argIndex, _ in enumerate(callArguments):
-            localArgumentName = routineArguments[argIndex]
-            if not (routineName, localArgumentName) in symbolAnalysis:
-                continue
-            temporarilyStoredAnalysisByArgumentName[localArgumentName] = symbolAnalysis[(routineName, localArgumentName)]
-            del symbolAnalysis[(routineName, localArgumentName)]
-
-        #Symbol Analysis based on local information
-        for (_, entry) in templates_and_entries:
+        for (symbolName, sourceModule, sourceSymbol) in self.getLocalSymbolInformation(routineName):
             analysis = SymbolAnalysis()
-            analysis.name = entry.firstChild.nodeValue
-            analysis.sourceModule = entry.getAttribute("sourceModule")
-            analysis.sourceSymbol = entry.getAttribute("sourceSymbol")
+            analysis.name = symbolName
+            analysis.sourceModule = sourceModule
+            analysis.sourceSymbol = sourceSymbol
             analysis.aliasNamesByRoutineName[routineName] = analysis.name
             argIndex = -1
             try:
@@ -247,59 +230,112 @@ class SymbolDependencyAnalyzer:
             analysis.symbolType = SymbolType.ARGUMENT
             analysis.argumentIndexByRoutineName[routineName] = argIndex
             analysisToAdd[analysis.name] = analysis
-
-        #Symbol Analysis based on caller
-        #--> check whether an analysis has already been done, update that and add it under the current routine, symbolName tuple
-        for symbolName in analysisToAdd.keys():
-            currentAnalysis = analysisToAdd[symbolName]
-            argIndex = currentAnalysis.argumentIndexByRoutineName.get(routineName, -1)
-            existingSymbolAnalysis = None
-            if argIndex > -1 and len(callArguments) > 0:
-                symbolNameInCaller = callArguments[argIndex]
-                callerName = call.getAttribute("caller")
-                existingSymbolAnalysis = symbolAnalysis.get((callerName, symbolNameInCaller), [])
-            elif currentAnalysis.isModuleSymbol:
-                existingModuleSymbolAnalysis = symbolAnalysisByNameAndSource.get((currentAnalysis.sourceSymbol, currentAnalysis.sourceModule))
-                if existingModuleSymbolAnalysis:
-                    existingSymbolAnalysis = [existingModuleSymbolAnalysis]
-                else:
-                    existingSymbolAnalysis = []
-            else:
-                existingSymbolAnalysis = [currentAnalysis]
-            for analysis in existingSymbolAnalysis:
-                if not isinstance(analysis, SymbolAnalysis):
-                    raise Exception("unexpected error in routine %s: current analysis list contains unexpected objects: %s" %(
+        return analysisToAdd
+
+    def getSymbolAnalysisFor(self, routineName, symbolAnalysis=None, analysisWarningsByCalleeName=None):
+        '''Analyse the callgraph downstream from routineName.
+        Routines are visited depth first in call order, since the first analysis that reaches a symbol is the one being used later.
+        The callees of a routine are only analysed again when a call binds an analysis to one of its arguments that hasn't been bound there
+        before - otherwise everything downstream is already known. The effort is therefore bound by the number of routines and the
+        number of distinct (routine, argument, analysis) bindings instead of the number of paths through the callgraph.'''
+        if symbolAnalysis == None:
+            symbolAnalysis = {}
+        if analysisWarningsByCalleeName == None:
+            analysisWarningsByCalleeName = {}
+        symbolAnalysisByNameAndSource = {}
+        boundAnalysisByRoutineNameAndSymbolName = {}
+        analysedRoutineNames = set()
+        analysedArgumentBindings = set()
+        routinesToAnalyse = [(routineName, None, None)]
+        while len(routinesToAnalyse) > 0:
+            routineName, call, argumentBindings = routinesToAnalyse.pop()
+            routine = self.routinesByName.get(routineName)
+            if not routine:
+                continue
+            routineArguments = self.getArgumentsCached(routine)
+            callArguments = []
+            if call != None:
+                callArguments = self.getArgumentsCached(call)
+                if call.getAttribute("callee") != routineName:
+                    raise Exception("call passed to analysis of %s is not a call to this routine: %s" %(
                         routineName,
-                        str(existingSymbolAnalysis)
+                        prettyprint(call)
                     ))
+                if len(callArguments) != len(routineArguments):
+                    warnings = analysisWarningsByCalleeName.get(routineName, [])
+                    warnings.append((call.getAttribute("caller"), len(callArguments), len(routineArguments), str(callArguments)))
+                    analysisWarningsByCalleeName[routineName] = warnings
+                    continue
 
-            if len(existingSymbolAnalysis) == 0 or (len(existingSymbolAnalysis) == 1 and existingSymbolAnalysis[0] == currentAnalysis):
-                symbolAnalysis[(routineName, symbolName)] = [currentAnalysis]
-                if currentAnalysis.isModuleSymbol:
-                    symbolAnalysisByNameAndSource[(currentAnalysis.sourceSymbol, currentAnalysis.sourceModule)] = currentAnalysis
-            else:
-                for analysis in existingSymbolAnalysis:
-                    analysis.updateWith(currentAnalysis, routineName)
-                symbolAnalysis[(routineName, symbolName)] = existingSymbolAnalysis
+            isNewBinding = not routineName in analysedRoutineNames
+            analysedRoutineNames.add(routineName)
+
+            #Symbol Analysis based on local information
+            analysisToAdd = self.getLocalSymbolAnalysis(routineName, routineArguments)
+
+            #Symbol Analysis based on caller
+            #--> check whether an analysis has already been done, update that and add it under the current routine, symbolName tuple
+            for symbolName in analysisToAdd.keys():
+                currentAnalysis = analysisToAdd[symbolName]
+                argIndex = currentAnalysis.argumentIndexByRoutineName.get(routineName, -1)
+                existingSymbolAnalysis = None
+                if argIndex > -1 and len(callArguments) > 0:
+                    existingSymbolAnalysis = list(argumentBindings[argIndex])
+                elif currentAnalysis.isModuleSymbol:
+                    existingModuleSymbolAnalysis = symbolAnalysisByNameAndSource.get((currentAnalysis.sourceSymbol, currentAnalysis.sourceModule))
+                    if existingModuleSymbolAnalysis:
+                        existingSymbolAnalysis = [existingModuleSymbolAnalysis]
+                    else:
+                        existingSymbolAnalysis = []
+                else:
+                    existingSymbolAnalysis = [currentAnalysis]
+
+                if len(existingSymbolAnalysis) == 0 or (len(existingSymbolAnalysis) == 1 and existingSymbolAnalysis[0] == currentAnalysis):
+                    if not currentAnalysis.isModuleSymbol:
+                        #symbols originating in this routine get the same analysis on every visit, such that it can be matched in callees
+                        currentAnalysis = self.originAnalysisByRoutineNameAndSymbolName.setdefault((routineName, symbolName), currentAnalysis)
+                    boundAnalysis = [currentAnalysis]
+                    if currentAnalysis.isModuleSymbol:
+                        symbolAnalysisByNameAndSource[(currentAnalysis.sourceSymbol, currentAnalysis.sourceModule)] = currentAnalysis
+                else:
+                    for analysis in existingSymbolAnalysis:
+                        analysis.updateWith(currentAnalysis, routineName)
+                    boundAnalysis = existingSymbolAnalysis
+                boundAnalysisByRoutineNameAndSymbolName[(routineName, symbolName)] = boundAnalysis
+
+                #arguments collect the analyses of all calls to this routine, everything else keeps the latest analysis.
+                if argIndex > -1 and len(callArguments) > 0:
+                    newAnalysis = []
+                    for analysis in boundAnalysis:
+                        if (routineName, argIndex, analysis) in analysedArgumentBindings:
+                            continue
+                        analysedArgumentBindings.add((routineName, argIndex, analysis))
+                        newAnalysis.append(analysis)
+                    if len(newAnalysis) > 0:
+                        symbolAnalysis[(routineName, symbolName)] = symbolAnalysis.get((routineName, symbolName), []) + newAnalysis
+                        isNewBinding = True
+                else:
+                    symbolAnalysis[(routineName, symbolName)] = boundAnalysis
 
-        #Analyse callgraph downstream from here
-        for call in self.callsByCallerName.get(routineName, []):
-            if call.getAttribute("caller") != routineName:
-                raise Exception(
-                    "unexpected error when constructing callgraph for symbol aliases"
-                )
-            calleeName = call.getAttribute("callee")
-            symbolAnalysis, symbolAnalysisByNameAndSource = self.getSymbolAnalysisFor(
-                calleeName,
-                symbolAnalysis=symbolAnalysis,
-                symbolAnalysisByNameAndSource=symbolAnalysisByNameAndSource,
-                call=call,
-                analysisWarningsByCalleeName=analysisWarningsByCalleeName
-            )
-        for argumentName in temporarilyStoredAnalysisByArgumentName.keys():
-            symbolAnalysis[(routineName, argumentName)] = temporarilyStoredAnalysisByArgumentName[argumentName] + symbolAnalysis.get((routineName, argumentName), [])
+            #analysing the callees again with already known analyses bound to this routine's arguments doesn't add any information
+            if not isNewBinding:
+                continue
 
-        return symbolAnalysis, symbolAnalysisByNameAndSource
+            #Analyse callgraph downstream from here - pushed in reverse such that the calls are analysed in order
+            for call in reversed(self.callsByCallerName.get(routineName, [])):
+                if call.getAttribute("caller") != routineName:
+                    raise Exception(
+                        "unexpected error when constructing callgraph for symbol aliases"
+                    )
+                routinesToAnalyse.append((
+                    call.getAttribute("callee"),
+                    call,
+                    [
+                        tuple(boundAnalysisByRoutineNameAndSymbolName.get((routineName, symbolNameInCaller), []))
+                        for symbolNameInCaller in self.getArgumentsCached(call)
+                    ]
+                ))
+        return symbolAnalysis
 
     def getRootRoutines(self):
         return [
@@ -312,7 +348,7 @@ class SymbolDependencyAnalyzer:
         symbolAnalysis = {}
         analysisWarningsByCalleeName = {}
         for routine in self.getRootRoutines():
-            symbolAnalysis, _ = self.getSymbolAnalysisFor(
+            symbolAnalysis = self.getSymbolAnalysisFor(
                 routine.getAttribute("name"),
                 symbolAnalysis=symbolAnalysis,
                 analysisWarningsByCalleeName=analysisWarningsByCalleeName
@@ -322,9 +358,8 @@ class SymbolDependencyAnalyzer:
 
     def getSymbolAnalysisForCallGraphStartingFrom(self, routineName):
         analysisWarningsByCalleeName = {}
-        symbolAnalysis, _ = self.getSymbolAnalysisFor(
+        symbolAnalysis = self.getSymbolAnalysisFor(
             routineName,
-            symbolAnalysis=symbolAnalysis,
             analysisWarningsByCalleeName=analysisWarningsByCalleeName
         )
         emitSymbolAnalysisWarnings(analysisWarningsByCalleeName)
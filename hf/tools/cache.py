@@ -0,0 +1,134 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2016 Michel Müller, Tokyo Institute of Technology
+
+# This file is part of Hybrid Fortran.
+
+# Hybrid Fortran is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Hybrid Fortran is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
+
+import os, errno, hashlib, logging
+import cPickle as pickle
+from tools.filesystem import dirEntries
+
+#increase this whenever the layout of cached objects changes
+cacheFormatVersion = 1
+maxNumOfCacheEntriesPerCategory = 4
+preprocessorSourceHash = None
+
+def getFileContentHash(path):
+    contentHash = hashlib.sha1()
+    currFile = open(str(path), 'rb')
+    try:
+        while True:
+            block = currFile.read(1024*1024)
+            if not block:
+                break
+            contentHash.update(block)
+    finally:
+        currFile.close()
+    return contentHash.hexdigest()
+
+def getPreprocessorSourceHash():
+    '''Hash over the Hybrid Fortran python sources - a changed preprocessor invalidates everything it has cached.'''
+    global preprocessorSourceHash
+    if preprocessorSourceHash != None:
+        return preprocessorSourceHash
+    hfDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    contentHash = hashlib.sha1()
+    for path in sorted(dirEntries(hfDir, True, 'py')):
+        contentHash.update(os.path.relpath(path, hfDir))
+        contentHash.update(getFileContentHash(path))
+    preprocessorSourceHash = contentHash.hexdigest()
+    return preprocessorSourceHash
+
+def getContentHash(paths, additionalKeys=None):
+    '''Cache key for a list of input files and additional (string) settings. The order of paths is significant.'''
+    contentHash = hashlib.sha1()
+    contentHash.update(str(cacheFormatVersion))
+    contentHash.update(getPreprocessorSourceHash())
+    for path in paths:
+        contentHash.update(os.path.basename(path))
+        contentHash.update(getFileContentHash(path))
+    for key in additionalKeys if additionalKeys != None else []:
+        contentHash.update(unicode(key).encode('utf-8'))
+    return contentHash.hexdigest()
+
+def cachePath(cacheDir, category, key):
+    return os.path.join(str(cacheDir), "%s_%s.cache" %(category, key))
+
+def loadCachedObject(cacheDir, category, key):
+    '''Returns the object stored under category and key or None in case of a cache miss.'''
+    path = cachePath(cacheDir, category, key)
+    if not os.path.exists(path):
+        logging.debug("cache miss for %s" %(path))
+        return None
+    try:
+        cacheFile = open(path, 'rb')
+        try:
+            version, cachedObject = pickle.load(cacheFile)
+        finally:
+            cacheFile.close()
+    except Exception as e:
+        logging.warning("Could not read cache file %s, ignoring it: %s" %(path, str(e)))
+        return None
+    if version != cacheFormatVersion:
+        return None
+    try:
+        os.utime(path, None) #mark as recently used for pruning
+    except OSError as e:
+        #pruned by a concurrent build in the meantime - we have read it already
+        logging.debug("Could not mark cache file %s as recently used: %s" %(path, str(e)))
+    logging.debug("cache hit for %s" %(path))
+    return cachedObject
+
+def storeCachedObject(cacheDir, category, key, cachedObject):
+    try:
+        os.makedirs(str(cacheDir))
+    except OSError as e:
+        #we want to handle if a directory exists. every other exception at this point is thrown again.
+        if e.errno != errno.EEXIST:
+            raise e
+    path = cachePath(cacheDir, category, key)
+    #write to a temporary file first such that concurrent builds never see a partially written cache entry
+    temporaryPath = "%s.%i.temp" %(path, os.getpid())
+    cacheFile = open(temporaryPath, 'wb')
+    try:
+        pickle.dump((cacheFormatVersion, cachedObject), cacheFile, pickle.HIGHEST_PROTOCOL)
+    finally:
+        cacheFile.close()
+    os.rename(temporaryPath, path)
+    pruneCache(cacheDir, category)
+
+def pruneCache(cacheDir, category, maxNumOfEntries=maxNumOfCacheEntriesPerCategory):
+    prefix = "%s_" %(category)
+    paths = [
+        os.path.join(str(cacheDir), fileName)
+        for fileName in os.listdir(str(cacheDir))
+        if fileName.startswith(prefix) and fileName.endswith(".cache")
+    ]
+    if len(paths) <= maxNumOfEntries:
+        return
+    modificationTimesByPath = {}
+    for path in paths:
+        try:
+            modificationTimesByPath[path] = os.path.getmtime(path)
+        except OSError:
+            pass #removed by a concurrent prune
+    paths = sorted(modificationTimesByPath.keys(), key=lambda path: modificationTimesByPath[path], reverse=True)
+    for path in paths[maxNumOfEntries:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
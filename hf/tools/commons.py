@@ -140,6 +140,13 @@ class HFContextFormatter(logging.Formatter):
             return self.contextFormatter.format(record)
         return logging.Formatter.format(self, record)
 
+class DeferredMemoryHandler(logging.handlers.MemoryHandler):
+    def emit(self, record):
+        #messages are passed with lazy arguments - format them now, before the arguments can be changed by the time the buffer is flushed
+        record.msg = record.getMessage()
+        record.args = None
+        logging.handlers.MemoryHandler.emit(self, record)
+
 def stacktrace():
     exc = sys.exc_info()[0]
     stack = traceback.extract_stack()[:-1]  # last one would be full_stack()
@@ -159,7 +166,7 @@ def setupDeferredLogging(filename, logLevel, showDeferredLogging=True):
         streamhandler = logging.StreamHandler(sys.stderr)
         streamhandler.setLevel(logLevel)
         streamhandler.setFormatter(streamFormatter)
-        memoryhandler = logging.handlers.MemoryHandler(
+        memoryhandler = DeferredMemoryHandler(
             capacity=1024*100,
             flushLevel=logging.ERROR,
             target=streamhandler
@@ -175,6 +182,10 @@ def setupDeferredLogging(filename, logLevel, showDeferredLogging=True):
     logger.addHandler(filehandler)
     logging.debug("Logger has Initialized")
 
+def isDebugLoggingEnabled():
+    '''Guard for debug messages whose arguments are expensive to compute - pass cheap arguments to logging.debug lazily instead.'''
+    return logging.root.isEnabledFor(logging.DEBUG)
+
 def progressIndicatorReset(stream):
     stream.write("\n")
 
@@ -445,28 +456,45 @@ class BracketAnalyzer(object):
     closingPattern = ""
     openingChar = ""
     closingChar = ""
+    patternsByBrackets = {}
+    patternsByCharAndBrackets = {}
 
     def __init__(self, openingChar="(", closingChar=")", pass_in_regex_pattern=False):
         self.currLevel = 0
         self.bracketsHaveEverOpened = False
         self.openingChar = openingChar
         self.closingChar = closingChar
-        if pass_in_regex_pattern:
-            self.searchPattern = re.compile(r"(.*?)(" + openingChar + r"|" + closingChar + r")(.*)", re.IGNORECASE)
-            self.openingPattern = re.compile(openingChar, re.IGNORECASE)
-            self.closingPattern = re.compile(closingChar, re.IGNORECASE)
-        else:
-            self.searchPattern = re.compile(r"(.*?)(" + re.escape(openingChar) + r"|" + re.escape(closingChar) + r")(.*)", re.IGNORECASE)
-            self.openingPattern = re.compile(re.escape(openingChar), re.IGNORECASE)
-            self.closingPattern = re.compile(re.escape(closingChar), re.IGNORECASE)
+        #analyzers are created for almost every line being parsed -> share the compiled patterns between them
+        patterns = BracketAnalyzer.patternsByBrackets.get((openingChar, closingChar, pass_in_regex_pattern))
+        if patterns == None:
+            if pass_in_regex_pattern:
+                patterns = (
+                    re.compile(r"(.*?)(" + openingChar + r"|" + closingChar + r")(.*)", re.IGNORECASE),
+                    re.compile(openingChar, re.IGNORECASE),
+                    re.compile(closingChar, re.IGNORECASE)
+                )
+            else:
+                patterns = (
+                    re.compile(r"(.*?)(" + re.escape(openingChar) + r"|" + re.escape(closingChar) + r")(.*)", re.IGNORECASE),
+                    re.compile(re.escape(openingChar), re.IGNORECASE),
+                    re.compile(re.escape(closingChar), re.IGNORECASE)
+                )
+            BracketAnalyzer.patternsByBrackets[(openingChar, closingChar, pass_in_regex_pattern)] = patterns
+        self.searchPattern, self.openingPattern, self.closingPattern = patterns
 
     @property
     def level(self):
         return self.currLevel
 
     def splitAfterCharacterOnSameLevelOrClosingBrackets(self, string, char):
-        charSearchPattern = re.compile(r"(.*?)(" + re.escape(char) + r"|" + re.escape(self.openingChar) + r"|" + re.escape(self.closingChar) + r")(.*)", re.IGNORECASE)
-        charPattern = re.compile(re.escape(char), re.IGNORECASE)
+        patterns = BracketAnalyzer.patternsByCharAndBrackets.get((char, self.openingChar, self.closingChar))
+        if patterns == None:
+            patterns = (
+                re.compile(r"(.*?)(" + re.escape(char) + r"|" + re.escape(self.openingChar) + r"|" + re.escape(self.closingChar) + r")(.*)", re.IGNORECASE),
+                re.compile(re.escape(char), re.IGNORECASE)
+            )
+            BracketAnalyzer.patternsByCharAndBrackets[(char, self.openingChar, self.closingChar)] = patterns
+        charSearchPattern, charPattern = patterns
         work = string
         match = charSearchPattern.match(work)
         if not match:
@@ -18,9 +18,60 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
 
-import os
+import os, re, stat
 import logging
 
+try:
+    from os import scandir
+except ImportError:
+    try:
+        #backport for python < 3.5
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+def listDirectory(dirPath, followSymlinks=True):
+    '''Yields name, path, isFile, isDirectory for every entry of 'dirPath' in directory order.
+    With scandir available the file types usually come with the directory listing, otherwise each entry is stat'ed once.
+    '''
+    if scandir != None:
+        for entry in scandir(dirPath):
+            yield entry.name, entry.path, entry.is_file(follow_symlinks=followSymlinks), entry.is_dir(follow_symlinks=followSymlinks)
+        return
+    for name in os.listdir(dirPath):
+        path = os.path.join(dirPath, name)
+        try:
+            mode = os.stat(path).st_mode if followSymlinks else os.lstat(path).st_mode
+        except OSError:
+            #dangling symlink
+            yield name, path, False, False
+            continue
+        yield name, path, stat.S_ISREG(mode), stat.S_ISDIR(mode)
+
+def walkDirectory(dirPath):
+    '''Returns (filePaths, directoryPaths) below 'dirPath' (the latter including 'dirPath' itself) in the order 'find' reports them.
+    Symlinks are not followed.
+    '''
+    filePaths = []
+    directoryPaths = [dirPath]
+    def walk(currentPath):
+        for _, path, isFile, isDirectory in listDirectory(currentPath, followSymlinks=False):
+            if isFile:
+                filePaths.append(path)
+            elif isDirectory:
+                directoryPaths.append(path)
+                walk(path)
+    walk(dirPath)
+    return filePaths, directoryPaths
+
+def filterExceptions(exceptions, paths):
+    '''Removes the paths containing one of the exceptions as a word.'''
+    if len(exceptions) == 0:
+        return list(paths)
+    exceptionsPiped = '|'.join([re.escape(exception) for exception in exceptions])
+    pattern = re.compile(r'.*?(^|\W)+' + r'(' + exceptionsPiped + r')' + r'($|\W)+.*')
+    return [path for path in paths if not pattern.match(path)]
+
 def dirEntries(dir_name, subdir, *args):
     '''Return a list of file names found in directory 'dir_name'
     If 'subdir' is True, recursively access subdirectories under 'dir_name'.
@@ -35,16 +86,14 @@ def dirEntries(dir_name, subdir, *args):
         to the list.
     '''
     fileList = []
-    for file in os.listdir(dir_name):
-        dirfile = os.path.join(dir_name, file)
-        if os.path.isfile(dirfile):
+    for _, dirfile, isFile, isDirectory in listDirectory(dir_name):
+        if isFile:
             if not args:
                 fileList.append(dirfile)
             else:
                 if os.path.splitext(dirfile)[1][1:] in args:
                     fileList.append(dirfile)
         # recursively access file names in subdirectories
-        elif os.path.isdir(dirfile) and subdir:
+        elif isDirectory and subdir:
             fileList.extend(dirEntries(dirfile, subdir, *args))
     return fileList
-
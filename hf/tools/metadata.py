@@ -19,9 +19,9 @@
 # along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
 
 from xml.dom.minidom import Document, Node, parseString as parseStringUsingMinidom
-from tools.commons import BracketAnalyzer, enum
-import uuid
+from tools.commons import BracketAnalyzer, enum, isDebugLoggingEnabled
 import re
+import bisect
 import logging
 
 domainDependantAttributes = ["autoDom", "present", "transferHere"]
@@ -40,55 +40,91 @@ class DOMDocument(Document):
     pass
 
 class ImmutableDOMNode(object):
-    def __init__(self, node):
-        self.node = node
-        self.cachedElementsByTagName = {}
+    '''Copy of a DOM node with an immutable structure, built once together with its ImmutableDOMDocument.
+    Parents, children and attributes are held directly, so traversals don't create any new objects.
+    Attribute values can still be set, since the converter marks the routines it generates kernels for.'''
+    __slots__ = ("nodeType", "nodeName", "nodeValue", "attributes", "parentNode", "childNodes", "ownerDocument", "preorderIndex", "subtreeEndIndex")
+
+    ELEMENT_NODE = Node.ELEMENT_NODE
+    TEXT_NODE = Node.TEXT_NODE
+    DOCUMENT_NODE = Node.DOCUMENT_NODE
+
+    def __init__(self, nodeType, nodeName, nodeValue, attributes, parentNode, ownerDocument, preorderIndex):
+        self.nodeType = nodeType
+        self.nodeName = nodeName
+        self.nodeValue = nodeValue
+        self.attributes = attributes
+        self.parentNode = parentNode
+        self.childNodes = []
+        self.ownerDocument = ownerDocument
+        self.preorderIndex = preorderIndex
+        self.subtreeEndIndex = preorderIndex + 1
 
     @property
-    def nodeType(self):
-        return self.node.nodeType
-
-    @property
-    def nodeName(self):
-        return self.node.nodeName
-
-    @property
-    def nodeValue(self):
-        return self.node.nodeValue
-
-    @property
-    def attributes(self):
-        return self.node.attributes
-
-    @property
-    def parentNode(self):
-        return ImmutableDOMNode(self.node.parentNode)
+    def tagName(self):
+        if self.nodeType != Node.ELEMENT_NODE:
+            raise AttributeError("tagName")
+        return self.nodeName
 
     @property
     def firstChild(self):
-        return ImmutableDOMNode(self.node.firstChild)
+        return self.childNodes[0] if len(self.childNodes) > 0 else None
 
     @property
-    def childNodes(self):
-        return [ImmutableDOMNode(node) for node in self.node.childNodes]
+    def lastChild(self):
+        return self.childNodes[-1] if len(self.childNodes) > 0 else None
 
     def getElementsByTagName(self, name):
-        result = self.cachedElementsByTagName.get(name)
-        if result != None:
-            return result
-        uncachedResult = self.node.getElementsByTagName(name)
-        cachedResult = [ImmutableDOMNode(node) for node in uncachedResult]
-        self.cachedElementsByTagName[name] = cachedResult
-        return cachedResult
+        #the document keeps the elements per tag name in document order -> the descendants of this node are a slice of that list
+        elements = self.ownerDocument.elementsByTagName.get(name)
+        if not elements:
+            return []
+        preorderIndices = self.ownerDocument.preorderIndicesByTagName[name]
+        return elements[
+            bisect.bisect_right(preorderIndices, self.preorderIndex):bisect.bisect_left(preorderIndices, self.subtreeEndIndex)
+        ]
 
     def getAttribute(self, qName):
-        return self.node.getAttribute(qName)
+        if self.attributes == None:
+            return ""
+        return self.attributes.get(qName, "")
+
+    def hasAttribute(self, qName):
+        return self.attributes != None and qName in self.attributes
+
+    def toDOMNode(self, doc):
+        if self.nodeType == Node.TEXT_NODE:
+            return doc.createTextNode(self.nodeValue)
+        if self.nodeType == Node.COMMENT_NODE:
+            return doc.createComment(self.nodeValue)
+        element = doc.createElement(self.nodeName)
+        for name, value in self.attributes.items():
+            element.setAttribute(name, value)
+        for child in self.childNodes:
+            element.appendChild(child.toDOMNode(doc))
+        return element
 
     def toxml(self, encoding=None):
-        return self.node.toxml(encoding)
+        return self.toDOMNode(Document()).toxml(encoding)
 
     def toprettyxml(self, indent="", newl="", encoding=None):
-        return self.node.toprettyxml(indent, newl, encoding)
+        return self.toDOMNode(Document()).toprettyxml(indent, newl, encoding)
+
+    def cloneNode(self, deep):
+        #the clone is detached from the document and has its own attributes. its descendants are shared.
+        clone = ImmutableDOMNode(
+            self.nodeType,
+            self.nodeName,
+            self.nodeValue,
+            dict(self.attributes) if self.attributes != None else None,
+            None,
+            self.ownerDocument,
+            self.preorderIndex
+        )
+        if deep:
+            clone.childNodes = self.childNodes
+            clone.subtreeEndIndex = self.subtreeEndIndex
+        return clone
 
     def appendChild(self, node):
         raise Exception("cannot append child to immutable node")
@@ -96,8 +132,15 @@ class ImmutableDOMNode(object):
     def removeChild(self, node):
         raise Exception("cannot remove child from immutable node")
 
-    def cloneNode(self, deep):
-        raise Exception("clone node not implemented")
+    def setAttribute(self, qName, value):
+        if self.attributes == None:
+            raise Exception("cannot set attribute %s on immutable node" %(qName))
+        self.attributes[qName] = value
+
+    def removeAttribute(self, qName):
+        if self.attributes == None:
+            raise Exception("cannot remove attribute %s from immutable node" %(qName))
+        self.attributes.pop(qName, None)
 
     def createElement(self, tagName):
         raise Exception("cannot create element for immutable node")
@@ -109,7 +152,64 @@ class ImmutableDOMNode(object):
         raise Exception("cannot create attribute for immutable node")
 
 class ImmutableDOMDocument(ImmutableDOMNode):
-    pass
+    '''Copy of a minidom document with an immutable structure. Elements are indexed by tag name while copying,
+    which makes getElementsByTagName a lookup instead of a traversal. Use toDOMDocument to get a mutable document back.'''
+    __slots__ = ("elementsByTagName", "preorderIndicesByTagName", "__dict__")
+
+    def __init__(self, doc):
+        super(ImmutableDOMDocument, self).__init__(Node.DOCUMENT_NODE, doc.nodeName, None, None, None, None, 0)
+        self.elementsByTagName = {}
+        self.preorderIndicesByTagName = {}
+        #tag and attribute names are shared between all nodes with the same name
+        namesByName = {}
+        nextPreorderIndex = 1
+        #iterate in document order using a stack of (minidom node, immutable parent), children pushed in reverse
+        nodesToCopy = [(child, self) for child in reversed(doc.childNodes)]
+        ancestors = [self]
+        while len(nodesToCopy) > 0:
+            node, parent = nodesToCopy.pop()
+            while ancestors[-1] is not parent:
+                ancestors.pop().subtreeEndIndex = nextPreorderIndex
+            attributes = None
+            if node.nodeType == Node.ELEMENT_NODE:
+                attributes = dict(
+                    (namesByName.setdefault(name, name), value)
+                    for (name, value) in node.attributes.items()
+                )
+            nodeName = namesByName.setdefault(node.nodeName, node.nodeName)
+            immutableNode = ImmutableDOMNode(node.nodeType, nodeName, node.nodeValue, attributes, parent, self, nextPreorderIndex)
+            nextPreorderIndex += 1
+            parent.childNodes.append(immutableNode)
+            if node.nodeType == Node.ELEMENT_NODE:
+                self.elementsByTagName.setdefault(nodeName, []).append(immutableNode)
+                self.preorderIndicesByTagName.setdefault(nodeName, []).append(immutableNode.preorderIndex)
+            if len(node.childNodes) > 0:
+                ancestors.append(immutableNode)
+                nodesToCopy.extend((child, immutableNode) for child in reversed(node.childNodes))
+        for ancestor in ancestors:
+            ancestor.subtreeEndIndex = nextPreorderIndex
+
+    @property
+    def documentElement(self):
+        for child in self.childNodes:
+            if child.nodeType == Node.ELEMENT_NODE:
+                return child
+        return None
+
+    def getElementsByTagName(self, name):
+        return self.elementsByTagName.get(name, [])
+
+    def toDOMDocument(self):
+        doc = Document()
+        for child in self.childNodes:
+            doc.appendChild(child.toDOMNode(doc))
+        return doc
+
+    def toxml(self, encoding=None):
+        return self.toDOMDocument().toxml(encoding)
+
+    def toprettyxml(self, indent="", newl="", encoding=None):
+        return self.toDOMDocument().toprettyxml(indent, newl, encoding)
 
 def getClonedDocument(doc):
     clone = doc.cloneNode(deep=True)
@@ -117,12 +217,14 @@ def getClonedDocument(doc):
         del clone._firstLevelElementCache
     if hasattr(clone, "_templateCache"):
         del clone._templateCache
+    if hasattr(clone, "_parsedTemplateCache"):
+        del clone._parsedTemplateCache
     return clone
 
 def parseString(data, immutable=False):
     doc = parseStringUsingMinidom(data)
     if immutable:
-        #this saves a lot of preprocessing time by caching the results instead of using minidom's native implementation
+        #this saves a lot of preprocessing time and memory by using indexed lookups instead of minidom's native implementation
         return ImmutableDOMDocument(doc)
     return doc
 
@@ -265,71 +367,117 @@ def hasDuplicateAttributes(node1, node2, ignoreIDs=True):
         return True
     return False
 
-def firstDuplicateChild(parent, newNode, cgDoc=None, ignoreIDs=True):
-    '''Get first duplicate for the newNode within parent's childNodes'''
-    ## trying to make this faster, but with th erecursiveness it's tricky
-    # currAttributes = OrderedDict()
-    # if hasattr(newNode, "tagName"):
-    #     currAttributes["tagName"] = newNode.tagName
-    # currAttributeNames = sorted([name for (name, value) in newNode.attributes.items() if name != "id"])
-    # for attributeName in currAttributeNames:
-    #     currAttributes[attributeName] = newNode.attributes[attributeName]
-    # attributeTuple = tuple(currAttributes.values())
-    # attributeCache = None
-    # if cgDoc and hasattr(cgDoc, "_attributeCache")
-    #     attributeCache = cgDoc._attributeCache
-    # elif cgDoc:
-    #     attributeCache = {}
-    #     cgDoc._attributeCache = attributeCache
-    # if attributeCache and attributeTuple in attributeCache:
-    #     return attributeCache[attributeTuple]
-    # if attributeCache:
-    #     attributeCache[attributeTuple] = newNode
-    #     return None
-
-    nodesWithDuplicateAttributes = []
+def getStructuralKey(node, ignoreIDs=True, useCache=True):
+    '''Canonical, hashable representation of a node: tag, attributes, text and children - nodes with equal keys are duplicates.
+    Ids are ignored (other than whether there is one), such that two otherwise identical nodes with different ids are not called unique.
+    Children are compared regardless of their order, ids of children are always ignored.
+    With useCache, the keys of elements are kept on the nodes (for ignoreIDs, which is what children are compared with) -
+    they need to be invalidated with updateStructuralKeyIndex when a node is changed in place.'''
+    if not hasattr(node, "tagName"):
+        return ("#text", node.nodeValue)
+    useCache = useCache and ignoreIDs
+    if useCache:
+        structuralKey = getattr(node, "_structuralKey", None)
+        if structuralKey != None:
+            return structuralKey
+    attributes = node.attributes.items() if node.attributes else []
+    structuralKey = (
+        node.tagName,
+        tuple(sorted(
+            (name, value)
+            for (name, value) in attributes
+            if not ignoreIDs or name != "id"
+        )),
+        ignoreIDs and node.hasAttribute("id"),
+        tuple(sorted(getStructuralKey(childNode, useCache=useCache) for childNode in node.childNodes))
+    )
+    if useCache:
+        node._structuralKey = structuralKey
+    return structuralKey
+
+def getStructuralKeyIndex(parent, ignoreIDs=True):
+    '''Index of parent's children by their structural key, kept on the parent and extended with the children appended since
+    the last lookup. Returns (childNodesByStructuralKey, structuralKeysByChild).'''
+    if not hasattr(parent, "_childNodesByStructuralKey"):
+        parent._childNodesByStructuralKey = {}
+    indexedChildCount, childNodesByStructuralKey, structuralKeysByChild = parent._childNodesByStructuralKey.get(
+        ignoreIDs,
+        (0, {}, {})
+    )
+    if indexedChildCount > len(parent.childNodes):
+        #children have been removed without updating the index -> start over
+        indexedChildCount, childNodesByStructuralKey, structuralKeysByChild = 0, {}, {}
+    for childNode in parent.childNodes[indexedChildCount:]:
+        structuralKey = getStructuralKey(childNode, ignoreIDs)
+        childNodesByStructuralKey.setdefault(structuralKey, []).append(childNode)
+        structuralKeysByChild[childNode] = structuralKey
+    parent._childNodesByStructuralKey[ignoreIDs] = (len(parent.childNodes), childNodesByStructuralKey, structuralKeysByChild)
+    return childNodesByStructuralKey, structuralKeysByChild
+
+def validateStructuralKeyIndex(parent, ignoreIDs=True):
+    '''Compares the structural key index of parent with a full scan of its children. Raises if a child has been changed in place
+    without updateStructuralKeyIndex.'''
+    _, structuralKeysByChild = getStructuralKeyIndex(parent, ignoreIDs)
     for childNode in parent.childNodes:
-        if hasDuplicateAttributes(childNode, newNode, ignoreIDs):
-            nodesWithDuplicateAttributes.append(childNode)
-    if len(nodesWithDuplicateAttributes) == 0:
-        return None
-
-    newNodeContent = {}
-    newNodeValue = getNodeValue(newNode)
-    if newNodeValue:
-        newNodeContent["value"] = newNodeValue
-
-    #Let's check the children of all nodes with duplicate attributes
-    for node in nodesWithDuplicateAttributes:
-        if len(newNode.childNodes) != len(node.childNodes):
-            continue
-        newNodeContentCopy = newNodeContent.copy()
-        nodeValue = getNodeValue(node)
-        if newNodeContentCopy.get("value", None) != None:
-            if not nodeValue:
+        structuralKey = getStructuralKey(childNode, ignoreIDs, useCache=False)
+        if structuralKeysByChild.get(childNode) != structuralKey:
+            raise Exception(
+                "structural key index of %s is out of date for child %s - changes in place need to be reported with updateStructuralKeyIndex" %(
+                    parent.nodeName,
+                    childNode.toxml()
+                )
+            )
+
+def updateStructuralKeyIndex(node, removedChild=None):
+    '''Has to be called after node has been changed in place (setAttribute, appendChild, removeChild, text data): the cached
+    structural keys of node and its ancestors are recomputed and filed under the new key in the index of their parent.
+    removedChild is dropped from node's own index. Appending to an indexed parent itself doesn't need this, those children are
+    indexed on the next lookup.'''
+    if removedChild != None:
+        for ignoreIDs, (indexedChildCount, childNodesByStructuralKey, structuralKeysByChild) \
+        in getattr(node, "_childNodesByStructuralKey", {}).items():
+            removedKey = structuralKeysByChild.pop(removedChild, None)
+            if removedKey == None:
                 continue
-            elif newNodeContentCopy.get("value", None) == nodeValue:
-                newNodeContentCopy["value"] = "match!"
-
-        #for each of the children of newNode, check whether they are unique among the current nodes' children.
-        for newChildNode in newNode.childNodes:
-            if firstDuplicateChild(node, newChildNode) != None:
-                if hasattr(newChildNode, "tagName"):
-                    newNodeContentCopy[newChildNode.tagName + str(uuid.uuid4())] = "match!"
-                else:
-                    newNodeContentCopy["value"] = "match!"
-            else:
-                if hasattr(newChildNode, "tagName"):
-                    newNodeContentCopy[newChildNode.tagName + str(uuid.uuid4())] = "nomatch"
-                else:
-                    newNodeContentCopy["value"] = "nomatch"
-
-        newNodeContentTags = newNodeContentCopy.keys()
-        for newNodeContentTag in newNodeContentTags:
-            if newNodeContentCopy[newNodeContentTag] != "match!":
-                break
-        else:
-            return node
+            childNodesByStructuralKey[removedKey].remove(removedChild)
+            node._childNodesByStructuralKey[ignoreIDs] = (
+                indexedChildCount - 1,
+                childNodesByStructuralKey,
+                structuralKeysByChild
+            )
+    childNode = node
+    while childNode != None:
+        #the keys of the siblings along the way are still valid, only this path is recomputed
+        if hasattr(childNode, "_structuralKey"):
+            del childNode._structuralKey
+        childNode = childNode.parentNode
+    childNode = node
+    while childNode.parentNode != None:
+        parent = childNode.parentNode
+        for ignoreIDs, (_, childNodesByStructuralKey, structuralKeysByChild) \
+        in getattr(parent, "_childNodesByStructuralKey", {}).items():
+            oldKey = structuralKeysByChild.get(childNode)
+            if oldKey == None:
+                #not indexed yet
+                continue
+            newKey = getStructuralKey(childNode, ignoreIDs)
+            if newKey == oldKey:
+                continue
+            childNodesByStructuralKey[oldKey].remove(childNode)
+            childNodesByStructuralKey.setdefault(newKey, []).append(childNode)
+            structuralKeysByChild[childNode] = newKey
+        childNode = parent
+
+def firstDuplicateChild(parent, newNode, cgDoc=None, ignoreIDs=True):
+    '''Get first duplicate for the newNode within parent's childNodes.
+    Looked up in the structural key index of parent - children that are changed in place after being appended to parent
+    need to be reported with updateStructuralKeyIndex. With debug logging, the index is checked against a full scan.'''
+    if isDebugLoggingEnabled():
+        validateStructuralKeyIndex(parent, ignoreIDs)
+    childNodesByStructuralKey, _ = getStructuralKeyIndex(parent, ignoreIDs)
+    for candidate in childNodesByStructuralKey.get(getStructuralKey(newNode, ignoreIDs, useCache=False), []):
+        if candidate.parentNode is parent:
+            return candidate
     return None
 
 def getAttributesDomainsDeclarationPrefixAndMacroNames(moduleTemplate, procedureTemplate):
@@ -392,12 +540,24 @@ def updateAndGetParallelRegionInfo(doc, subroutineNode, parallelRegionSpecificat
     relationNode.setAttribute("startLine", str(startLine))
     return relationNode, templateNode
 
+def addTemplateToLibrary(doc, templateLibrary, templateNode):
+    '''Appends templateNode (with an id) to templateLibrary unless it already contains a duplicate. Returns the template to be referenced.'''
+    duplicateTemplateNode = firstDuplicateChild(templateLibrary, templateNode)
+    if duplicateTemplateNode:
+        return duplicateTemplateNode
+    templateLibrary.appendChild(templateNode)
+    #the cache is built from the document if it doesn't exist yet, so it can't end up with just the new template
+    regionTemplatesByID(doc, templateNode.tagName)[templateNode.getAttribute("id")] = templateNode
+    return templateNode
+
 def setTemplateInfos(doc, parent, specText, templateParentNodeName, templateNodeName, referenceParentNodeName):
     if not parent:
         raise Exception("cannot add template info '%s' to nonexisting parent" %(specText))
 
     templateLibrary = getOrCreateFirstLevelElement(doc, templateParentNodeName)
     templateNode = doc.createElement(templateNodeName)
+    #imported here since uuid is slow to import (it loads ctypes) and only needed when parsing templates
+    import uuid
     templateNode.setAttribute("id", str(uuid.uuid4()))
 
     settingPattern = re.compile(r'[\s,]*(\w*)\s*(\(.*)')
@@ -414,18 +574,7 @@ def setTemplateInfos(doc, parent, specText, templateParentNodeName, templateNode
         settingText, remainder = settingBracketAnalyzer.getTextWithinBracketsAndRemainder(textAfterSettingName)
         addAndGetEntries(doc, settingNode, settingText)
 
-    #deduplicate the definition
-    duplicateTemplateNode = firstDuplicateChild(templateLibrary, templateNode)
-    if duplicateTemplateNode:
-        templateNode = duplicateTemplateNode
-    else:
-        templateLibrary.appendChild(templateNode)
-        if not hasattr(doc, "_templateCache"):
-            doc._templateCache = {}
-        templatesByID = doc._templateCache.get(templateNodeName, {})
-        templatesByID[templateNode.getAttribute("id")] = templateNode
-        doc._templateCache[templateNodeName] = templatesByID
-
+    templateNode = addTemplateToLibrary(doc, templateLibrary, templateNode)
     templateID = templateNode.getAttribute("id")
     referenceParentNodes = parent.getElementsByTagName(referenceParentNodeName)
     referenceParentNode = None
@@ -439,6 +588,37 @@ def setTemplateInfos(doc, parent, specText, templateParentNodeName, templateNode
     referenceParentNode.appendChild(relationNode)
     return relationNode, templateNode
 
+def mergeCallGraphFragment(doc, fragmentDoc):
+    '''Append the callgraph of a single source file, generated into its own document, to doc.
+    Calls and templates are deduplicated the same way as if the file had been parsed into doc directly.'''
+    templateIDReplacements = {}
+    importedNodes = []
+    for fragmentContainer in fragmentDoc.documentElement.childNodes:
+        if fragmentContainer.nodeType != Node.ELEMENT_NODE:
+            continue
+        container = getOrCreateFirstLevelElement(doc, fragmentContainer.tagName)
+        for fragmentNode in fragmentContainer.childNodes:
+            #calls are compared without their arguments since that's what H90XMLCallGraphGenerator does
+            if fragmentContainer.tagName == "calls" \
+            and firstDuplicateChild(container, fragmentNode.cloneNode(False)):
+                continue
+            if fragmentContainer.tagName in ["domainDependantTemplates", "parallelRegionTemplates"]:
+                duplicateTemplateNode = firstDuplicateChild(container, fragmentNode)
+                if duplicateTemplateNode:
+                    templateIDReplacements[fragmentNode.getAttribute("id")] = duplicateTemplateNode.getAttribute("id")
+                    continue
+            importedNode = doc.importNode(fragmentNode, True)
+            container.appendChild(importedNode)
+            importedNodes.append(importedNode)
+    if len(templateIDReplacements) == 0:
+        return
+    for importedNode in importedNodes:
+        for relationNode in importedNode.getElementsByTagName("templateRelation"):
+            templateID = relationNode.getAttribute("id")
+            if templateID in templateIDReplacements:
+                relationNode.setAttribute("id", templateIDReplacements[templateID])
+                updateStructuralKeyIndex(relationNode)
+
 def regionTemplatesByID(cgDoc, templateTypeName):
     regionTemplatesByID = None
     if hasattr(cgDoc, "_templateCache"):
@@ -485,42 +665,118 @@ def getRoutineNodeInitStage(routineNode):
 
     return RoutineNodeInitStage.DIRECTIVES_WITH_PARALLELREGION_POSITION
 
-def getDomNameAndSize(templateNode):
-    dimensionSizesTemplateNodes = templateNode.getElementsByTagName("domSize")
-    if not dimensionSizesTemplateNodes or len(dimensionSizesTemplateNodes) == 0:
-        return []
-    dimensionSizesInTemplate = [node.firstChild.nodeValue for node in dimensionSizesTemplateNodes[0].getElementsByTagName("entry")]
-    dimensionNamesTemplateNodes = templateNode.getElementsByTagName("domName")
-    if not dimensionNamesTemplateNodes or len(dimensionNamesTemplateNodes) == 0:
-        return []
-    dimensionNamesInTemplate = [node.firstChild.nodeValue for node in dimensionNamesTemplateNodes[0].getElementsByTagName("entry")]
+class ParsedTemplate(object):
+    '''The properties of a parallelRegionTemplate or domainDependantTemplate node as immutable values.
+    Each property is read from the template node on first use. Use getParsedTemplate to get the instance that is shared by all
+    users of a template.'''
+    __slots__ = ("templateNode", "_propertiesByKey")
+
+    def __init__(self, templateNode):
+        self.templateNode = templateNode
+        self._propertiesByKey = {}
+
+    def _getProperty(self, key, parseFunction, *arguments):
+        if key in self._propertiesByKey:
+            return self._propertiesByKey[key]
+        value = parseFunction(self.templateNode, *arguments)
+        self._propertiesByKey[key] = value
+        return value
+
+    def isParsedFrom(self, templateNode):
+        if templateNode is self.templateNode:
+            return True
+        #clones of immutable nodes share the children of the original
+        return isinstance(templateNode, ImmutableDOMNode) \
+            and isinstance(self.templateNode, ImmutableDOMNode) \
+            and templateNode.ownerDocument is self.templateNode.ownerDocument \
+            and templateNode.preorderIndex == self.templateNode.preorderIndex
+
+    @property
+    def domNamesAndSizes(self):
+        return self._getProperty("domNamesAndSizes", _parseDomNamesAndSizes)
+
+    @property
+    def attributes(self):
+        return self._getProperty("attributes", _parseEntryValues, "attribute")
+
+    @property
+    def parallelRegionDomains(self):
+        return self._getProperty("parallelRegionDomains", _parseParallelRegionDomains)
+
+    @property
+    def appliesToEntries(self):
+        return self._getProperty("appliesToEntries", _parseAppliesToEntries)
+
+    @property
+    def template(self):
+        return self._getProperty("template", _parseTemplate)
+
+    @property
+    def reductionScalarsByOperator(self):
+        return self._getProperty("reductionScalarsByOperator", _parseReductionScalarsByOperator)
+
+    def stringProperty(self, propertyName):
+        entryValues = self._getProperty(("entryValues", propertyName), _parseEntryValues, propertyName)
+        return entryValues[0] if entryValues != None else None
+
+    def childNodeValues(self, propertyName):
+        return self._getProperty(("childNodeValues", propertyName), _parseChildNodeValues, propertyName)
+
+def getParsedTemplate(templateNode):
+    '''Returns the parsed template for a template node, created once per template ID and document.'''
+    doc = templateNode.ownerDocument
+    templateID = templateNode.getAttribute("id")
+    if doc == None or not templateID:
+        return ParsedTemplate(templateNode)
+    if not hasattr(doc, "_parsedTemplateCache"):
+        doc._parsedTemplateCache = {}
+    key = (templateNode.nodeName, templateID)
+    parsedTemplate = doc._parsedTemplateCache.get(key)
+    if parsedTemplate == None or not parsedTemplate.isParsedFrom(templateNode):
+        parsedTemplate = ParsedTemplate(templateNode)
+        doc._parsedTemplateCache[key] = parsedTemplate
+    return parsedTemplate
+
+def _parseEntryValues(templateNode, propertyName):
+    propertyNodes = templateNode.getElementsByTagName(propertyName)
+    if not propertyNodes or len(propertyNodes) == 0:
+        return None
+    return tuple(node.firstChild.nodeValue for node in propertyNodes[0].getElementsByTagName("entry"))
+
+def _parseChildNodeValues(templateNode, propertyName):
+    propertyNodes = templateNode.getElementsByTagName(propertyName)
+    if not propertyNodes or len(propertyNodes) == 0:
+        return None
+    return tuple(entry.firstChild.nodeValue for entry in propertyNodes[0].childNodes)
+
+def _parseDomNamesAndSizes(templateNode):
+    dimensionSizesInTemplate = _parseEntryValues(templateNode, "domSize")
+    if dimensionSizesInTemplate == None:
+        return ()
+    dimensionNamesInTemplate = _parseEntryValues(templateNode, "domName")
+    if dimensionNamesInTemplate == None:
+        return ()
     if len(dimensionNamesInTemplate) != len(dimensionSizesInTemplate):
-        raise Exception("Number of domain names does not match number of domain sizes specified; Domain names: %s, domain sizes: %s" %(dimensionNamesInTemplate, dimensionSizesInTemplate))
+        raise Exception("Number of domain names does not match number of domain sizes specified; Domain names: %s, domain sizes: %s" %(list(dimensionNamesInTemplate), list(dimensionSizesInTemplate)))
     #map the domNames to the sizes declared in the declaration
-    dimensionNameAndSize = []
-    for i in range(len(dimensionNamesInTemplate)):
-        dimensionNameAndSize.append((dimensionNamesInTemplate[i], dimensionSizesInTemplate[i]))
-    return dimensionNameAndSize
+    return tuple(zip(dimensionNamesInTemplate, dimensionSizesInTemplate))
+
+def getDomNameAndSize(templateNode):
+    return list(getParsedTemplate(templateNode).domNamesAndSizes)
 
 def getDeclarationPrefix(templateNode):
-    declarationPrefixTemplateNodes = templateNode.getElementsByTagName("declarationPrefix")
-    if not declarationPrefixTemplateNodes or len(declarationPrefixTemplateNodes) == 0:
-        return None
-    declarationPrefixesInTemplate = [node.firstChild.nodeValue for node in declarationPrefixTemplateNodes[0].getElementsByTagName("entry")]
-    return declarationPrefixesInTemplate[0]
+    return getParsedTemplate(templateNode).stringProperty("declarationPrefix")
 
 def getStringProperty(templateNode, propertyName):
-    templateNodes = templateNode.getElementsByTagName(propertyName)
-    if not templateNodes or len(templateNodes) == 0:
-        return None
-    propertyValues = [node.firstChild.nodeValue for node in templateNodes[0].getElementsByTagName("entry")]
-    return propertyValues[0]
+    return getParsedTemplate(templateNode).stringProperty(propertyName)
+
+def getChildNodeValues(templateNode, propertyName):
+    childNodeValues = getParsedTemplate(templateNode).childNodeValues(propertyName)
+    return list(childNodeValues) if childNodeValues != None else None
 
 def getAttributes(templateNode):
-    attributesTemplateNodes = templateNode.getElementsByTagName("attribute")
-    if not attributesTemplateNodes or len(attributesTemplateNodes) == 0:
-        return []
-    return [node.firstChild.nodeValue for node in attributesTemplateNodes[0].getElementsByTagName("entry")]
+    attributes = getParsedTemplate(templateNode).attributes
+    return list(attributes) if attributes != None else []
 
 def getDomainDependantTemplatesAndEntries(cgDoc, routineNode):
     result = []
@@ -546,7 +802,7 @@ def getDomainDependantTemplatesAndEntries(cgDoc, routineNode):
             result.append((template, entry))
     return result
 
-def getDomainsWithParallelRegionTemplate(parallelRegionTemplate):
+def _parseParallelRegionDomains(parallelRegionTemplate):
     def getAttributeEntries(attributeName, mandatory=False, expectedLength=None):
         domNodes = parallelRegionTemplate.getElementsByTagName(attributeName)
         if mandatory and (domNodes == None or len(domNodes) != 1):
@@ -572,23 +828,31 @@ def getDomainsWithParallelRegionTemplate(parallelRegionTemplate):
             startsAt=startsAtEntries[index] if startsAtEntries != None else None,
             endsAt=endsAtEntries[index] if endsAtEntries != None else None
         ))
-    return domains
+    return tuple(domains)
 
-def appliesTo(appliesToTests, parallelRegionTemplate):
+def getDomainsWithParallelRegionTemplate(parallelRegionTemplate):
+    return list(getParsedTemplate(parallelRegionTemplate).parallelRegionDomains)
+
+def _parseAppliesToEntries(parallelRegionTemplate):
     appliesToNodes = parallelRegionTemplate.getElementsByTagName("appliesTo")
     if not appliesToNodes or len(appliesToNodes) == 0:
-        return True
+        return None
     entries = appliesToNodes[0].getElementsByTagName("entry")
     if not entries or len(entries) == 0:
         raise Exception("Unexpected parallel region template definition: AppliesTo node without entry.")
+    return tuple(entry.firstChild.nodeValue for entry in entries)
 
-    for entry in entries:
+def appliesTo(appliesToTests, parallelRegionTemplate):
+    appliesToEntries = getParsedTemplate(parallelRegionTemplate).appliesToEntries
+    if appliesToEntries == None:
+        return True
+    for entry in appliesToEntries:
         for appliesToTest in appliesToTests:
-            if entry.firstChild.nodeValue == appliesToTest:
+            if entry == appliesToTest:
                 return True
     return False
 
-def getTemplate(parallelRegionTemplate):
+def _parseTemplate(parallelRegionTemplate):
     templateNodes = parallelRegionTemplate.getElementsByTagName("template")
     if not templateNodes or len(templateNodes) == 0:
         return ''
@@ -601,11 +865,16 @@ def getTemplate(parallelRegionTemplate):
         raise Exception("Empty template attribute is not allowed.")
     return entries[0].firstChild.nodeValue.strip()
 
-def getReductionScalarsByOperator(parallelRegionTemplate):
-    result = {}
+def getTemplate(parallelRegionTemplate):
+    return getParsedTemplate(parallelRegionTemplate).template
+
+def _parseReductionScalarsByOperator(parallelRegionTemplate):
+    #operators in the order of their first reduction, so the dictionaries built from this iterate in the same order every time
+    operators = []
+    scalarsByOperator = {}
     reductionNodes = parallelRegionTemplate.getElementsByTagName("reduction")
     if not reductionNodes or len(reductionNodes) == 0:
-        return result
+        return ()
     reductionSpecifications = []
     for reductionNode in reductionNodes:
         entries = reductionNode.getElementsByTagName("entry")
@@ -625,10 +894,17 @@ def getReductionScalarsByOperator(parallelRegionTemplate):
         scalar = operatorAndScalar[1].strip()
         if scalar == "":
             raise Exception("Empty scalar in reduction not allowed.")
-        if operator in result:
-            result[operator].append(scalar)
+        if operator in scalarsByOperator:
+            scalarsByOperator[operator].append(scalar)
         else:
-            result[operator] = [scalar]
+            operators.append(operator)
+            scalarsByOperator[operator] = [scalar]
+    return tuple((operator, tuple(scalarsByOperator[operator])) for operator in operators)
+
+def getReductionScalarsByOperator(parallelRegionTemplate):
+    result = {}
+    for operator, scalars in getParsedTemplate(parallelRegionTemplate).reductionScalarsByOperator:
+        result[operator] = list(scalars)
     return result
 
 def getArguments(parentNode):
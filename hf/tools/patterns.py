@@ -78,10 +78,44 @@ class RegExPatterns:
         """
     }
 
+    #a line can only match one of these patterns if it contains the keyword (case insensitive).
+    #this allows skipping most lines of code before doing any regex matching.
+    keywordByPatternName = {
+        'subprocBeginPattern': 'subroutine',
+        'subprocEndPattern': 'end',
+        'subprocCallPattern': 'call',
+        'parallelRegionPattern': '@parallelregion',
+        'domainDependantPattern': '@domaindependant',
+        'branchPattern': '@if',
+        'parallelRegionEndPattern': '@end',
+        'domainDependantEndPattern': '@end',
+        'branchEndPattern': '@end',
+        'interfacePattern': 'interface',
+        'interfaceEndPattern': 'end',
+        'typePattern': 'type',
+        'typeEndPattern': 'end',
+        'moduleBeginPattern': 'module',
+        'moduleEndPattern': 'end',
+        'earlyReturnPattern': 'return',
+        'templatePattern': '@scheme',
+        'templateEndPattern': '@end',
+        'containsPattern': 'contains'
+    }
+    dispatchersByPatternNames = None
+
     def __init__(self):
         self.dynamicPatternsByRegex = {}
-        for patternName in self.staticRegexByPatternName:
-            setattr(self, patternName, re.compile(self.staticRegexByPatternName[patternName], re.IGNORECASE | re.VERBOSE))
+        self.dispatchersByPatternNames = {}
+
+    def __getattr__(self, patternName):
+        #static patterns are compiled on first use - most tools only ever need a few of them.
+        #afterwards they are found as regular attributes, so this is only called once per pattern.
+        regex = self.staticRegexByPatternName.get(patternName)
+        if regex == None:
+            raise AttributeError(patternName)
+        pattern = re.compile(regex, re.IGNORECASE | re.VERBOSE)
+        setattr(self, patternName, pattern)
+        return pattern
 
     def get(self, regex):
         pattern = self.dynamicPatternsByRegex.get(regex)
@@ -89,3 +123,43 @@ class RegExPatterns:
             pattern = re.compile(regex, re.IGNORECASE | re.VERBOSE)
             self.dynamicPatternsByRegex[regex] = pattern
         return pattern
+
+    def getDispatcher(self, patternNames):
+        dispatcher = self.dispatchersByPatternNames.get(patternNames)
+        if dispatcher == None:
+            dispatcher = PatternDispatcher(self, patternNames)
+            self.dispatchersByPatternNames[patternNames] = dispatcher
+        return dispatcher
+
+class PatternDispatcher(object):
+    '''Finds the first of a sequence of patterns that matches a line, using a single combined regex.
+    Equivalent to matching the patterns one by one in the given order.'''
+    def __init__(self, patterns, patternNames):
+        self.patterns = patterns
+        self.patternNames = patternNames
+        self.keywords = None
+        if all(patternName in patterns.keywordByPatternName for patternName in patternNames):
+            self.keywords = tuple(set(patterns.keywordByPatternName[patternName] for patternName in patternNames))
+        self.combinedPattern = re.compile(
+            "|".join(
+                "(?P<%s>%s)" %(patternName, patterns.staticRegexByPatternName[patternName])
+                for patternName in patternNames
+            ),
+            re.IGNORECASE | re.VERBOSE
+        )
+
+    def match(self, line):
+        '''Returns the name of the first matching pattern together with its match object or (None, None).'''
+        if self.keywords != None:
+            loweredLine = line.lower()
+            for keyword in self.keywords:
+                if keyword in loweredLine:
+                    break
+            else:
+                return None, None
+        combinedMatch = self.combinedPattern.match(line)
+        if not combinedMatch:
+            return None, None
+        #the named group enclosing an alternative is always the last one to be closed
+        patternName = combinedMatch.lastgroup
+        return patternName, getattr(self.patterns, patternName).match(line)
@@ -0,0 +1,174 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2016 Michel Müller, Tokyo Institute of Technology
+
+# This file is part of Hybrid Fortran.
+
+# Hybrid Fortran is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Hybrid Fortran is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
+
+import os, sys, time, json, resource
+
+#reports are JSON files with this extension. wall times are in seconds, peak resident set sizes in KiB.
+#the peak RSS only ever grows within a process, so files are attributed the growth of the peak RSS while they were processed.
+profileReportExtension = "hfprof"
+
+def getPeakRSS(who=resource.RUSAGE_SELF):
+    peakRSS = resource.getrusage(who).ru_maxrss
+    if sys.platform == "darwin":
+        #reported in bytes on OS X, in KiB everywhere else
+        return peakRSS // 1024
+    return peakRSS
+
+def getNumOfLines(path):
+    numOfLines = 0
+    sourceFile = open(str(path), 'r')
+    try:
+        for _ in sourceFile:
+            numOfLines += 1
+    finally:
+        sourceFile.close()
+    return numOfLines
+
+class PreprocessorProfile(object):
+    '''Wall time, peak RSS (growth, for files) and line count per stage and per source file of one preprocessor run.
+    Without a report path the profile is disabled and all calls return immediately, so the tools can use it unconditionally.'''
+
+    def __init__(self, toolName, reportPath=None):
+        self.toolName = toolName
+        self.reportPath = reportPath
+        self.startTime = time.time()
+        self.stages = []
+        self.files = []
+        self.stageStartTimesByName = {}
+        self.fileStartsByStageAndPath = {}
+
+    @property
+    def isEnabled(self):
+        return self.reportPath != None
+
+    def startStage(self, stageName):
+        if not self.isEnabled:
+            return
+        self.stageStartTimesByName[stageName] = time.time()
+
+    def endStage(self, stageName, numOfLines=None):
+        '''numOfLines defaults to the sum over the files recorded for this stage.'''
+        if not self.isEnabled:
+            return
+        wallTime = time.time() - self.stageStartTimesByName.pop(stageName)
+        if numOfLines == None:
+            numOfLines = sum(fileEntry["lines"] for fileEntry in self.files if fileEntry["stage"] == stageName)
+        self.stages.append({
+            "name": stageName,
+            "wallTime": wallTime,
+            "peakRSS": getPeakRSS(),
+            "lines": numOfLines,
+            "files": len([fileEntry for fileEntry in self.files if fileEntry["stage"] == stageName])
+        })
+
+    def startFile(self, stageName, path):
+        if not self.isEnabled:
+            return
+        self.fileStartsByStageAndPath[(stageName, path)] = (time.time(), getPeakRSS())
+
+    def endFile(self, stageName, path):
+        if not self.isEnabled:
+            return
+        startTime, peakRSSAtStart = self.fileStartsByStageAndPath.pop((stageName, path))
+        self.recordFile(stageName, path, time.time() - startTime, getPeakRSS() - peakRSSAtStart)
+
+    def recordFile(self, stageName, path, wallTime, peakRSSGrowth):
+        '''Used directly for files that have been processed in worker processes.'''
+        if not self.isEnabled:
+            return
+        self.files.append({
+            "stage": stageName,
+            "path": path,
+            "wallTime": wallTime,
+            "peakRSSGrowth": peakRSSGrowth,
+            "lines": getNumOfLines(path)
+        })
+
+    def getReport(self):
+        return {
+            "tool": self.toolName,
+            "arguments": sys.argv[1:],
+            "startTime": self.startTime,
+            "wallTime": time.time() - self.startTime,
+            "peakRSS": max(getPeakRSS(), getPeakRSS(resource.RUSAGE_CHILDREN)),
+            "stages": self.stages,
+            "files": self.files
+        }
+
+    def write(self):
+        if not self.isEnabled:
+            return
+        reportFile = open(str(self.reportPath), 'w')
+        try:
+            json.dump(self.getReport(), reportFile, sort_keys=True, indent=4, separators=(',', ': '))
+        finally:
+            reportFile.close()
+
+def combineProfileReports(reports):
+    '''Aggregates the reports of a build. Stages are identified by tool and stage name, files by their base name
+    (the tools see the same sources in different directories). Stages and files are ordered by descending wall time.'''
+    stagesByKey = {}
+    filesByName = {}
+    for report in reports:
+        for stage in report["stages"]:
+            key = (report["tool"], stage["name"])
+            combinedStage = stagesByKey.setdefault(key, {
+                "tool": report["tool"],
+                "name": stage["name"],
+                "wallTime": 0.0,
+                "peakRSS": 0,
+                "lines": 0,
+                "runs": 0
+            })
+            combinedStage["wallTime"] += stage["wallTime"]
+            combinedStage["peakRSS"] = max(combinedStage["peakRSS"], stage["peakRSS"])
+            combinedStage["lines"] += stage["lines"]
+            combinedStage["runs"] += 1
+        for fileEntry in report["files"]:
+            fileName = os.path.basename(fileEntry["path"])
+            combinedFile = filesByName.setdefault(fileName, {
+                "name": fileName,
+                "wallTime": 0.0,
+                "peakRSSGrowth": 0,
+                "lines": 0,
+                "wallTimeByStage": {}
+            })
+            stageName = "%s: %s" %(report["tool"], fileEntry["stage"])
+            combinedFile["wallTime"] += fileEntry["wallTime"]
+            combinedFile["peakRSSGrowth"] = max(combinedFile["peakRSSGrowth"], fileEntry["peakRSSGrowth"])
+            combinedFile["lines"] = max(combinedFile["lines"], fileEntry["lines"])
+            combinedFile["wallTimeByStage"][stageName] = combinedFile["wallTimeByStage"].get(stageName, 0.0) + fileEntry["wallTime"]
+    byWallTime = lambda entry: -entry["wallTime"]
+    return {
+        "reports": len(reports),
+        "wallTime": sum(report["wallTime"] for report in reports),
+        "peakRSS": max([report["peakRSS"] for report in reports] + [0]),
+        "tools": sorted([
+            {
+                "tool": report["tool"],
+                "arguments": report["arguments"],
+                "wallTime": report["wallTime"],
+                "peakRSS": report["peakRSS"]
+            }
+            for report in reports
+        ], key=byWallTime),
+        "stages": sorted(stagesByKey.values(), key=byWallTime),
+        "files": sorted(filesByName.values(), key=byWallTime)
+    }
@@ -1,10 +1,83 @@
 import unittest
 
+#a kernel and its wrapper in separate files: converting the kernel changes its routine node, which the wrapper reads
+kernelAndWrapperSourcesByName = {
+	"a_kernels.h90": """module kernels
+contains
+  subroutine stencil(n, m, a, b)
+    implicit none
+    integer(4), intent(in) :: n, m
+    real(8), intent(in), dimension(n,m) :: a
+    real(8), intent(out), dimension(n,m) :: b
+    @domainDependant{attribute(autoDom)}
+    a, b, n, m
+    @end domainDependant
+
+    @parallelRegion{domName(i,j), domSize(n,m), endAt(n-1,m)}
+    b(i,j) = a(i,j) + a(i+1,j)
+    @end parallelRegion
+  end subroutine
+end module
+""",
+	"c_wrappers.h90": """module wrappers
+  use kernels
+contains
+  subroutine stencilWrapper(n, m, a, b)
+    implicit none
+    integer(4), intent(in) :: n, m
+    real(8), intent(in), dimension(n,m) :: a
+    real(8), intent(out), dimension(n,m) :: b
+    @domainDependant{attribute(autoDom)}
+    a, b, n, m
+    @end domainDependant
+
+    call stencil(n, m, a, b)
+  end subroutine
+end module
+"""
+}
+
 def tupleFromMatch(match):
 	if not match:
 		return ()
 	return match.groups()
 
+def writeSources(sourceDir, sourcesByName):
+	import os
+	if not os.path.isdir(sourceDir):
+		os.makedirs(sourceDir)
+	for name, text in sourcesByName.items():
+		open(os.path.join(sourceDir, name), 'w').write(text)
+
+def runScript(workingDir, scriptName, arguments, outputPath=None):
+	'''Runs one of the preprocessor scripts like the make pipeline does, with its log in workingDir.'''
+	import os, subprocess, sys
+	logFile = open(os.path.join(workingDir, "scripts.log"), 'a')
+	outputFile = open(outputPath, 'w') if outputPath != None else logFile
+	try:
+		subprocess.check_call(
+			[sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), scriptName)] + arguments,
+			cwd=workingDir,
+			stdout=outputFile,
+			stderr=logFile
+		)
+	finally:
+		if outputPath != None:
+			outputFile.close()
+		logFile.close()
+
+def writeAnalyzedCallgraph(workingDir, sourceDir, architecture):
+	import os
+	rawCallgraphPath = os.path.join(workingDir, "callgraph.xml")
+	callgraphPath = os.path.join(workingDir, "callgraph_%s.xml" %(architecture))
+	runScript(workingDir, "annotatedCallGraphFromH90SourceDir.py", ["-i", sourceDir], rawCallgraphPath)
+	runScript(workingDir, "loopAnalysisWithAnnotatedCallGraph.py", ["-i", rawCallgraphPath, "-a", architecture], callgraphPath)
+	return callgraphPath
+
+def readFilesByName(directory):
+	import os
+	return dict((name, open(os.path.join(directory, name), 'rb').read()) for name in os.listdir(directory))
+
 class TestPatterns(unittest.TestCase):
 	def testImportPatterns(self):
 		from tools.patterns import RegExPatterns
@@ -30,6 +103,21 @@ class TestPatterns(unittest.TestCase):
 			("my_module", "a, ab => my_ba, ba")
 		)
 
+	def testPatternDispatcher(self):
+		from tools.patterns import RegExPatterns
+		dispatcher = RegExPatterns.Instance().getDispatcher(("subprocEndPattern", "subprocBeginPattern", "subprocCallPattern"))
+		patternName, match = dispatcher.match("  END SUBROUTINE")
+		self.assertEqual(patternName, "subprocEndPattern")
+		patternName, match = dispatcher.match("  pure subroutine blub(a, b)")
+		self.assertEqual(patternName, "subprocBeginPattern")
+		self.assertEqual(match.group(1), "blub")
+		patternName, match = dispatcher.match("call blib(a, b)")
+		self.assertEqual(tupleFromMatch(match), ("blib", "(a, b)"))
+		self.assertEqual(dispatcher.match("a = b + c"), (None, None))
+		patternName, match = dispatcher.match("called = .true.")
+		self.assertEqual(patternName, "subprocCallPattern")
+		self.assertEqual(tupleFromMatch(match), ("ed", " = .true."))
+
 class TestCommonTools(unittest.TestCase):
 	def testTextSplittingBasic(self):
 		from tools.commons import splitTextAtLeftMostOccurrence
@@ -201,6 +289,317 @@ class TestCommonTools(unittest.TestCase):
 		)
 		self.assertEqual(remainder, "::b")
 
+	def testProfileReportCombination(self):
+		from tools.profiling import PreprocessorProfile, combineProfileReports
+		profile = PreprocessorProfile("tool")
+		profile.startStage("parsing")
+		profile.startFile("parsing", __file__)
+		profile.endFile("parsing", __file__)
+		profile.endStage("parsing")
+		self.assertEqual(profile.stages, [])
+		self.assertEqual(profile.files, [])
+
+		profile = PreprocessorProfile("tool", "unused.hfprof")
+		profile.startFile("parsing", __file__)
+		profile.endFile("parsing", __file__)
+		self.assertTrue(profile.files[0]["peakRSSGrowth"] >= 0)
+		self.assertTrue(profile.getReport()["peakRSS"] > 0)
+
+		profile = PreprocessorProfile("tool", "unused.hfprof")
+		profile.startStage("parsing")
+		profile.recordFile("parsing", __file__, 1.0, 100)
+		profile.recordFile("parsing", __file__, 2.0, 300)
+		profile.endStage("parsing")
+		report = profile.getReport()
+		numOfLines = report["files"][0]["lines"]
+		self.assertTrue(numOfLines > 0)
+		self.assertEqual(report["stages"][0]["lines"], 2 * numOfLines)
+		self.assertEqual(report["stages"][0]["files"], 2)
+
+		combinedReport = combineProfileReports([report, report])
+		self.assertEqual(combinedReport["reports"], 2)
+		self.assertEqual(len(combinedReport["stages"]), 1)
+		self.assertEqual(combinedReport["stages"][0]["runs"], 2)
+		self.assertEqual(len(combinedReport["files"]), 1)
+		self.assertEqual(combinedReport["files"][0]["wallTime"], 6.0)
+		self.assertEqual(combinedReport["files"][0]["peakRSSGrowth"], 300)
+		self.assertEqual(combinedReport["files"][0]["lines"], numOfLines)
+
+	def testFortranPreSanitizing(self):
+		from strip_fortran_line_continuations import pre_sanitize_fortran
+		lines = [
+			"  subroutine a(b, & ! comment\n",
+			"\n",
+			"    & c)\n",
+			"  !$OMP PARALLEL DO &\n",
+			"  !$OMP& PRIVATE(i)\n",
+			"  write(0,*) \"!no comment\" !comment\n",
+			"\r\n",
+			"  end subroutine"
+		]
+		self.assertEqual(
+			"".join(pre_sanitize_fortran(lines)),
+			"  subroutine a(b, c)\n!$OMP PARALLEL DO PRIVATE(i)\nwrite(0,*) \"!no comment\" \nend subroutine"
+		)
+
+	def testSourceDiscovery(self):
+		import os, shutil, tempfile
+		from tools.filesystem import walkDirectory, filterExceptions, dirEntries
+		rootPath = tempfile.mkdtemp()
+		try:
+			os.makedirs(os.path.join(rootPath, "kernels", "old"))
+			for relativePath in ["main.h90", "kernels/stencil.h90", "kernels/old/stencil.h90", "kernels/notes.txt"]:
+				open(os.path.join(rootPath, relativePath), 'w').close()
+			filePaths, directoryPaths = walkDirectory(rootPath)
+			self.assertEqual(
+				sorted(os.path.relpath(path, rootPath) for path in filePaths),
+				["kernels/notes.txt", "kernels/old/stencil.h90", "kernels/stencil.h90", "main.h90"]
+			)
+			self.assertEqual(
+				sorted(os.path.relpath(path, rootPath) for path in directoryPaths),
+				[".", "kernels", "kernels/old"]
+			)
+			self.assertEqual(sorted(filePaths), sorted(dirEntries(rootPath, True, "h90", "txt")))
+			self.assertEqual(
+				sorted(os.path.relpath(path, rootPath) for path in filterExceptions(["old"], filePaths)),
+				["kernels/notes.txt", "kernels/stencil.h90", "main.h90"]
+			)
+		finally:
+			shutil.rmtree(rootPath)
+
+	def testWatchModeScanning(self):
+		import os, shutil, tempfile
+		from serve import IncrementalBuild
+		rootPath = tempfile.mkdtemp()
+		try:
+			os.makedirs(os.path.join(rootPath, "kernels"))
+			for relativePath in ["main.h90", "kernels/stencil.H90", "kernels/notes.txt"]:
+				open(os.path.join(rootPath, relativePath), 'w').close()
+			build = IncrementalBuild([rootPath], None, None, "", {})
+			changedSourcePaths, removedSourcePaths = build.scan()
+			self.assertEqual(
+				sorted(os.path.relpath(path, rootPath) for path in changedSourcePaths),
+				["kernels/stencil.H90", "main.h90"]
+			)
+			self.assertEqual(removedSourcePaths, [])
+			self.assertEqual(build.scan(), (changedSourcePaths, []))
+			for path in changedSourcePaths:
+				build.markUpToDate(path)
+			self.assertEqual(build.scan(), ([], []))
+			stencilPath = os.path.join(rootPath, "kernels", "stencil.H90")
+			open(stencilPath, 'w').write("module stencil\nend module\n")
+			os.remove(os.path.join(rootPath, "main.h90"))
+			self.assertEqual(build.scan(), ([stencilPath], [os.path.join(rootPath, "main.h90")]))
+		finally:
+			shutil.rmtree(rootPath)
+
+	def testWatchModeFailingSource(self):
+		import os, shutil, tempfile
+		from serve import IncrementalBuild
+		from machinery.codebase import getImplementationsByTemplateName
+		rootPath = tempfile.mkdtemp()
+		try:
+			sourceDir = os.path.join(rootPath, "source")
+			os.makedirs(sourceDir)
+			sourcePath = os.path.join(sourceDir, "main.h90")
+			open(sourcePath, 'w').write("module main\nend module\n")
+			preparedPath = os.path.join(rootPath, "prepared")
+			build = IncrementalBuild([sourceDir], preparedPath, rootPath, "", getImplementationsByTemplateName({"default": "FortranImplementation"}, []))
+			#the prepared source can't be written yet
+			self.assertRaises(IOError, build.update)
+			self.assertEqual(build.pendingSourceNames, set())
+			self.assertEqual(build.scan(), ([sourcePath], []))
+			os.makedirs(preparedPath)
+			self.assertEqual(build.update(), ["main"])
+			self.assertEqual(build.update(), None)
+		finally:
+			shutil.rmtree(rootPath)
+
+	def testWatchModeIncrementalOutput(self):
+		import os, shutil, tempfile
+		from serve import IncrementalBuild
+		from machinery.codebase import getImplementationsByTemplateName
+		kernelsText = kernelAndWrapperSourcesByName["a_kernels.h90"]
+		routineText = kernelsText[kernelsText.index("  subroutine"):kernelsText.index("end module")]
+		sourcesByName = {
+			"a_kernels.h90": kernelsText.replace("end module", routineText.replace("stencil", "stencil2") + "end module"),
+			"c_wrappers.h90": kernelAndWrapperSourcesByName["c_wrappers.h90"].replace(
+				"    call stencil(n, m, a, b)\n",
+				"    call stencil(n, m, a, b)\n    call stencil2(n, m, a, b)\n"
+			)
+		}
+		rootPath = tempfile.mkdtemp()
+		def createBuild(name):
+			sourceDir = os.path.join(rootPath, name, "source")
+			writeSources(sourceDir, sourcesByName)
+			for directoryName in ["prepared", "output"]:
+				os.makedirs(os.path.join(rootPath, name, directoryName))
+			return sourceDir, IncrementalBuild(
+				[sourceDir],
+				os.path.join(rootPath, name, "prepared"),
+				os.path.join(rootPath, name, "output"),
+				"GPU",
+				getImplementationsByTemplateName({"default": "CUDAFortranImplementation"}, [])
+			)
+		def getFullBuildOutput(name):
+			_, build = createBuild(name)
+			build.update()
+			return readFilesByName(build.outputDir)
+		try:
+			sourceDir, build = createBuild("incremental")
+			self.assertEqual(build.update(), ["a_kernels", "c_wrappers"])
+			#only the wrapper changes
+			sourcesByName["c_wrappers.h90"] += "! touched\n"
+			writeSources(sourceDir, {"c_wrappers.h90": sourcesByName["c_wrappers.h90"]})
+			build.update()
+			self.assertEqual(readFilesByName(build.outputDir), getFullBuildOutput("touched"))
+			#the second kernel is not a kernel anymore, which changes how the (otherwise unaffected) wrapper calls it
+			kernelsText = sourcesByName["a_kernels.h90"]
+			sourcesByName["a_kernels.h90"] = kernelsText[:kernelsText.rindex("    @parallelRegion")] \
+				+ "    b(:,:) = a(:,:)\n" \
+				+ kernelsText[kernelsText.rindex("    @end parallelRegion\n") + len("    @end parallelRegion\n"):]
+			writeSources(sourceDir, {"a_kernels.h90": sourcesByName["a_kernels.h90"]})
+			self.assertEqual(build.update(), ["a_kernels", "c_wrappers"])
+			self.assertEqual(readFilesByName(build.outputDir), getFullBuildOutput("edited"))
+			self.assertIn("call stencil2(n, m, a, b)", readFilesByName(build.outputDir)["c_wrappers.P90"])
+		finally:
+			shutil.rmtree(rootPath)
+
+class TestMetadata(unittest.TestCase):
+	def testCallGraphFragmentMerging(self):
+		from tools.metadata import parseString, mergeCallGraphFragment
+		doc = parseString(
+			'<callGraph><routines/><calls/>' \
+			+ '<domainDependantTemplates><domainDependantTemplate id="a"><attribute><entry>autoDom</entry></attribute></domainDependantTemplate></domainDependantTemplates>' \
+			+ '</callGraph>'
+		)
+		fragmentDoc = parseString(
+			'<callGraph><routines><routine name="r"><domainDependants><templateRelation id="b"/></domainDependants></routine></routines>' \
+			+ '<calls><call caller="r" callee="s"/></calls>' \
+			+ '<domainDependantTemplates><domainDependantTemplate id="b"><attribute><entry>autoDom</entry></attribute></domainDependantTemplate></domainDependantTemplates>' \
+			+ '</callGraph>'
+		)
+		mergeCallGraphFragment(doc, fragmentDoc)
+		self.assertEqual(len(doc.getElementsByTagName("routine")), 1)
+		self.assertEqual(len(doc.getElementsByTagName("call")), 1)
+		self.assertEqual(len(doc.getElementsByTagName("domainDependantTemplate")), 1)
+		self.assertEqual(doc.getElementsByTagName("templateRelation")[0].getAttribute("id"), "a")
+		mergeCallGraphFragment(doc, fragmentDoc)
+		self.assertEqual(len(doc.getElementsByTagName("routine")), 2)
+		self.assertEqual(len(doc.getElementsByTagName("call")), 1)
+
+	def testDuplicateDetection(self):
+		from tools.metadata import parseString, firstDuplicateChild, updateStructuralKeyIndex
+		doc = parseString(
+			'<templates><template id="a"><attribute><entry>autoDom</entry><entry>present</entry></attribute></template>' \
+			+ '<template id="b"><attribute><entry>present</entry></attribute></template></templates>'
+		)
+		templates = doc.documentElement
+		newTemplate = parseString('<template id="c"><attribute><entry>present</entry><entry>autoDom</entry></attribute></template>').documentElement
+		self.assertEqual(firstDuplicateChild(templates, newTemplate).getAttribute("id"), "a")
+		self.assertEqual(firstDuplicateChild(templates, newTemplate, ignoreIDs=False), None)
+		newTemplate = parseString('<template id="d"><attribute><entry>present</entry><entry>present</entry></attribute></template>').documentElement
+		self.assertEqual(firstDuplicateChild(templates, newTemplate), None)
+		templates.appendChild(newTemplate)
+		self.assertEqual(firstDuplicateChild(templates, newTemplate.cloneNode(True)).getAttribute("id"), "d")
+		removedEntry = newTemplate.firstChild.removeChild(newTemplate.firstChild.firstChild)
+		updateStructuralKeyIndex(newTemplate.firstChild, removedEntry)
+		self.assertEqual(firstDuplicateChild(templates, newTemplate.cloneNode(True)).getAttribute("id"), "b")
+		newTemplate = parseString('<template id="e"><attribute><entry>transferHere</entry></attribute></template>').documentElement
+		self.assertEqual(firstDuplicateChild(templates, newTemplate), None)
+		templates.childNodes[1].firstChild.firstChild.firstChild.data = "transferHere"
+		updateStructuralKeyIndex(templates.childNodes[1].firstChild.firstChild.firstChild)
+		self.assertEqual(firstDuplicateChild(templates, newTemplate).getAttribute("id"), "b")
+		removedTemplate = templates.removeChild(templates.childNodes[1])
+		updateStructuralKeyIndex(templates, removedTemplate)
+		self.assertEqual(firstDuplicateChild(templates, newTemplate), None)
+		templates.appendChild(removedTemplate)
+		self.assertEqual(firstDuplicateChild(templates, newTemplate).getAttribute("id"), "b")
+
+	def testDuplicateDetectionAfterChangesInPlace(self):
+		import logging
+		from tools.metadata import parseString, firstDuplicateChild, updateStructuralKeyIndex
+		doc = parseString(
+			'<routines><routine name="a"><domainDependants><entry name="x"/></domainDependants></routine>' \
+			+ '<routine name="b"><domainDependants><entry name="y"/></domainDependants></routine></routines>'
+		)
+		routines = doc.documentElement
+		newRoutine = parseString('<routine name="b"><domainDependants><entry name="z"/></domainDependants></routine>').documentElement
+		self.assertEqual(firstDuplicateChild(routines, newRoutine), None)
+		entry = routines.childNodes[1].firstChild.firstChild
+		entry.setAttribute("name", "z")
+		previousLevel = logging.root.level
+		logging.root.setLevel(logging.DEBUG)
+		try:
+			#not reported -> the index doesn't match a full scan anymore
+			self.assertRaises(Exception, firstDuplicateChild, routines, newRoutine)
+			updateStructuralKeyIndex(entry)
+			self.assertEqual(firstDuplicateChild(routines, newRoutine).getAttribute("name"), "b")
+			domainDependants = routines.childNodes[1].firstChild
+			domainDependants.appendChild(doc.createElement("entry"))
+			updateStructuralKeyIndex(domainDependants)
+			self.assertEqual(firstDuplicateChild(routines, newRoutine), None)
+			removedEntry = domainDependants.removeChild(domainDependants.lastChild)
+			updateStructuralKeyIndex(domainDependants, removedEntry)
+			self.assertEqual(firstDuplicateChild(routines, newRoutine).getAttribute("name"), "b")
+			#removed children don't need to be reported to the parent's index
+			routines.removeChild(routines.childNodes[1])
+			self.assertEqual(firstDuplicateChild(routines, newRoutine), None)
+		finally:
+			logging.root.setLevel(previousLevel)
+		routines.childNodes[0].setAttribute("name", "b")
+		updateStructuralKeyIndex(routines.childNodes[0])
+		self.assertEqual(firstDuplicateChild(routines, newRoutine), None)
+		routines.childNodes[0].firstChild.firstChild.setAttribute("name", "z")
+		updateStructuralKeyIndex(routines.childNodes[0].firstChild.firstChild)
+		self.assertTrue(firstDuplicateChild(routines, newRoutine) is routines.childNodes[0])
+
+	def testImmutableDocument(self):
+		from tools.metadata import parseString
+		data = '<?xml version="1.0" ?><callGraph><routines>' \
+			+ '<routine name="r"><arguments><argument symbolName="a"/></arguments></routine>' \
+			+ '<routine name="s"><arguments><argument symbolName="b"/><argument symbolName="c"/></arguments></routine>' \
+			+ '</routines><calls><call callee="s" caller="r">text &amp; more</call></calls></callGraph>'
+		doc = parseString(data, immutable=True)
+		self.assertEqual(doc.toxml(), data)
+		routines = doc.getElementsByTagName("routine")
+		self.assertEqual([routine.getAttribute("name") for routine in routines], ["r", "s"])
+		self.assertEqual([argument.getAttribute("symbolName") for argument in routines[1].getElementsByTagName("argument")], ["b", "c"])
+		self.assertEqual(len(doc.getElementsByTagName("routines")[0].getElementsByTagName("argument")), 3)
+		self.assertEqual(len(doc.getElementsByTagName("calls")[0].getElementsByTagName("argument")), 0)
+		self.assertEqual(doc.getElementsByTagName("call")[0].firstChild.nodeValue, "text & more")
+		self.assertIs(routines[0].parentNode.childNodes[0], routines[0])
+		clone = routines[0].cloneNode(deep=True)
+		clone.setAttribute("name", "r_clone")
+		self.assertEqual(routines[0].getAttribute("name"), "r")
+		self.assertEqual(len(clone.getElementsByTagName("argument")), 1)
+		self.assertRaises(Exception, routines[0].appendChild, clone)
+
+	def testParsedTemplateCache(self):
+		from tools.metadata import parseString, getParsedTemplate, getDomNameAndSize, getAttributes
+		data = '<?xml version="1.0" ?><callGraph><domainDependantTemplates><domainDependantTemplate id="t">' \
+			+ '<domName><entry>i</entry><entry>j</entry></domName><domSize><entry>nx</entry><entry>ny</entry></domSize>' \
+			+ '<attribute><entry>present</entry></attribute></domainDependantTemplate></domainDependantTemplates></callGraph>'
+		doc = parseString(data, immutable=True)
+		template = doc.getElementsByTagName("domainDependantTemplate")[0]
+		self.assertIs(getParsedTemplate(template), getParsedTemplate(template))
+		self.assertIs(getParsedTemplate(template.cloneNode(deep=True)), getParsedTemplate(template))
+		domains = getDomNameAndSize(template)
+		self.assertEqual(domains, [("i", "nx"), ("j", "ny")])
+		domains.append(("k", "nz"))
+		self.assertEqual(getDomNameAndSize(template), [("i", "nx"), ("j", "ny")])
+		self.assertEqual(getAttributes(template), ["present"])
+
+class TestAnalysis(unittest.TestCase):
+	def testSymbolAnalysisForDeepCallGraph(self):
+		from benchmark import createSyntheticCallGraph
+		from tools.analysis import SymbolDependencyAnalyzer
+		doc, _ = createSyntheticCallGraph(3000, layerWidth=1, callsPerRoutine=1)
+		symbolAnalysis = SymbolDependencyAnalyzer(doc).getSymbolAnalysis()
+		self.assertEqual(symbolAnalysis[("routine2999", "a")][0].aliasNamesByRoutineName["routine2998"], "local")
+		self.assertEqual(symbolAnalysis[("routine2999", "b")][0].aliasNamesByRoutineName["routine0"], "b")
+		self.assertEqual(len(symbolAnalysis[("routine2999", "b")]), 1)
+
 class TestMachineryAlgorithms(unittest.TestCase):
 	def testSpecificationParsing(self):
 		from machinery.commons import parseSpecification
@@ -285,6 +684,22 @@ class TestMachineryAlgorithms(unittest.TestCase):
 			("double precision, attribute", (("a", None),), "= 1.0d0")
 		)
 
+	def testLineBreaking(self):
+		from machinery.commons import FortranCodeSanitizer
+		sanitizer = FortranCodeSanitizer()
+		self.assertEqual(
+			sanitizer.sanitizeLines("call foo(aaaa, 'b c', dddd, eeee)", howManyCharsPerLine=20),
+			"call foo(aaaa, &\n&  'b c', dddd, &\n&  eeee)\n"
+		)
+		self.assertEqual(
+			sanitizer.sanitizeLines("!$acc kernels present(aaaa, bbbb, cccc)", howManyCharsPerLine=24),
+			"!$acc kernels &\n!$acc&  present(aaaa, bbbb, &\n!$acc&  cccc)\n"
+		)
+		self.assertEqual(
+			sanitizer.sanitizeLines("write(0,*) '" + " w" * 150 + "', a, b"),
+			"write(0,*) &\n&  '" + " w" * 150 + "', &\n&  a, b\n"
+		)
+
 class TestSymbolAlgorithms(unittest.TestCase):
 	def testSymbolNamesFromDeclaration(self):
 		def symbolNamesFromDeclaration(declaration):
@@ -424,6 +839,74 @@ class TestSymbolAlgorithms(unittest.TestCase):
 			("real(8)", "real(8), dimension(n * (m + 1))", "a")
 		)
 
+	def testAccessRepresentation(self):
+		from models.symbol import Symbol, deviceVersionIdentifier
+		symbol = Symbol("a")
+		symbol.isUserSpecified = True
+		symbol.updateNameInScope()
+		symbol.domains = [("i", "n"), ("j", "m"), ("k", "l")]
+		self.assertEqual(symbol.accessRepresentation([], ["1", "2", "3"], None), "a( 1,2,3 )")
+		self.assertEqual(symbol.accessRepresentation([], [], None, isInsideParallelRegion=True), "a")
+		symbol.isUsingDevicePostfix = True
+		self.assertEqual(symbol.accessRepresentation([], [], None, isInsideParallelRegion=True), deviceVersionIdentifier("a"))
+		symbol.domains = []
+		self.assertEqual(symbol.accessRepresentation([], ["1", "2", "3"], None), deviceVersionIdentifier("a"))
+
+	def testCompactSymbols(self):
+		from models.symbol import Symbol
+		symbol = Symbol(u"a")
+		otherSymbol = Symbol("b")
+		symbol.domains = [(u"i", u"n"), (u"j", u"m")]
+		otherSymbol.domains = [(u"i", u"n"), (u"j", u"m")]
+		self.assertIs(symbol.domains, otherSymbol.domains)
+		self.assertEqual(symbol.domains, ((u"i", u"n"), (u"j", u"m")))
+		self.assertFalse(hasattr(symbol, "__dict__"))
+		self.assertRaises(AttributeError, setattr, symbol, "undeclaredAttribute", True)
+		clone = symbol.clone()
+		self.assertIs(clone.domains, symbol.domains)
+		self.assertIs(clone.name, symbol.name)
+		clone.domains = [(u"i", u"n")]
+		clone._kernelInactiveDomainSizes.append(u"m")
+		self.assertEqual(len(symbol.domains), 2)
+		self.assertEqual(symbol._kernelInactiveDomainSizes, [])
+
+	def testModuleArraysForCallee(self):
+		from models.symbol import Symbol
+		from models.routine import getModuleArraysForCallee
+		from tools.analysis import SymbolAnalysis, SymbolType
+		moduleSymbol = Symbol(u"g")
+		symbolsByModuleNameAndSymbolName = {u"data": {u"g": moduleSymbol}}
+		#each callgraph traversal creates its own analysis for a module symbol - here g is imported under an alias in kernel2
+		symbolAnalysisByRoutineNameAndSymbolName = {}
+		for routineName, aliasName in [(u"kernel1", u"g"), (u"kernel2", u"gAlias")]:
+			analysis = SymbolAnalysis()
+			analysis.name = u"g"
+			analysis.sourceModule = u"data"
+			analysis.sourceSymbol = u"g"
+			analysis.symbolType = SymbolType.MODULE_DATA_WITH_DOMAIN_DEPENDANT_SPEC
+			analysis.aliasNamesByRoutineName[routineName] = aliasName
+			symbolAnalysisByRoutineNameAndSymbolName[routineName] = {aliasName: [analysis]}
+		kernel1Arrays = getModuleArraysForCallee(u"kernel1", symbolAnalysisByRoutineNameAndSymbolName, symbolsByModuleNameAndSymbolName)
+		kernel2Arrays = getModuleArraysForCallee(u"kernel2", symbolAnalysisByRoutineNameAndSymbolName, symbolsByModuleNameAndSymbolName)
+		#the wrapper holds on to the arrays of each kernel until it is implemented -
+		#the arrays of kernel1 must not pick up the analysis of kernel2 in the meantime
+		self.assertEqual(kernel1Arrays[0].analysis.aliasNamesByRoutineName, {u"kernel1": u"g"})
+		self.assertEqual(kernel2Arrays[0].analysis.aliasNamesByRoutineName, {u"kernel2": u"gAlias"})
+		self.assertIs(moduleSymbol.analysis, None)
+
+	def testClearingInternedValues(self):
+		from models.symbol import Symbol, clearInternedValues, _internedStringsByTypeAndValue, _internedDomainsByID
+		symbol = Symbol(u"a")
+		symbol.domains = [(u"i", u"n")]
+		clearInternedValues()
+		self.assertEqual(len(_internedStringsByTypeAndValue), 0)
+		self.assertEqual(len(_internedDomainsByID), 0)
+		self.assertEqual(symbol.domains, ((u"i", u"n"),))
+		otherSymbol = Symbol(u"b")
+		otherSymbol.domains = [(u"i", u"n")]
+		self.assertEqual(otherSymbol.domains, symbol.domains)
+		self.assertIsNot(otherSymbol.domains, symbol.domains)
+
 class TestImplementationAlgorithms(unittest.TestCase):
 	def testRoutineNameSynthesis(self):
 		from implementations.commons import synthesizedKernelName
@@ -470,5 +953,54 @@ class TestImplementationAlgorithms(unittest.TestCase):
 			"hfd_a"
 		)
 
+class TestConversion(unittest.TestCase):
+	def testParallelConversion(self):
+		import os, shutil, tempfile
+		rootPath = tempfile.mkdtemp()
+		try:
+			sourceDir = os.path.join(rootPath, "source")
+			writeSources(sourceDir, kernelAndWrapperSourcesByName)
+			callgraphPath = writeAnalyzedCallgraph(rootPath, sourceDir, "GPU")
+			implementationPath = os.path.join(rootPath, "implementationNamesByTemplate")
+			open(implementationPath, 'w').write('{"default": "CUDAFortranImplementation"}')
+			outputsByJobs = {}
+			for jobs in [1, 3]:
+				outputDir = os.path.join(rootPath, "jobs%i" %(jobs))
+				runScript(rootPath, "generateP90Codebase.py", [
+					"-i", sourceDir, "-o", outputDir, "-c", callgraphPath, "-m", implementationPath, "--jobs=%i" %(jobs)
+				])
+				outputsByJobs[jobs] = readFilesByName(outputDir)
+			self.assertEqual(sorted(outputsByJobs[1].keys()), ["a_kernels.P90.temp", "c_wrappers.P90.temp"])
+			self.assertEqual(outputsByJobs[1], outputsByJobs[3])
+			#the kernel has been converted into a wrapper for the kernel launch, so it's called like a host routine
+			self.assertIn("call hfd_stencil(n, m, a, b)", outputsByJobs[1]["c_wrappers.P90.temp"])
+		finally:
+			shutil.rmtree(rootPath)
+
+	def testFailedConversionLeavesNoOutput(self):
+		import os, shutil, subprocess, tempfile
+		rootPath = tempfile.mkdtemp()
+		try:
+			sourceDir = os.path.join(rootPath, "source")
+			#the CUDA implementation only supports up to three parallel domains, which is detected while the module is written
+			writeSources(sourceDir, {
+				"a_kernels.h90": kernelAndWrapperSourcesByName["a_kernels.h90"] \
+					.replace("dimension(n,m)", "dimension(n,m,2,2)") \
+					.replace("domName(i,j), domSize(n,m), endAt(n-1,m)", "domName(i,j,k,l), domSize(n,m,2,2), endAt(n-1,m,2,2)") \
+					.replace("b(i,j) = a(i,j) + a(i+1,j)", "b(i,j,k,l) = a(i,j,k,l) + a(i+1,j,k,l)")
+			})
+			callgraphPath = writeAnalyzedCallgraph(rootPath, sourceDir, "GPU")
+			implementationPath = os.path.join(rootPath, "implementationNamesByTemplate")
+			open(implementationPath, 'w').write('{"default": "CUDAFortranImplementation"}')
+			for jobs in [1, 2]:
+				outputDir = os.path.join(rootPath, "jobs%i" %(jobs))
+				self.assertRaises(subprocess.CalledProcessError, runScript, rootPath, "generateP90Codebase.py", [
+					"-i", sourceDir, "-o", outputDir, "-c", callgraphPath, "-m", implementationPath, "--jobs=%i" %(jobs)
+				])
+				#the make rules would pick up a truncated .P90.temp file
+				self.assertEqual(os.listdir(outputDir), [])
+		finally:
+			shutil.rmtree(rootPath)
+
 if __name__ == '__main__':
 	unittest.main()
\ No newline at end of file
@@ -19,9 +19,59 @@
 
 from optparse import OptionParser
 import struct
-import sys, pdb
+import sys, os, pdb
 import math
+import copy
+import csv
+import glob
+import json
+import StringIO
+import mmap
+import multiprocessing
 import traceback
+import numpy
+
+class MappedRecordFile(object):
+	'''Fortran unformatted file, memory mapped. Arrays are returned as numpy views into the mapping, nothing is copied.
+	Positioning works like with file objects, such that records can be read tentatively.'''
+
+	def __init__(self, path):
+		self.file = open(path, 'rb')
+		self.size = os.fstat(self.file.fileno()).st_size
+		#empty files can't be mapped
+		self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size > 0 else ''
+		self.position = 0
+
+	def tell(self):
+		return self.position
+
+	def seek(self, position):
+		self.position = position
+
+	def read(self, numOfBytes):
+		data = self.buffer[self.position:self.position + numOfBytes]
+		self.position += len(data)
+		return data
+
+	def readArray(self, numOfBytes, dtype):
+		'''Returns None if less than numOfBytes are left, in that case the position is at the end of the file.'''
+		if self.position + numOfBytes > self.size:
+			self.position = self.size
+			return None
+		array = numpy.frombuffer(self.buffer, dtype=dtype, count=numOfBytes // dtype.itemsize, offset=self.position)
+		self.position += numOfBytes
+		return array
+
+	def close(self):
+		#the mapping is released once the last array view on it is gone
+		self.buffer = None
+		self.file.close()
+
+def printableRecord(record):
+	#keep printing records like the tuples of python values that have been unpacked before
+	if isinstance(record, numpy.ndarray):
+		return tuple(record.tolist())
+	return record
 
 def unpackNextArray(f, readEndianFormat, numOfBytesPerValue, typeSpecifier):
 	recordByteLength = unpackNextInteger(f, readEndianFormat)
@@ -30,11 +80,16 @@ def unpackNextArray(f, readEndianFormat, numOfBytesPerValue, typeSpecifier):
 	if (recordByteLength % numOfBytesPerValue != 0):
 		raise Exception, "Odd record length: %i, modulo %i == 0 expected. Is the file endian correct?" %(recordByteLength, numOfBytesPerValue)
 		return None
-	recordLength = recordByteLength / numOfBytesPerValue
+	dataFormat = '%s%s' %(readEndianFormat, typeSpecifier)
+	try:
+		dtype = numpy.dtype(dataFormat)
+	except Exception as e:
+		raise Exception("Error when trying to unpack array using %s format: %s" %(dataFormat, str(e)))
 
-	data = f.read(recordByteLength)
-	if (len(data) != recordByteLength):
-		raise Exception, "Could not read %i bytes as expected. Only %i bytes read." %(recordByteLength, len(data))
+	numOfBytesAvailable = f.size - f.tell()
+	unpacked = f.readArray(recordByteLength, dtype)
+	if unpacked is None:
+		raise Exception, "Could not read %i bytes as expected. Only %i bytes read." %(recordByteLength, numOfBytesAvailable)
 		return None
 
 	redundantRecordLength = unpackNextInteger(f, readEndianFormat)
@@ -43,12 +98,6 @@ def unpackNextArray(f, readEndianFormat, numOfBytesPerValue, typeSpecifier):
 	if (recordByteLength != redundantRecordLength):
 		raise Exception, "Header and trailer do not match."
 		return None
-
-	dataFormat = '%s%i%s' %(readEndianFormat, recordLength, typeSpecifier)
-	try:
-		unpacked = struct.unpack(dataFormat, data)
-	except Exception as e:
-		raise Exception("Error when trying to unpack array using %s format: %s" %(dataFormat, str(e)))
 	return unpacked
 
 def unpackNextInteger(f, readEndianFormat):
@@ -84,13 +133,13 @@ def unpackNextRecord(f, readEndianFormat, numOfBytesPerValue, verbose=False):
 		eof = False
 		try:
 			content = unpackNextArray(f, readEndianFormat, numOfBytesPerValue, typeSpecifier)
-			eof = content == None
+			eof = content is None
 		except Exception as e:
 			if verbose:
 				sys.stderr.write("Could not unpack record as array (%s) - trying integer\n" %(str(e)))
 		if eof:
 			return None
-		if content != None:
+		if content is not None:
 			if verbose:
 				sys.stderr.write("This record seems to be an array of length %i\n" %(len(content)))
 			return content
@@ -118,7 +167,8 @@ def unpackNextRecord(f, readEndianFormat, numOfBytesPerValue, verbose=False):
 		return [content]
 
 	def valuesAreReasonable(unpacked):
-		return all([v > 1E-15 and v < 1E10 for v in unpacked])
+		values = numpy.asarray(unpacked)
+		return bool(numpy.all((values > 1E-15) & (values < 1E10)))
 
 	if numOfBytesPerValue != None:
 		return tentativeUnpack(
@@ -133,18 +183,18 @@ def unpackNextRecord(f, readEndianFormat, numOfBytesPerValue, verbose=False):
 	# Let's find out whether the number of records is 0 or 1 with 8 bytes (usually that indicates that it is unlikely to be 8 bytes)
 	currentPosition = f.tell()
 	unpacked8 = tentativeUnpack(f, readEndianFormat, 8, 'd', verbose)
-	if unpacked8 != None and len(unpacked8) > 1:
+	if unpacked8 is not None and len(unpacked8) > 1:
 		return unpacked8
 	f.seek(currentPosition)
 	unpacked4 = tentativeUnpack(f, readEndianFormat, 4, 'f', verbose)
-	reasonable4 = valuesAreReasonable(unpacked4) if unpacked4 else False
-	if unpacked8 == None and unpacked4 == None:
+	reasonable4 = valuesAreReasonable(unpacked4) if unpacked4 is not None and len(unpacked4) > 0 else False
+	if unpacked8 is None and unpacked4 is None:
 		return None
-	if unpacked4 != None and len(unpacked4) > 1 and reasonable4:
+	if unpacked4 is not None and len(unpacked4) > 1 and reasonable4:
 		return unpacked4
-	if unpacked4 == None and unpacked8 != None:
+	if unpacked4 is None and unpacked8 is not None:
 		return unpacked8
-	if unpacked8 == None and unpacked4 != None:
+	if unpacked8 is None and unpacked4 is not None:
 		return unpacked4
 	if len(unpacked4) == len(unpacked8):
 		return unpacked4 #at this point an 4 byte integer is most likely
@@ -153,6 +203,52 @@ def unpackNextRecord(f, readEndianFormat, numOfBytesPerValue, verbose=False):
 	return unpacked8
 
 def rootMeanSquareDeviation(tup, tupRef, epsSingle):
+	if isinstance(tup, numpy.ndarray) and isinstance(tupRef, numpy.ndarray):
+		return rootMeanSquareDeviationOfArrays(tup, tupRef, epsSingle)
+	return rootMeanSquareDeviationOfValues(printableRecord(tup), printableRecord(tupRef), epsSingle)
+
+def rootMeanSquareDeviationOfArrays(values, referenceValues, epsSingle):
+	'''Vectorized version of rootMeanSquareDeviationOfValues for (float) records that have passed checkIntegrity.
+	Like there, the absolute errors are returned as the last element, such that the error statistics can be built from them.'''
+	#like with python floats, everything is computed in double precision
+	values = values.astype(numpy.float64)
+	referenceValues = referenceValues.astype(numpy.float64)
+	with numpy.errstate(over='ignore', divide='ignore', invalid='ignore'):
+		errors = values - referenceValues
+		absoluteErrors = numpy.abs(errors)
+		absoluteValues = numpy.abs(values)
+		normErrors = numpy.where(absoluteValues > epsSingle, absoluteErrors / absoluteValues, absoluteErrors)
+		errorSquares = errors * errors
+		#squares that overflow are counted with the maximum float value and become the first error, the last one wins
+		overflowIndices = numpy.flatnonzero(numpy.isinf(errorSquares) & numpy.isfinite(errors))
+		errorSquares[overflowIndices] = sys.float_info.max
+		err = float(numpy.sum(errorSquares))
+		mean_or_one = float(numpy.sum(values)) / len(values) if len(values) > 0 else 1.0
+	if len(overflowIndices) > 0:
+		firstErrIndex = overflowIndices[-1]
+	else:
+		errorIndices = numpy.flatnonzero(normErrors > epsSingle)
+		firstErrIndex = errorIndices[0] if len(errorIndices) > 0 else -1
+	firstErr = -1
+	firstErrVal = 0.0
+	firstErrExpected = 0.0
+	if firstErrIndex != -1:
+		firstErr = int(firstErrIndex) + 1
+		firstErrVal = values[firstErrIndex].item()
+		firstErrExpected = referenceValues[firstErrIndex].item()
+	maxErrorIndex = 1 + int(numpy.argmax(absoluteErrors)) if len(absoluteErrors) > 0 else -1
+	return (
+		math.sqrt(err) / abs(mean_or_one) if mean_or_one > epsSingle else math.sqrt(err),
+		firstErr,
+		firstErrVal,
+		firstErrExpected,
+		maxErrorIndex,
+		values[maxErrorIndex].item() if maxErrorIndex >= 0 and maxErrorIndex < len(values) else 0.0,
+		referenceValues[maxErrorIndex].item() if maxErrorIndex >= 0 and maxErrorIndex < len(referenceValues) else 0.0,
+		absoluteErrors
+	)
+
+def rootMeanSquareDeviationOfValues(tup, tupRef, epsSingle):
 	err = 0.0
 	newErr = 0.0
 	newErrSquare = 0.0
@@ -195,10 +291,16 @@ def rootMeanSquareDeviation(tup, tupRef, epsSingle):
 		firstErrExpected,
 		maxErrorIndex,
 		tup[maxErrorIndex] if maxErrorIndex >= 0 and maxErrorIndex < len(tup) else 0.0,
-		tupRef[maxErrorIndex] if maxErrorIndex >= 0 and maxErrorIndex < len(tupRef) else 0.0
+		tupRef[maxErrorIndex] if maxErrorIndex >= 0 and maxErrorIndex < len(tupRef) else 0.0,
+		absoluteErrors
 	)
 
 def checkIntegrity(tup):
+	if isinstance(tup, numpy.ndarray):
+		invalidIndices = numpy.flatnonzero(~numpy.isfinite(tup))
+		if len(invalidIndices) == 0:
+			return -1, -1
+		return int(invalidIndices[0]), tup[invalidIndices[0]].item()
 	for index, val in enumerate(tup):
 		if math.isnan(val):
 			return index, val
@@ -206,12 +308,157 @@ def checkIntegrity(tup):
 			return index, val
 	return -1, -1
 
+class ErrorStatistics(object):
+	'''Error statistics of one record or variable for the --json and --csv exports, accumulated chunk by chunk.
+	The relative error is taken with respect to the reference, the absolute error is used where the reference is zero.
+	Percentiles are upper bounds read from a histogram with eight bins per decade, the exported histogram has one bin per decade.'''
+
+	binsPerDecade = 8
+	minExponent = -16
+	percentiles = [50, 90, 99]
+	#the first bin also holds the exact values, errors above the last edge go into an additional bin
+	upperEdges = 10.0 ** (numpy.arange(minExponent * binsPerDecade, 1) / float(binsPerDecade))
+
+	def __init__(self):
+		self.numOfValues = 0
+		self.numOfNaNs = 0
+		self.numOfInfs = 0
+		self.maxAbsoluteError = 0.0
+		self.maxAbsoluteErrorOffset = None
+		self.absoluteErrorSum = 0.0
+		self.numOfAbsoluteErrors = 0
+		self.maxRelativeError = 0.0
+		self.histogram = numpy.zeros(len(self.upperEdges) + 1, dtype=numpy.int64)
+
+	def add(self, values, referenceValues, absoluteErrors=None, offset=0):
+		'''absoluteErrors: |values - referenceValues| in case the comparison has already computed them, such that they aren't computed twice.
+		offset: flat offset of values within the record or variable, used for the location of the maximum absolute error.'''
+		mask = numpy.ma.getmaskarray(values) | numpy.ma.getmaskarray(referenceValues)
+		values = numpy.ma.getdata(values)
+		referenceValues = numpy.ma.getdata(referenceValues)
+		if absoluteErrors is not None:
+			absoluteErrors = numpy.ma.getdata(absoluteErrors)
+		#flat offsets of the remaining values within this chunk, None as long as nothing has been left out
+		offsets = None
+		if numpy.any(mask):
+			offsets = numpy.flatnonzero(~mask)
+			values = numpy.ravel(values)[offsets]
+			referenceValues = numpy.ravel(referenceValues)[offsets]
+			if absoluteErrors is not None:
+				absoluteErrors = numpy.ravel(absoluteErrors)[offsets]
+		values = numpy.asarray(values, dtype=numpy.float64).ravel()
+		referenceValues = numpy.asarray(referenceValues, dtype=numpy.float64).ravel()
+		self.numOfValues += values.size
+		self.numOfNaNs += int(numpy.count_nonzero(numpy.isnan(values)))
+		self.numOfInfs += int(numpy.count_nonzero(numpy.isinf(values)))
+		with numpy.errstate(over='ignore', divide='ignore', invalid='ignore'):
+			if absoluteErrors is None:
+				absoluteErrors = numpy.abs(values - referenceValues)
+			else:
+				absoluteErrors = numpy.asarray(absoluteErrors, dtype=numpy.float64).ravel()
+			absoluteReferenceValues = numpy.abs(referenceValues)
+			relativeErrors = numpy.where(absoluteReferenceValues > 0.0, absoluteErrors / absoluteReferenceValues, absoluteErrors)
+		#errors from invalid values only show up in the NaN and Inf counts
+		finiteErrors = numpy.isfinite(absoluteErrors)
+		if not numpy.all(finiteErrors):
+			finiteIndices = numpy.flatnonzero(finiteErrors)
+			offsets = finiteIndices if offsets is None else offsets[finiteIndices]
+			absoluteErrors = absoluteErrors[finiteIndices]
+		relativeErrors = relativeErrors[numpy.isfinite(relativeErrors)]
+		if absoluteErrors.size > 0:
+			maxIndex = int(numpy.argmax(absoluteErrors))
+			if self.maxAbsoluteErrorOffset is None or absoluteErrors[maxIndex] > self.maxAbsoluteError:
+				self.maxAbsoluteError = float(absoluteErrors[maxIndex])
+				self.maxAbsoluteErrorOffset = offset + (int(offsets[maxIndex]) if offsets is not None else maxIndex)
+			self.absoluteErrorSum += float(numpy.sum(absoluteErrors))
+			self.numOfAbsoluteErrors += absoluteErrors.size
+		if relativeErrors.size > 0:
+			self.maxRelativeError = max(self.maxRelativeError, float(numpy.max(relativeErrors)))
+			self.histogram += numpy.bincount(
+				numpy.searchsorted(self.upperEdges, relativeErrors, side='left'),
+				minlength=len(self.histogram)
+			)
+
+	def getPercentile(self, percentile):
+		numOfErrors = numpy.sum(self.histogram)
+		if numOfErrors == 0:
+			return None
+		binIndex = int(numpy.searchsorted(numpy.cumsum(self.histogram), percentile / 100.0 * numOfErrors, side='left'))
+		if binIndex >= len(self.upperEdges):
+			return self.maxRelativeError
+		return min(float(self.upperEdges[binIndex]), self.maxRelativeError)
+
+	def getDecadeHistogram(self):
+		'''List of (upper edge, count) - the upper edge of the last bin is None.'''
+		decadeHistogram = [(float(self.upperEdges[0]), int(self.histogram[0]))]
+		for decade in range(-self.minExponent):
+			firstBin = 1 + decade * self.binsPerDecade
+			lastBin = firstBin + self.binsPerDecade - 1
+			decadeHistogram.append((float(self.upperEdges[lastBin]), int(numpy.sum(self.histogram[firstBin:lastBin + 1]))))
+		decadeHistogram.append((None, int(self.histogram[-1])))
+		return decadeHistogram
+
+	def getEntry(self):
+		return {
+			"length": self.numOfValues,
+			"nanCount": self.numOfNaNs,
+			"infCount": self.numOfInfs,
+			"maxAbsoluteError": self.maxAbsoluteError,
+			"maxAbsoluteErrorOffset": self.maxAbsoluteErrorOffset,
+			"meanAbsoluteError": self.absoluteErrorSum / self.numOfAbsoluteErrors if self.numOfAbsoluteErrors > 0 else None,
+			"maxRelativeError": self.maxRelativeError,
+			"relativeErrorPercentiles": dict(
+				(str(percentile), self.getPercentile(percentile))
+				for percentile in self.percentiles
+			),
+			"relativeErrorHistogram": [
+				{"upperEdge": upperEdge, "count": count}
+				for upperEdge, count in self.getDecadeHistogram()
+			]
+		}
+
+#entries for --json and --csv, collected over all compared files
+exportedStatistics = []
+#distinct from the exit code 1 that errors (including uncaught exceptions) lead to, see allAccuracy.sh
+noOutputFilesExitCode = 3
+
+def exportStatistics(options):
+	if options.json:
+		jsonFile = open(str(options.json), 'w')
+		try:
+			json.dump(exportedStatistics, jsonFile, sort_keys=True, indent=4, separators=(',', ': '))
+		finally:
+			jsonFile.close()
+	if options.csv:
+		histogramColumns = ["relativeError<=%.0e" %(upperEdge) for upperEdge, _ in ErrorStatistics().getDecadeHistogram()[:-1]]
+		histogramColumns.append("relativeError>%.0e" %(ErrorStatistics.upperEdges[-1]))
+		csvFile = open(str(options.csv), 'wb')
+		try:
+			writer = csv.writer(csvFile)
+			writer.writerow(
+				["file", "reference", "record", "variable", "passed", "length", "rmse", "maxAbsoluteError", "maxAbsoluteErrorOffset",
+				"meanAbsoluteError", "maxRelativeError"] +
+				["relativeErrorP%i" %(percentile) for percentile in ErrorStatistics.percentiles] +
+				["nanCount", "infCount"] +
+				histogramColumns
+			)
+			for entry in exportedStatistics:
+				writer.writerow(
+					[entry["file"], entry["reference"], entry.get("record", ""), entry.get("variable", ""), entry["passed"], entry["length"],
+					entry["rmse"], entry["maxAbsoluteError"], entry["maxAbsoluteErrorOffset"], entry["meanAbsoluteError"], entry["maxRelativeError"]] +
+					[entry["relativeErrorPercentiles"][str(percentile)] for percentile in ErrorStatistics.percentiles] +
+					[entry["nanCount"], entry["infCount"]] +
+					[histogramBin["count"] for histogramBin in entry["relativeErrorHistogram"]]
+				)
+		finally:
+			csvFile.close()
+
 def getEndianFormatString(options, numOfBytesPerValue, fileUsedForAutomaticDetection):
 	def getTrialRecordsWithEndianFormat(endianFormat):
 		detectionRecords = []
 		for recordNum in range(100):
 			nextRecord = unpackNextRecord(fileUsedForAutomaticDetection, endianFormat, numOfBytesPerValue, False)
-			if nextRecord == None:
+			if nextRecord is None:
 				break
 			detectionRecords.append(nextRecord)
 		return detectionRecords
@@ -227,18 +474,127 @@ def getEndianFormatString(options, numOfBytesPerValue, fileUsedForAutomaticDetec
 		return '>'
 	return '<'
 
+def getRecordIndex(f, readEndianFormat, numOfBytesPerValue, verbose=False):
+	'''First pass over a file: returns its records in order - arrays as views into the mapped file, scalars as lists.
+	In case a record can't be read, the exception becomes the last entry and is raised once the comparison reaches it.'''
+	recordIndex = []
+	while True:
+		try:
+			record = unpackNextRecord(f, readEndianFormat, numOfBytesPerValue, verbose)
+		except(Exception), e:
+			recordIndex.append(e)
+			break
+		if record is None:
+			break
+		recordIndex.append(record)
+	return recordIndex
+
+def getIndexedRecord(recordIndex, recordNum):
+	if recordNum >= len(recordIndex):
+		return None
+	record = recordIndex[recordNum]
+	if isinstance(record, Exception):
+		raise record
+	return record
+
+#set before the comparison pool is forked, such that the workers only need to be passed record numbers
+inputRecordIndex = []
+referenceRecordIndex = []
+
+def compareIndexedRecords(inputRecordNum, referenceRecordNum, eps, epsSingle, collectStatistics=False):
+	'''Returns None for invalid references, otherwise whether the record failed, RMSE, first and max error index and the verdict.
+	The last element are the error statistics if requested and a reference is available, None otherwise.'''
+	unpacked = inputRecordIndex[inputRecordNum] if inputRecordNum != None else None
+	unpackedRef = referenceRecordIndex[referenceRecordNum] if referenceRecordNum != None else None
+	if unpackedRef is not None:
+		firstInvalidIndex, firstInvalidValue = checkIntegrity(unpackedRef)
+		if firstInvalidIndex != -1:
+			return None, firstInvalidIndex, firstInvalidValue, None
+	def getStatistics(absoluteErrors=None):
+		if not collectStatistics or unpackedRef is None:
+			return None
+		statistics = ErrorStatistics()
+		statistics.add(unpacked, unpackedRef, absoluteErrors)
+		return statistics.getEntry()
+
+	firstInvalidIndex, firstInvalidValue = checkIntegrity(unpacked)
+	if firstInvalidIndex != -1:
+		#no RMSE for this record -> the statistics compute the errors themselves
+		return (True, -1, firstInvalidIndex, -1, "invalid value found: %s; FAIL <-------" %(str(firstInvalidValue))), None, None, getStatistics()
+	if unpackedRef is None:
+		return (False, 0.0, -1, -1, "pass"), None, None, None
+	err, firstErr, firstErrVal, expectedVal, maxErr, maxErrVal, maxErrExpectedVal, absoluteErrors = rootMeanSquareDeviation(unpacked, unpackedRef, epsSingle)
+	statistics = getStatistics(absoluteErrors)
+	if firstErr != -1 or err > eps:
+		return (True, err, firstErr, maxErr, "1st err val: %s; ref: %s; max err val: %s; ref: %s; FAIL" %(firstErrVal, expectedVal, maxErrVal, maxErrExpectedVal)), None, None, statistics
+	return (False, err, firstErr, maxErr, "pass"), None, None, statistics
+
+class ImmediateResult(object):
+	def __init__(self, value):
+		self.value = value
+
+	def get(self):
+		return self.value
+
+	def ready(self):
+		return True
+
+	def successful(self):
+		return True
+
 def run_accuracy_test_for_datfile(options, eps, epsSingle):
+	global inputRecordIndex, referenceRecordIndex
+
 	numOfBytesPerValue = int(options.bytes) if options.bytes != None else None
 	if numOfBytesPerValue != None and numOfBytesPerValue != 4 and numOfBytesPerValue != 8:
 		sys.stderr.write("Unsupported number of bytes per value specified.\n")
 		sys.exit(2)
 	inFile = None
 	refFile = None
+	pool = None
+	errorState = [False]
+	pendingComparisons = []
+
+	def reportComparisons(completedOnly=False):
+		#results are reported in record order, no matter in which order the pool finishes them.
+		#a comparison is only removed once its result is there, such that a comparison that has failed itself stays in front.
+		#completedOnly: stop at the first comparison that hasn't finished successfully instead of waiting for it
+		while len(pendingComparisons) > 0:
+			i, numOfValues, asyncResult = pendingComparisons[0]
+			if completedOnly and not (asyncResult.ready() and asyncResult.successful()):
+				break
+			result, firstInvalidIndex, firstInvalidValue, statistics = asyncResult.get()
+			pendingComparisons.pop(0)
+			if result == None:
+				sys.stderr.write("%s, record %i: WARNING: Invalid Value %s in Reference at %i - cannot analyze\n" %(options.inFile, i, str(firstInvalidValue), firstInvalidIndex))
+				continue
+			failed, err, firstErr, maxErr, passedStr = result
+			if failed:
+				errorState[0] = True
+			if statistics != None:
+				statistics.update({
+					"file": options.inFile,
+					"reference": options.refFile,
+					"record": i,
+					"passed": not failed,
+					"rmse": err if err >= 0 else None
+				})
+				exportedStatistics.append(statistics)
+			sys.stderr.write("%s, rec %i (len%i): RMSE: %e; 1st err idx: %i; max err idx: %i; %s\n" %(
+				options.inFile,
+				i,
+				numOfValues,
+				err,
+				firstErr,
+				maxErr,
+				passedStr
+			))
+
 	try:
 		#prepare files
-		inFile = open(str(options.inFile),'r')
+		inFile = MappedRecordFile(str(options.inFile))
 		if options.refFile != None:
-			refFile = open(str(options.refFile),'r')
+			refFile = MappedRecordFile(str(options.refFile))
 		else:
 			sys.stderr.write("WARNING: No reference file specified - doing some basic checks on the input only\n")
 		readEndianFormat = getEndianFormatString(options, numOfBytesPerValue, refFile)
@@ -246,102 +602,137 @@ def run_accuracy_test_for_datfile(options, eps, epsSingle):
 			str(numOfBytesPerValue) if numOfBytesPerValue != None else "automatic",
 			readEndianFormat
 		))
+
+		#first pass: find all the records
+		inputRecordIndex = getRecordIndex(inFile, readEndianFormat, numOfBytesPerValue, options.verbose)
+		referenceRecordIndex = getRecordIndex(refFile, readEndianFormat, numOfBytesPerValue, options.verbose) if refFile != None else []
+		if options.jobs > 1 and len(inputRecordIndex) > 1:
+			pool = multiprocessing.Pool(options.jobs)
+
+		#second pass: pair up the records, compare them in the pool
 		i = 0
-		errorState=False
+		inputRecordNum = 0
+		referenceRecordNum = 0
 		while True:
-			passedStr = "pass"
 			i = i + 1
 			unpackedRef = None
 			if refFile != None:
-				unpackedRef = unpackNextRecord(refFile, readEndianFormat, numOfBytesPerValue, options.verbose)
-				if unpackedRef == None:
+				unpackedRef = getIndexedRecord(referenceRecordIndex, referenceRecordNum)
+				referenceRecordNum += 1
+				if unpackedRef is None:
 					break
 				if len(unpackedRef) == 0:
 					continue
 			unpacked = None
 			try:
-				unpacked = unpackNextRecord(inFile, readEndianFormat, numOfBytesPerValue, options.verbose)
+				unpacked = getIndexedRecord(inputRecordIndex, inputRecordNum)
+				inputRecordNum += 1
 			except(Exception), e:
+				reportComparisons()
 				sys.stderr.write("Error reading record %i from %s: %s\n" %(i, str(options.inFile), e))
 				sys.exit(1)
+			if refFile == None and unpacked is None:
+				break
 
-			if options.verbose and unpacked != None and unpackedRef != None:
+			if options.verbose and unpacked is not None and unpackedRef is not None:
+				reportComparisons()
 				sys.stderr.write("Processing record %i: %i values unpacked for record, %i values unpacked for reference.\n" %(i, len(unpacked), len(unpackedRef)))
 
-			if unpackedRef != None and (unpacked == None or len(unpacked) == 0):
-				sys.stderr.write("Error in %s: Record with length %i expected, %s found\n" %(str(options.inFile), len(unpackedRef), str(unpacked)))
+			if unpackedRef is not None and (unpacked is None or len(unpacked) == 0):
+				reportComparisons()
+				sys.stderr.write("Error in %s: Record with length %i expected, %s found\n" %(str(options.inFile), len(unpackedRef), str(printableRecord(unpacked))))
 				if len(unpackedRef) < 100:
-					sys.stderr.write("Expected record: %s\n" %(str(unpackedRef)))
+					sys.stderr.write("Expected record: %s\n" %(str(printableRecord(unpackedRef))))
 				sys.exit(1)
 
 			if int(options.printNum) > 0:
-				print unpacked[0:int(options.printNum)]
+				reportComparisons()
+				print printableRecord(unpacked[0:int(options.printNum)])
 			if options.verbose:
+				reportComparisons()
 				sys.stderr.write("Record %i unpacked, contains %i elements.\n" %(i, len(unpacked)))
 
-			if unpackedRef != None and len(unpacked) != len(unpackedRef):
+			if unpackedRef is not None and len(unpacked) != len(unpackedRef):
+				reportComparisons()
 				sys.stderr.write("Error in %s: Record %i does not have same length as reference. Length: %i, expected: %i\n" \
 					%(str(options.inFile), i, len(unpacked), len(unpackedRef)))
 				sys.exit(1)
 			#analyse unpacked data
-			if unpackedRef != None:
-				firstInvalidIndex, firstInvalidValue = checkIntegrity(unpackedRef)
-				if firstInvalidIndex != -1:
-					sys.stderr.write("%s, record %i: WARNING: Invalid Value %s in Reference at %i - cannot analyze\n" %(options.inFile, i, str(firstInvalidValue), firstInvalidIndex))
-					continue
-			firstInvalidIndex, firstInvalidValue = checkIntegrity(unpacked)
-			if firstInvalidIndex != -1:
-				errorState=True
-				passedStr = "invalid value found: %s; FAIL <-------" %(str(firstInvalidValue))
-				firstErr = firstInvalidIndex
-				err = -1
-				maxErr = -1
-				firstErrVal = 0
-				expectedVal = 0
-				maxErrVal = 0
-				maxErrExpectedVal = 0
-			elif unpackedRef != None:
-				err, firstErr, firstErrVal, expectedVal, maxErr, maxErrVal, maxErrExpectedVal = rootMeanSquareDeviation(unpacked, unpackedRef, epsSingle)
-				if firstErr != -1 or err > eps:
-					errorState=True
-					passedStr = "1st err val: %s; ref: %s; max err val: %s; ref: %s; FAIL" %(firstErrVal, expectedVal, maxErrVal, maxErrExpectedVal)
-			sys.stderr.write("%s, rec %i (len%i): RMSE: %e; 1st err idx: %i; max err idx: %i; %s\n" %(
-				options.inFile,
-				i,
-				len(unpacked),
-				err,
-				firstErr,
-				maxErr,
-				passedStr
-			))
+			comparisonArguments = (
+				inputRecordNum - 1 if unpacked is not None else None,
+				referenceRecordNum - 1 if unpackedRef is not None else None,
+				eps,
+				epsSingle,
+				bool(options.json or options.csv)
+			)
+			if pool != None:
+				asyncResult = pool.apply_async(compareIndexedRecords, comparisonArguments)
+			else:
+				asyncResult = ImmediateResult(compareIndexedRecords(*comparisonArguments))
+			pendingComparisons.append((i, len(unpacked), asyncResult))
+		reportComparisons()
 	except(Exception), e:
+		#the records compared before the error are still reported, in order - up to the first comparison that hasn't completed
+		try:
+			reportComparisons(completedOnly=True)
+		except(Exception), reportError:
+			sys.stderr.write("Error when reporting the completed comparisons: %s\n" %(reportError))
 		sys.stderr.write("Error: %s\n" %(e))
 		sys.exit(1)
 	finally:
 		#cleanup
+		if pool != None:
+			pool.terminate()
+			pool.join()
+		inputRecordIndex = []
+		referenceRecordIndex = []
 		if inFile != None:
 			inFile.close()
 		if refFile != None:
 			refFile.close()
-	if errorState:
+	if errorState[0]:
 		sys.exit(1)
 
 def run_accuracy_test_for_netcdf(options, eps):
-	def get_array_from_netcdf_variable(netcdf_variable):
-		num_of_dimensions = len(netcdf_variable.dimensions)
-		if num_of_dimensions == 1:
-			return netcdf_variable[:]
-		if num_of_dimensions == 2:
-			return netcdf_variable[:, :]
-		if num_of_dimensions == 3:
-			return netcdf_variable[:, :, :]
-		if num_of_dimensions == 4:
-			return netcdf_variable[:, :, :, :]
-		if num_of_dimensions == 5:
-			return netcdf_variable[:, :, :, :, :]
+	def get_netcdf_chunks(netcdf_variable, max_chunk_bytes):
+		'''Yields (flat offset, chunk) for a variable of any rank. Chunks are consecutive blocks in C order along the slowest dimension
+		that fit into max_chunk_bytes - if a single index of the slowest dimension is already too big, the next faster dimension is used, etc.'''
+		shape = netcdf_variable.shape
+		if len(shape) == 0 or numpy.prod(shape) == 0:
+			yield 0, netcdf_variable[...]
+			return
+		item_bytes = netcdf_variable.dtype.itemsize
+		split_dimension = 0
+		while split_dimension < len(shape) - 1 and numpy.prod(shape[split_dimension + 1:]) * item_bytes > max_chunk_bytes:
+			split_dimension += 1
+		bytes_per_index = numpy.prod(shape[split_dimension + 1:]) * item_bytes
+		indices_per_chunk = int(max(1, max_chunk_bytes // bytes_per_index))
+		trailing_zeros = (0,) * (len(shape) - split_dimension - 1)
+		for leading_index in numpy.ndindex(*shape[:split_dimension]):
+			for start in range(0, shape[split_dimension], indices_per_chunk):
+				stop = min(start + indices_per_chunk, shape[split_dimension])
+				flat_offset = numpy.ravel_multi_index(leading_index + (start,) + trailing_zeros, shape)
+				yield flat_offset, netcdf_variable[leading_index + (slice(start, stop),)]
+
+	def get_netcdf_chunk_pairs(in_variable, ref_variable, max_chunk_bytes):
+		for (flat_offset, in_chunk), (_, ref_chunk) in izip(
+			get_netcdf_chunks(in_variable, max_chunk_bytes),
+			get_netcdf_chunks(ref_variable, max_chunk_bytes)
+		):
+			#netCDF4 returns masked arrays for variables with fill values - the reductions below ignore masked elements like numpy.mean did on the full arrays.
+			#chunks are flattened, such that scalar variables behave like arrays and indices within a chunk are flat offsets as well.
+			yield flat_offset, numpy.ma.asarray(in_chunk).ravel(), numpy.ma.asarray(ref_chunk).ravel()
+
+	def masked_sum(array):
+		#fully masked chunks sum up to the masked constant
+		array_sum = array.sum(dtype=numpy.float64)
+		if array_sum is numpy.ma.masked:
+			return 0.0
+		return float(array_sum)
 
 	from netCDF4 import Dataset
-	import numpy
+	from itertools import izip
+	max_chunk_bytes = options.chunkMegabytes * 1024 * 1024
 	inFile = None
 	try:
 		inFile = Dataset(options.inFile)
@@ -382,36 +773,60 @@ def run_accuracy_test_for_netcdf(options, eps):
 				sys.stderr.write("Error: variable %s has different shapes - infile: %s, reference: %s\n" %(key, in_variable.shape, ref_variable.shape))
 				error_found = True
 				continue
-			in_array = get_array_from_netcdf_variable(in_variable)
-			ref_array = get_array_from_netcdf_variable(ref_variable)
-			mean_or_one = numpy.mean(in_array)
+			#first pass: everything that can be accumulated chunk by chunk. sums are accumulated in double precision.
+			in_sum = 0.0
+			in_count = 0
+			square_sum = 0.0
+			difference_count = 0
+			ref_nonzero_count = 0
+			max_absolute_difference = None
+			statistics = ErrorStatistics() if options.json or options.csv else None
+			for flat_offset, in_array, ref_array in get_netcdf_chunk_pairs(in_variable, ref_variable, max_chunk_bytes):
+				in_sum += masked_sum(in_array)
+				in_count += in_array.count()
+				difference = in_array - ref_array
+				square_sum += masked_sum(difference * difference)
+				difference_count += difference.count()
+				ref_nonzero_count += numpy.count_nonzero(ref_array)
+				absolute_difference = numpy.abs(difference)
+				if statistics != None:
+					statistics.add(in_array, ref_array, absolute_difference, flat_offset)
+				chunk_max = numpy.ma.masked_where(numpy.isnan(absolute_difference), absolute_difference).max()
+				if chunk_max is not numpy.ma.masked and (max_absolute_difference is None or chunk_max > max_absolute_difference):
+					max_absolute_difference = chunk_max
+			in_array = None
+			ref_array = None
+			mean_or_one = in_sum / in_count if in_count > 0 else float('nan')
 			if abs(mean_or_one) < eps:
 				mean_or_one = 1.0
-			absolute_difference = numpy.abs(in_array - ref_array)
-			greater_than_epsilon = (absolute_difference / mean_or_one) > eps
 			passed_string = "pass"
-			if numpy.count_nonzero(ref_array) == 0:
+			if ref_nonzero_count == 0:
 				passed_string += "(WARNING:Reference is Zero Matrix!)"
-			root_mean_square_deviation = numpy.sqrt(numpy.mean((in_array - ref_array)**2))
+			root_mean_square_deviation = math.sqrt(square_sum / difference_count) if difference_count > 0 else float('nan')
 			root_mean_square_deviation = root_mean_square_deviation / abs(mean_or_one)
 			if math.isnan(root_mean_square_deviation):
 				passed_string = "FAIL <-------"
 				error_found = True
-			elif numpy.any(greater_than_epsilon):
+			elif max_absolute_difference is not None and (max_absolute_difference / mean_or_one) > eps:
 				error_found = True
-				# first_error = numpy.unravel_index(numpy.argmax(greater_than_epsilon), greater_than_epsilon.shape)[0]
-				number_of_elements = numpy.prod(in_array.shape)
+				number_of_elements = numpy.prod(in_variable.shape)
 				if number_of_elements <= 8:
+					in_array = in_variable[...]
+					ref_array = ref_variable[...]
+					greater_than_epsilon = (numpy.abs(in_array - ref_array) / mean_or_one) > eps
 					passed_string = "input: \n%s\nexpected:\n%s\nerrors found at:%s\nFAIL <-------" %(in_array, ref_array, greater_than_epsilon)
 				else:
-					first_occurrence = numpy.argmax(greater_than_epsilon==True)
-					first_occurrence_index_tuple = numpy.unravel_index(first_occurrence, in_array.shape)
-					first_err_val = in_array[first_occurrence_index_tuple]
-					expected_val = ref_array[first_occurrence_index_tuple]
-					passed_string = "first err. at:%s; first err. val.: %s; ref: %s; array size: %s; FAIL <-------" %(first_occurrence_index_tuple, first_err_val, expected_val, in_array.shape)
-					# numpy.set_printoptions(precision=3)
-					# passed_string += "\n === curr === \n" + str(in_array)
-					# passed_string += "\n === ref === \n" + str(ref_array)
+					#second pass, only for failing variables: locate the first error now that the mean is known
+					for flat_offset, in_array, ref_array in get_netcdf_chunk_pairs(in_variable, ref_variable, max_chunk_bytes):
+						greater_than_epsilon = (numpy.abs(in_array - ref_array) / mean_or_one) > eps
+						if not numpy.any(greater_than_epsilon):
+							continue
+						chunk_occurrence = numpy.argmax(greater_than_epsilon==True)
+						first_occurrence_index_tuple = numpy.unravel_index(flat_offset + chunk_occurrence, in_variable.shape)
+						first_err_val = in_array[chunk_occurrence]
+						expected_val = ref_array[chunk_occurrence]
+						passed_string = "first err. at:%s; first err. val.: %s; ref: %s; array size: %s; FAIL <-------" %(first_occurrence_index_tuple, first_err_val, expected_val, in_variable.shape)
+						break
 			elif root_mean_square_deviation > eps:
 				error_found = True
 				passed_string = "FAIL <-------"
@@ -421,6 +836,16 @@ def run_accuracy_test_for_netcdf(options, eps):
 				root_mean_square_deviation,
 				passed_string
 			))
+			if statistics != None:
+				entry = statistics.getEntry()
+				entry.update({
+					"file": options.inFile,
+					"reference": options.refFile,
+					"variable": key,
+					"passed": passed_string.startswith("pass"),
+					"rmse": root_mean_square_deviation if not math.isnan(root_mean_square_deviation) else None
+				})
+				exportedStatistics.append(entry)
 		except Exception as e:
 			message = "Variable %s\nError Message: %s\n%s\ninarray:%s\nrefarray:%s" %(key, str(e), traceback.format_tb(sys.exc_info()[2]), str(in_array), str(ref_array))
 			e.args = (message,)+e.args[1:]
@@ -428,17 +853,137 @@ def run_accuracy_test_for_netcdf(options, eps):
 	if error_found:
 		sys.exit(1)
 
+def run_accuracy_test(options, eps, epsSingle):
+	'''Returns the exit code the test would have had as a separate accuracy.py process.'''
+	try:
+		if options.netcdf:
+			run_accuracy_test_for_netcdf(options, eps)
+		else:
+			run_accuracy_test_for_datfile(options, eps, epsSingle)
+	except SystemExit as e:
+		if e.code == None:
+			return 0
+		return e.code if isinstance(e.code, int) else 1
+	except Exception:
+		sys.stderr.write(traceback.format_exc())
+		return 1
+	return 0
+
+def run_accuracy_test_with_captured_output(options, eps, epsSingle):
+	'''Used in the batch pool - the output and the statistics are returned, such that they can be reported in file order.'''
+	del exportedStatistics[:]
+	output = StringIO.StringIO()
+	stdout = sys.stdout
+	stderr = sys.stderr
+	sys.stdout = output
+	sys.stderr = output
+	try:
+		exitCode = run_accuracy_test(options, eps, epsSingle)
+	finally:
+		sys.stdout = stdout
+		sys.stderr = stderr
+	return exitCode, output.getvalue(), list(exportedStatistics)
+
+def run_accuracy_test_for_batch(options, eps, epsSingle):
+	'''Checks all files matching the (whitespace separated) patterns against the files with the same name in the reference directory,
+	in one process instead of one accuracy.py process per file. Exits with noOutputFilesExitCode if no output file could be checked
+	and 2 if any check has failed. Exit code 1 is left to errors of accuracy.py itself.'''
+	referenceDir = options.refFile if options.refFile != None else "."
+	filePaths = []
+	for pattern in options.batch.split():
+		#like bash, a pattern without matches is taken literally
+		filePaths += sorted(glob.glob(pattern)) or [pattern]
+	outputFileFound = False
+	errorFound = False
+	summary = []
+	checks = []
+	for filePath in filePaths:
+		refPath = os.path.join(referenceDir, os.path.basename(filePath))
+		if not os.path.isfile(refPath):
+			sys.stderr.write("skipping %s (doesn't exist)\n" %(refPath))
+			summary.append((filePath, refPath, "skipped (no reference)"))
+			continue
+		sys.stderr.write("checking against %s\n" %(refPath))
+		if not os.path.isfile(filePath):
+			sys.stderr.write("output file %s expected but not found from %s\n" %(filePath, os.getcwd()))
+			summary.append((filePath, refPath, "FAIL (output not found)"))
+			errorFound = True
+			continue
+		outputFileFound = True
+		fileOptions = copy.copy(options)
+		fileOptions.inFile = filePath
+		fileOptions.refFile = refPath
+		fileOptions.netcdf = options.netcdf or os.path.splitext(filePath)[1] == ".nc"
+		if fileOptions.netcdf:
+			sys.stderr.write("Using NetCDF module for accuracy test\n")
+		#with a pool, the jobs are used for the files instead of the records within a file
+		if options.jobs > 1:
+			fileOptions.jobs = 1
+		checks.append((filePath, refPath, fileOptions, len(summary)))
+		summary.append(None)
+
+	pool = None
+	try:
+		if options.jobs > 1 and len(checks) > 1:
+			pool = multiprocessing.Pool(options.jobs)
+		asyncResults = []
+		for _, _, fileOptions, _ in checks:
+			if pool != None:
+				asyncResults.append(pool.apply_async(run_accuracy_test_with_captured_output, (fileOptions, eps, epsSingle)))
+			else:
+				asyncResults.append(None)
+		for (filePath, refPath, fileOptions, summaryIndex), asyncResult in zip(checks, asyncResults):
+			if asyncResult != None:
+				exitCode, output, statistics = asyncResult.get()
+				sys.stderr.write(output)
+				exportedStatistics.extend(statistics)
+			else:
+				exitCode = run_accuracy_test(fileOptions, eps, epsSingle)
+			result = "pass"
+			if exitCode != 0:
+				sys.stderr.write("Accuracy test has returned error %i\n" %(exitCode))
+				result = "FAIL (error %i)" %(exitCode)
+				errorFound = True
+			summary[summaryIndex] = (filePath, refPath, result)
+	finally:
+		if pool != None:
+			pool.terminate()
+			pool.join()
+
+	if len(summary) > 0:
+		fileColumnWidth = max(len("file"), max(len(entry[0]) for entry in summary))
+		refColumnWidth = max(len("reference"), max(len(entry[1]) for entry in summary))
+		sys.stderr.write("accuracy test summary:\n")
+		sys.stderr.write("%s  %s  %s\n" %("file".ljust(fileColumnWidth), "reference".ljust(refColumnWidth), "result"))
+		for filePath, refPath, result in summary:
+			sys.stderr.write("%s  %s  %s\n" %(filePath.ljust(fileColumnWidth), refPath.ljust(refColumnWidth), result))
+	if not outputFileFound:
+		sys.stderr.write("Error: no output files found for %s\n" %(options.batch))
+		sys.exit(noOutputFilesExitCode)
+	if errorFound:
+		sys.exit(2)
+
 ##################### MAIN ##############################
 #get all program arguments
 parser = OptionParser()
 parser.add_option("-f", "--file", dest="inFile",
                   help="read from FILE", metavar="FILE", default="in.dat")
 parser.add_option("--reference", dest="refFile",
-                  help="reference FILE", metavar="FILE", default=None)
+                  help="reference FILE, or the reference directory in batch mode", metavar="FILE", default=None)
+parser.add_option("--batch", dest="batch", default=None, metavar="PATTERN",
+                  help="check all files matching PATTERN (bash glob, whitespace separated) against the files with the same name in the --reference directory")
 parser.add_option("-b", "--bytesPerValue", dest="bytes")
 parser.add_option("-p", "--printFirstValues", dest="printNum", default="0")
 parser.add_option("-r", "--readEndian", dest="readEndian", default="little")
 parser.add_option("--netcdf", action="store_true", dest="netcdf")
+parser.add_option("-j", "--jobs", dest="jobs", type="int", default=1,
+                  help="number of processes to use for comparing the records of .DAT files, or the files in batch mode (default: 1)", metavar="N")
+parser.add_option("--chunkMegabytes", dest="chunkMegabytes", type="int", default=64,
+                  help="maximum size of the chunks read from each NetCDF variable at once, in MB. The peak memory usage is a small multiple of this (default: 64)", metavar="MB")
+parser.add_option("--json", dest="json", default=None, metavar="FILE",
+                  help="write error statistics per record / variable to FILE in JSON format")
+parser.add_option("--csv", dest="csv", default=None, metavar="FILE",
+                  help="write error statistics per record / variable to FILE in CSV format")
 parser.add_option("-v", action="store_true", dest="verbose")
 parser.add_option("-e", "--epsilon", metavar="EPS", dest="epsilon", help="Throw an error if at any point the error becomes higher than EPS. Defaults to 1E-9.")
 (options, args) = parser.parse_args()
@@ -446,7 +991,13 @@ eps = 1E-6
 epsSingle = 1E-7
 if (options.epsilon):
 	eps = float(options.epsilon)
-if options.netcdf:
-	run_accuracy_test_for_netcdf(options, eps)
-else:
-	run_accuracy_test_for_datfile(options, eps, epsSingle)
+try:
+	if options.batch:
+		run_accuracy_test_for_batch(options, eps, epsSingle)
+	elif options.netcdf:
+		run_accuracy_test_for_netcdf(options, eps)
+	else:
+		run_accuracy_test_for_datfile(options, eps, epsSingle)
+finally:
+	#also for failed tests - that's where the statistics are most interesting
+	exportStatistics(options)
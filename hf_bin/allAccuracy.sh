@@ -18,7 +18,6 @@ set -e
 # You should have received a copy of the GNU Lesser General Public License
 # along with Hybrid Fortran. If not, see <http://www.gnu.org/licenses/>.
 
-errorVal=0
 reference_path=$1
 output_file_pattern=$2
 source_before=$3
@@ -37,51 +36,14 @@ if [ -n "$source_before" ]; then
 	    exit $rc
 	fi
 fi
-output_file_found=false
-error_found=false
-for i in $output_file_pattern; do
-	filename=$(basename $i)
-	extension=`echo $filename | cut -s -d'.' -f2`
-	filename=${filename%.*}
-	dirname=$(dirname $i)
-	if [ -z "$extension" ]; then
-		refPath="${reference_path}${filename}"
-	else
-		refPath="${reference_path}${filename}.${extension}"
-	fi
-	if [ ! -f ${refPath} ]; then
-		echo "skipping ${refPath} (doesn't exist)" 1>&2
-	else
-		echo "checking against ${refPath}" 1>&2
-		if [ ! -f "${i}" ]; then
-			echo "output file ${i} expected but not found from $(pwd)" 1>&2
-			error_found=true
-		else
-			formatParamCurr="${formatParam}"
-			if [[ $extension == "nc" ]]; then
-				echo "Using NetCDF module for accuracy test" 1>&2
-				formatParamCurr="${formatParam} --netcdf"
-			fi
-			output_file_found=true
-
-			# there is a conflict with the python path we use for debugging HF scripts. --> set it to empty here.
-			OLD_PYTHONPATH=$PYTHONPATH
-			export PYTHONPATH=
-			echo "calling accuracy with format paramter ${formatParam}" 1>&2
-			echo "${HF_DIR}/hf_bin/accuracy.py -f $i --reference \"$refPath\" $formatParamCurr"
-			python ${HF_DIR}/hf_bin/accuracy.py -f $i --reference "$refPath" $formatParamCurr && :
-			rc=$?
-			if [ $errorVal -eq 0 ] ; then
-			    errorVal=$rc
-			fi
-			if [ $rc -ne 0 ] ; then
-			    echo "Accuracy test has returned error $rc" 1>&2
-			    error_found=true
-			fi
-			export PYTHONPATH=$OLD_PYTHONPATH
-		fi
-	fi
-done
+# there is a conflict with the python path we use for debugging HF scripts. --> set it to empty here.
+OLD_PYTHONPATH=$PYTHONPATH
+export PYTHONPATH=
+echo "calling accuracy with format paramter ${formatParam}" 1>&2
+echo "${HF_DIR}/hf_bin/accuracy.py --batch \"$output_file_pattern\" --reference \"$reference_path\" $formatParam"
+python ${HF_DIR}/hf_bin/accuracy.py --batch "$output_file_pattern" --reference "$reference_path" $formatParam && :
+accuracy_rc=$?
+export PYTHONPATH=$OLD_PYTHONPATH
 if [ -n "$source_after" ]; then
 	echo "sourcing $source_after after accuracy tests" 1>&2
 	source $source_after && :
@@ -91,12 +53,13 @@ if [ -n "$source_after" ]; then
 	    exit $rc
 	fi
 fi
-if ! $output_file_found; then
+# accuracy.py exits with 3 if there are no output files to check and with 1 on errors of its own
+if [ $accuracy_rc -eq 3 ] ; then
      echo "error in allAccuracy.sh: no output files found. The program to be tested probably could not complete its run." 1>&2
      exit 1
 fi
-if $error_found; then
+if [ $accuracy_rc -ne 0 ] ; then
 	echo "an error was found when running allAccuracy.sh" 1>&2
 	exit 2
 fi
-exit $(( errorVal ))
\ No newline at end of file
+exit 0
\ No newline at end of file
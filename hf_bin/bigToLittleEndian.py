@@ -20,7 +20,99 @@
 
 from optparse import OptionParser
 import struct
-import sys
+import sys, os
+import mmap
+import numpy
+
+#values per block - records are checked and converted in blocks, such that the memory usage is bounded also for huge records
+numOfValuesPerBlock = 4 * 1024 * 1024
+#reported at the end, also when a record fails
+numOfRecordsRead = 0
+
+def getRecords(buffer, size, readEndianFormat, numOfBytesPerValue):
+	'''Yields record number, offset of the record data and record length in bytes for every record of a Fortran unformatted file.
+	Exits in case of inconsistent headers and trailers.'''
+	global numOfRecordsRead
+	headerFormat = '%si' %(readEndianFormat)
+	position = 0
+	i = 0
+	#less than four bytes left: we have reached the end of the file
+	while position + 4 <= size:
+		i = i + 1
+		numOfRecordsRead = i
+		recordByteLength = struct.unpack_from(headerFormat, buffer, position)[0]
+		if recordByteLength < 0 or recordByteLength % numOfBytesPerValue != 0:
+			print "Odd record length at record %i. Abort." %(i)
+			sys.exit(1)
+		dataOffset = position + 4
+		trailerOffset = dataOffset + recordByteLength
+		if trailerOffset > size:
+			print "Could not read %i bytes at record %i. Abort." %(recordByteLength, i)
+			sys.exit(1)
+		if trailerOffset + 4 > size:
+			print "Could not read trailer at record %i. Abort." %(i)
+			sys.exit(1)
+		if struct.unpack_from(headerFormat, buffer, trailerOffset)[0] != recordByteLength:
+			print "Header and trailer do not match at record %i. Abort." %(i)
+			sys.exit(1)
+		yield i, dataOffset, recordByteLength
+		position = trailerOffset + 4
+
+def getRecordBlocks(buffer, dataOffset, recordByteLength, dtype):
+	'''Yields the index of the first value and a numpy view into the buffer for every block of a record.'''
+	recordLength = recordByteLength // dtype.itemsize
+	for start in range(0, recordLength, numOfValuesPerBlock):
+		count = min(numOfValuesPerBlock, recordLength - start)
+		yield start, numpy.frombuffer(buffer, dtype=dtype, count=count, offset=dataOffset + start * dtype.itemsize)
+
+def checkBounds(values, firstValueIndex, recordNum, minValue, maxValue):
+	#NaN values are out of bounds
+	with numpy.errstate(invalid='ignore'):
+		outOfBounds = numpy.logical_not(numpy.logical_and(values > minValue, values < maxValue))
+	if numpy.any(outOfBounds):
+		j = int(numpy.argmax(outOfBounds))
+		print "value %i in record %i is out of the specified bounds: %s" %(firstValueIndex + j + 1, recordNum, float(values[j]))
+		sys.exit(1)
+
+def checkRecord(buffer, i, dataOffset, recordByteLength, readDtype, minValue, maxValue, numOfRecordsToPrint, verbose):
+	if verbose:
+		print "preparing record %i" %(i)
+		print "record byte length: %i" %(recordByteLength)
+		print "record length: %i" %(recordByteLength // readDtype.itemsize)
+	#analyse unpacked data (to make sure we have read something useful). Print some values if specified.
+	if i <= numOfRecordsToPrint:
+		print "record %i: %s" %(i, tuple(numpy.frombuffer(buffer, dtype=readDtype, count=recordByteLength // readDtype.itemsize, offset=dataOffset).tolist()))
+	for start, values in getRecordBlocks(buffer, dataOffset, recordByteLength, readDtype):
+		checkBounds(values, start, i, minValue, maxValue)
+
+def checkRecords(buffer, size, readDtype, minValue, maxValue, numOfRecordsToPrint, verbose):
+	for i, dataOffset, recordByteLength in getRecords(buffer, size, readDtype.byteorder, readDtype.itemsize):
+		checkRecord(buffer, i, dataOffset, recordByteLength, readDtype, minValue, maxValue, numOfRecordsToPrint, verbose)
+
+def convertRecordsInPlace(buffer, size, readDtype, writeDtype):
+	'''Only to be called once all records have been checked - the buffer is modified record by record.'''
+	if readDtype == writeDtype:
+		return
+	headerFormat = '%si' %(writeDtype.byteorder)
+	for _, dataOffset, recordByteLength in getRecords(buffer, size, readDtype.byteorder, readDtype.itemsize):
+		for _, values in getRecordBlocks(buffer, dataOffset, recordByteLength, readDtype):
+			values.byteswap(True)
+		struct.pack_into(headerFormat, buffer, dataOffset - 4, recordByteLength)
+		struct.pack_into(headerFormat, buffer, dataOffset + recordByteLength, recordByteLength)
+
+def convertRecords(buffer, size, outFile, readDtype, writeDtype, minValue, maxValue, numOfRecordsToPrint, verbose):
+	'''Checks and writes the records one by one, such that the output contains all records up to a failing one.'''
+	headerFormat = '%si' %(writeDtype.byteorder)
+	for i, dataOffset, recordByteLength in getRecords(buffer, size, readDtype.byteorder, readDtype.itemsize):
+		checkRecord(buffer, i, dataOffset, recordByteLength, readDtype, minValue, maxValue, numOfRecordsToPrint, verbose)
+		if verbose:
+			print "write format: %s" %(writeDtype.str)
+		outFile.write(struct.pack(headerFormat, recordByteLength))
+		for _, values in getRecordBlocks(buffer, dataOffset, recordByteLength, readDtype):
+			outFile.write(values.astype(writeDtype).tostring())
+		outFile.write(struct.pack(headerFormat, recordByteLength))
+		if verbose:
+			print "record %i written, containing %i bytes" %(i, recordByteLength)
 
 ##################### MAIN ##############################
 #get all program arguments
@@ -29,6 +121,8 @@ parser.add_option("-f", "--file", dest="inFile",
                   help="read from FILE", metavar="FILE", default="in.dat")
 parser.add_option("-o", "--out", dest="outFile",
                   help="write to FILE", metavar="FILE", default="out.dat")
+parser.add_option("-i", "--inPlace", action="store_true", dest="inPlace",
+                  help="convert the input file in place instead of writing to --out. The file is only modified once all records have passed the checks.")
 parser.add_option("--min", dest="min",
                   help="test all read values for MIN", metavar="MIN", default="-1E10")
 parser.add_option("--max", dest="max",
@@ -37,94 +131,56 @@ parser.add_option("-b", "--bytesPerValue", dest="bytes", default="4")
 parser.add_option("-p", "--numberOfRecordsToPrint", dest="printRecords", default="0")
 parser.add_option("-r", "--readEndian", dest="readEndian", default="big")
 parser.add_option("-w", "--writeEndian", dest="writeEndian", default="little")
+parser.add_option("-v", action="store_true", dest="verbose", help="print progress for every record")
 (options, args) = parser.parse_args()
 
 #initialise according to input parameters
-min = eval(options.min)
-max = eval(options.max)
+minValue = eval(options.min)
+maxValue = eval(options.max)
 numOfBytesPerValue = int(options.bytes)
 if (numOfBytesPerValue != 4 and numOfBytesPerValue != 8):
 	print "Unsupported number of bytes per value specified."
-	sys.exit()
+	sys.exit(1)
 readEndianFormat = '>'
 writeEndianFormat = '<'
 if (options.readEndian == "little"):
 	readEndianFormat = '<'
 if (options.writeEndian == "big"):
-	readEndianFormat = '>'
+	writeEndianFormat = '>'
 
 typeSpecifier = 'f'
 if (numOfBytesPerValue == 8):
 	typeSpecifier = 'd'
+readDtype = numpy.dtype('%s%s' %(readEndianFormat, typeSpecifier))
+writeDtype = numpy.dtype('%s%s' %(writeEndianFormat, typeSpecifier))
 
 numOfRecordsToPrint = int(options.printRecords)
 
-i = 0
+inFile = None
+outFile = None
+buffer = None
 try:
 	#prepare files
-	inFile = open(str(options.inFile),'r')
-	outFile = open(str(options.outFile),'w')
-
-	printedRecords = 0
-	while True:
-		header = inFile.read(4)
-		if (len(header) != 4):
-			#we have reached the end of the file
-			break
-		i = i + 1
-		print "preparing record %i" %(i)
-		headerFormat = '%si' %(readEndianFormat)
-		headerUnpacked = struct.unpack(headerFormat, header)
-		recordByteLength = headerUnpacked[0]
-		if (recordByteLength % numOfBytesPerValue != 0):
-			print "Odd record length at record %i. Abort." %(i)
-			sys.exit()
-		print "record byte length: %i" %(recordByteLength)
-		recordLength = recordByteLength / numOfBytesPerValue
-		print "record length: %i" %(recordLength)
-
-		data = inFile.read(recordByteLength)
-		if (len(data) != recordByteLength):
-			print "Could not read %i bytes at record %i. Abort." %(recordByteLength, i)
-			sys.exit()
-
-		dataFormat = '%s%i%s' %(readEndianFormat, recordLength, typeSpecifier)
-		unpacked = struct.unpack(dataFormat, data)
-
-		#analyse unpacked data (to make sure we have read something useful). Print some values if specified.
-		if (printedRecords < numOfRecordsToPrint):
-			print "record %i: %s" %(i, unpacked)
-		j = 0
-		for val in unpacked:
-			j = j + 1
-			if (val > min and val < max):
-				continue
-			else:
-				print "value %i in record %i is out of the specified bounds: %d" %(j, i, val)
-				sys.exit()
-
-		trailer = inFile.read(4)
-		if (len(trailer) != 4):
-			print "Could not read trailer at record %i. Abort." %(i)
-			sys.exit()
-		trailerUnpacked = struct.unpack(headerFormat, trailer)
-		redundantRecordLength = trailerUnpacked[0]
-		if (recordByteLength != redundantRecordLength):
-			print "Header and trailer do not match at record %i. Abort." %(i)
-			sys.exit()
-
-		repackedRecordFormat = '%si%i%si' %(writeEndianFormat, recordLength, typeSpecifier)
-		print "write format: %s" %(repackedRecordFormat)
-		unpackedWithHeaderAndTrailer = (recordByteLength,) + unpacked + (recordByteLength,)
-		repacked = struct.pack(repackedRecordFormat, *unpackedWithHeaderAndTrailer)
-		outFile.write(repacked)
-		print "record %i written, containing %i bytes" %(i, redundantRecordLength)
+	inFile = open(str(options.inFile), 'r+b' if options.inPlace else 'rb')
+	size = os.fstat(inFile.fileno()).st_size
+	#empty files can't be mapped
+	if size > 0:
+		buffer = mmap.mmap(inFile.fileno(), 0, access=mmap.ACCESS_WRITE if options.inPlace else mmap.ACCESS_READ)
+	if options.inPlace:
+		checkRecords(buffer, size, readDtype, minValue, maxValue, numOfRecordsToPrint, options.verbose)
+		convertRecordsInPlace(buffer, size, readDtype, writeDtype)
+		if buffer != None:
+			buffer.flush()
+	else:
+		outFile = open(str(options.outFile), 'wb')
+		convertRecords(buffer, size, outFile, readDtype, writeDtype, minValue, maxValue, numOfRecordsToPrint, options.verbose)
 
 finally:
-	print "number of records read: %i" %(i)
+	print "number of records read: %i" %(numOfRecordsRead)
 	#cleanup
-	inFile.close()
-	outFile.close()
-
-
-
+	if buffer != None:
+		buffer.close()
+	if inFile != None:
+		inFile.close()
+	if outFile != None:
+		outFile.close()